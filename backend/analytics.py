@@ -0,0 +1,340 @@
+"""Vectorized analytics over a user's whole ledger.
+
+Each user's expenses and income are loaded once into NumPy arrays (days since
+1970-01-01, amounts in integer cents, category codes) and kept in an LRU.
+Every later request first applies the rows the change log lists since the
+arrays were last brought up to date, so a write costs a few rows instead of
+a reload, and then answers with array operations instead of SQL.
+"""
+
+import os
+from datetime import date, timedelta
+
+import numpy as np
+from cache import TTLCache
+from dotenv import load_dotenv
+
+load_dotenv()
+ANALYTICS_CACHE_USERS = int(os.getenv("ANALYTICS_CACHE_USERS", "32"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "900"))
+
+EPOCH = date(1970, 1, 1)
+
+# Ledger tables and their date columns
+LEDGERS = {"expenses": "expense_date", "income": "income_date"}
+
+PERIODS = ("day", "week", "month", "year")
+
+# Loaded ledgers keyed by user id; a 1M-row ledger takes about 20 MB
+ledger_cache = TTLCache(maxsize=ANALYTICS_CACHE_USERS, ttl=ANALYTICS_CACHE_TTL)
+
+
+def to_day(value):
+    """Days since 1970-01-01, the unit the arrays store dates in"""
+    return (value - EPOCH).days
+
+
+def day_labels(days):
+    """ISO dates for an array of day numbers"""
+    return np.datetime_as_string(np.asarray(days, dtype="datetime64[D]")).tolist()
+
+
+def to_amounts(cents):
+    return (np.asarray(cents) / 100).tolist()
+
+
+class Ledger:
+    """One table of a user's ledger as parallel arrays, one entry per row.
+
+    `codes` index into `categories` from 1; 0 means uncategorized. Instances
+    are never modified, `apply` returns a new one, so a request can keep
+    using the arrays it started with while another one refreshes them.
+    """
+
+    def __init__(self, ids, days, cents, codes, categories):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int32)
+        self.cents = np.asarray(cents, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.categories = list(categories)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def apply(self, rows, deleted_ids):
+        """Return a copy with `deleted_ids` removed and `rows`, the current
+        state of created or updated rows, inserted in place of their old
+        versions. Applying the same change twice is harmless."""
+        categories = list(self.categories)
+        codes = {name: code for code, name in enumerate(categories, start=1)}
+        for row in rows:
+            if row["category"] is not None and row["category"] not in codes:
+                categories.append(row["category"])
+                codes[row["category"]] = len(categories)
+
+        replaced = [row["id"] for row in rows] + list(deleted_ids)
+        keep = ~np.isin(self.ids, np.asarray(replaced, dtype=np.int64))
+        return Ledger(
+            np.concatenate([self.ids[keep], [row["id"] for row in rows]]),
+            np.concatenate([self.days[keep], [row["day"] for row in rows]]),
+            np.concatenate([self.cents[keep], [row["cents"] for row in rows]]),
+            np.concatenate(
+                [self.codes[keep], [codes.get(row["category"], 0) for row in rows]]
+            ),
+            categories,
+        )
+
+    def select(self, start, end):
+        """Mask of the rows dated in [start, end)"""
+        return (self.days >= to_day(start)) & (self.days < to_day(end))
+
+
+class UserLedgers:
+    """A user's loaded ledgers and the change log position they reflect"""
+
+    def __init__(self, token, ledgers):
+        self.token = token
+        self.ledgers = ledgers
+
+
+def _ledger_query(table, date_column, by_id):
+    columns = f"""
+        id,
+        {date_column} - DATE '1970-01-01' AS day,
+        (amount * 100)::bigint AS cents,
+        category
+    """
+    if by_id:
+        return f"SELECT {columns} FROM {table} WHERE user_id = %s AND id = ANY(%s)"
+    # One row of arrays, far cheaper to transfer and convert than a row per
+    # entry; category codes are assigned in the same snapshot as the names
+    return f"""
+        WITH ledger AS (
+            SELECT {columns} FROM {table} WHERE user_id = %s
+        ),
+        names AS (
+            SELECT COALESCE(
+                       array_agg(DISTINCT category) FILTER (WHERE category IS NOT NULL),
+                       ARRAY[]::text[]
+                   ) AS categories
+            FROM ledger
+        )
+        SELECT names.categories,
+               array_agg(ledger.id) AS ids,
+               array_agg(ledger.day) AS days,
+               array_agg(ledger.cents) AS cents,
+               array_agg(COALESCE(array_position(names.categories, ledger.category), 0))
+                   AS codes
+        FROM ledger, names
+        GROUP BY names.categories
+    """
+
+
+async def _load(db, user_id, token):
+    ledgers = {}
+    for table, date_column in LEDGERS.items():
+        await db.execute(_ledger_query(table, date_column, by_id=False), (user_id,))
+        arrays = db.fetchone()
+        if arrays is None:
+            ledgers[table] = Ledger([], [], [], [], [])
+        else:
+            ledgers[table] = Ledger(
+                arrays["ids"],
+                arrays["days"],
+                arrays["cents"],
+                arrays["codes"],
+                arrays["categories"],
+            )
+    return UserLedgers(token, ledgers)
+
+
+async def _refresh(db, user_id, cached, token):
+    await db.execute(
+        """
+        SELECT resource, row_id,
+               (array_agg(operation ORDER BY id DESC))[1] AS operation
+        FROM change_log
+        WHERE user_id = %s AND txid >= %s AND resource = ANY(%s)
+        GROUP BY resource, row_id
+    """,
+        (user_id, cached.token, list(LEDGERS)),
+    )
+    changed = {table: [] for table in LEDGERS}
+    deleted = {table: [] for table in LEDGERS}
+    for row in db.fetchall():
+        target = deleted if row["operation"] == "D" else changed
+        target[row["resource"]].append(row["row_id"])
+
+    ledgers = dict(cached.ledgers)
+    for table, date_column in LEDGERS.items():
+        if not changed[table] and not deleted[table]:
+            continue
+        rows = []
+        if changed[table]:
+            await db.execute(
+                _ledger_query(table, date_column, by_id=True),
+                (user_id, changed[table]),
+            )
+            rows = db.fetchall()
+        # Rows that moved to another user come back missing and are dropped
+        gone = set(changed[table]) - {row["id"] for row in rows}
+        ledgers[table] = ledgers[table].apply(rows, deleted[table] + sorted(gone))
+    return UserLedgers(token, ledgers)
+
+
+async def load_ledgers(db, user_id):
+    """The user's ledgers, current as of this call.
+
+    Loads them on first use, or when the change history they depend on has
+    been pruned; otherwise applies only the rows changed since last time.
+    """
+    await db.execute("""
+        SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS token,
+               (SELECT pruned_txid FROM change_log_horizon) AS pruned_txid
+    """)
+    state = db.fetchone()
+    cached = ledger_cache.get(user_id)
+    if cached is None or cached.token < (state["pruned_txid"] or 0):
+        current = await _load(db, user_id, state["token"])
+    else:
+        current = await _refresh(db, user_id, cached, state["token"])
+    ledger_cache.set(user_id, current)
+    return current.ledgers
+
+
+def _period_index(days, period):
+    """Number of the day, week (starting Monday), month or year of each day"""
+    days = np.asarray(days, dtype=np.int64)
+    if period == "day":
+        return days
+    if period == "week":
+        # 1970-01-01 was a Thursday, three days after a Monday
+        return (days + 3) // 7
+    unit = "M" if period == "month" else "Y"
+    return days.astype("datetime64[D]").astype(f"datetime64[{unit}]").astype(np.int64)
+
+
+def _period_starts(index, period):
+    """First day of each period number from `_period_index`"""
+    index = np.asarray(index, dtype=np.int64)
+    if period == "day":
+        return index
+    if period == "week":
+        return index * 7 - 3
+    unit = "M" if period == "month" else "Y"
+    return index.astype(f"datetime64[{unit}]").astype("datetime64[D]").astype(np.int64)
+
+
+def _periods(start, end, period):
+    """Period numbers covering [start, end)"""
+    first, last = _period_index([to_day(start), to_day(end) - 1], period)
+    return first, last - first + 1
+
+
+def period_totals(ledger, start, end, period):
+    """Total and row count of every period in [start, end), empty ones included"""
+    mask = ledger.select(start, end)
+    first, count = _periods(start, end, period)
+    slots = _period_index(ledger.days[mask], period) - first
+    cents = np.bincount(slots, weights=ledger.cents[mask], minlength=count)
+    rows = np.bincount(slots, minlength=count)
+    return {
+        "periods": day_labels(_period_starts(first + np.arange(count), period)),
+        "amounts": to_amounts(cents),
+        "counts": rows.tolist(),
+    }
+
+
+def category_shares(ledger, start, end, period):
+    """Each category's total and share of the period's total, per period"""
+    mask = ledger.select(start, end)
+    first, count = _periods(start, end, period)
+    width = len(ledger.categories) + 1
+    slots = (_period_index(ledger.days[mask], period) - first) * width
+    cents = np.bincount(
+        slots + ledger.codes[mask], weights=ledger.cents[mask], minlength=count * width
+    ).reshape(count, width)
+    totals = cents.sum(axis=1, keepdims=True)
+    shares = np.divide(cents, totals, out=np.zeros_like(cents), where=totals != 0)
+    # Column 0 is uncategorized; keep it only when it has any rows
+    columns = [code for code in range(width) if code or cents[:, 0].any()]
+    return {
+        "periods": day_labels(_period_starts(first + np.arange(count), period)),
+        "categories": [
+            ledger.categories[code - 1] if code else None for code in columns
+        ],
+        "amounts": [to_amounts(cents[:, code]) for code in columns],
+        "shares": [np.round(shares[:, code], 4).tolist() for code in columns],
+    }
+
+
+def rolling_totals(ledger, start, end, window):
+    """Daily totals in [start, end) with the sum and mean of the trailing
+    `window` days ending on each day"""
+    first = to_day(start) - window + 1
+    count = to_day(end) - first
+    mask = (ledger.days >= first) & (ledger.days < first + count)
+    daily = np.bincount(
+        ledger.days[mask] - first, weights=ledger.cents[mask], minlength=count
+    )
+    running = np.concatenate([[0], np.cumsum(daily)])
+    rolling = running[window:] - running[:-window]
+    return {
+        "days": day_labels(np.arange(first + window - 1, first + count)),
+        "amounts": to_amounts(daily[window - 1 :]),
+        "rolling_totals": to_amounts(rolling),
+        "rolling_averages": np.round(rolling / window / 100, 2).tolist(),
+    }
+
+
+def _summary(ledger, start, end):
+    mask = ledger.select(start, end)
+    width = len(ledger.categories) + 1
+    cents = np.bincount(ledger.codes[mask], weights=ledger.cents[mask], minlength=width)
+    return int(ledger.cents[mask].sum()), int(mask.sum()), cents
+
+
+def compare_periods(ledger, current, previous):
+    """Totals of two [start, end) periods, overall and per category, with the
+    change from `previous` to `current`"""
+
+    def change(now, before):
+        return round((now - before) / before * 100, 2) if before else None
+
+    now_cents, now_rows, now_categories = _summary(ledger, *current)
+    before_cents, before_rows, before_categories = _summary(ledger, *previous)
+    codes = np.flatnonzero(now_categories + before_categories).tolist()
+    now_categories, before_categories = (
+        now_categories.tolist(),
+        before_categories.tolist(),
+    )
+    categories = []
+    for code in codes:
+        categories.append(
+            {
+                "category": ledger.categories[code - 1] if code else None,
+                "amount": now_categories[code] / 100,
+                "previous_amount": before_categories[code] / 100,
+                "change": (now_categories[code] - before_categories[code]) / 100,
+                "change_pct": change(now_categories[code], before_categories[code]),
+            }
+        )
+    return {
+        "amount": now_cents / 100,
+        "count": now_rows,
+        "previous_amount": before_cents / 100,
+        "previous_count": before_rows,
+        "change": (now_cents - before_cents) / 100,
+        "change_pct": change(now_cents, before_cents),
+        "categories": sorted(categories, key=lambda row: row["amount"], reverse=True),
+    }
+
+
+def previous_period(start, end):
+    """The period of the same length that ends where [start, end) begins"""
+    return start - (end - start), start
+
+
+def end_exclusive(end_date):
+    """Turn an inclusive end date from the API into an exclusive bound"""
+    return end_date + timedelta(days=1)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from functools import lru_cache
+
+import asyncpg
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DB_POOL_MIN = int(os.getenv("ASYNC_DB_POOL_MIN", os.getenv("DB_POOL_MIN", "1")))
+ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", os.getenv("DB_POOL_MAX", "10")))
+ASYNC_DB_POOL_TIMEOUT = float(
+    os.getenv("ASYNC_DB_POOL_TIMEOUT", os.getenv("DB_POOL_TIMEOUT", "5"))
+)
+
+_PLACEHOLDER = re.compile(r"%s|%%")
+
+
+@lru_cache(maxsize=512)
+def to_dollar_params(query):
+    """Rewrite psycopg2 style `%s` placeholders into asyncpg's `$1, $2, ...`"""
+    counter = 0
+
+    def replace(match):
+        nonlocal counter
+        if match.group(0) == "%%":
+            return "%"
+        counter += 1
+        return f"${counter}"
+
+    return _PLACEHOLDER.sub(replace, query)
+
+
+def _adapt_param(value):
+    # asyncpg is strict about numeric parameters, so hand it Decimals
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, list):
+        return [_adapt_param(v) for v in value]
+    return value
+
+
+class AsyncCursor:
+    """Cursor-style wrapper over an asyncpg connection.
+
+    Takes the same `%s` placeholders and returns the same dict rows as the
+    RealDictCursor from `database.get_db`, so queries read the same on both
+    paths. Only `execute` touches the network; rows are buffered for fetching.
+
+    There is no `rowcount`: asyncpg's `fetch` does not report how many rows a
+    statement changed, so an UPDATE or DELETE that needs to know must use
+    RETURNING and check the rows it gets back.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.query_count = 0
+        self._rows = []
+        self._pos = 0
+
+    async def execute(self, query, params=()):
+        args = [_adapt_param(p) for p in params]
+        self._rows = await self.connection.fetch(to_dollar_params(query), *args)
+        self._pos = 0
+        self.query_count += 1
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return dict(row)
+
+    def fetchall(self):
+        rows = [dict(row) for row in self._rows[self._pos :]]
+        self._pos = len(self._rows)
+        return rows
+
+
+async def _init_connection(conn):
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool():
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    database=os.getenv("DB_NAME"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    host=os.getenv("DB_HOST"),
+                    port=os.getenv("DB_PORT"),
+                    min_size=ASYNC_DB_POOL_MIN,
+                    max_size=ASYNC_DB_POOL_MAX,
+                    init=_init_connection,
+                )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def async_pool_stats():
+    if _pool is None:
+        return {"min_size": ASYNC_DB_POOL_MIN, "max_size": ASYNC_DB_POOL_MAX, "open": 0}
+    return {
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+        "open": _pool.get_size(),
+        "idle": _pool.get_idle_size(),
+        "in_use": _pool.get_size() - _pool.get_idle_size(),
+        "timeout_s": ASYNC_DB_POOL_TIMEOUT,
+    }
+
+
+@asynccontextmanager
+async def acquire_connection():
+    """Check out a pooled connection, answering 503 when none frees up within
+    ASYNC_DB_POOL_TIMEOUT instead of queueing the request indefinitely"""
+    pool = await get_async_pool()
+    try:
+        conn = await pool.acquire(timeout=ASYNC_DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Async database pool saturated, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+async def get_async_db():
+    """Async counterpart of `database.get_db`: yields an AsyncCursor inside a
+    transaction that commits on success"""
+    async with acquire_connection() as conn:
+        async with conn.transaction():
+            yield AsyncCursor(conn)
@@ -1,19 +1,36 @@
 import os
 
-from database import get_db
+from async_database import acquire_connection
+from cache import TTLCache
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from security import TOKEN_USER_CLAIMS
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Resolved users keyed by token subject (email). Each worker has its own
+# copy and no route updates or deletes users, so there is nothing to
+# invalidate; USER_CACHE_TTL bounds how long a user changed or deleted
+# outside the app keeps resolving. A route that changes users must delete
+# the entry from every worker or not cache them at all.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Resolve the bearer token's user.
+
+    With TOKEN_USER_CLAIMS on, tokens carrying the user id and name are
+    trusted without a lookup until they expire; with it off, every token is
+    resolved through the cache and the database.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -28,11 +45,22 @@ def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
     except JWTError:
         raise credentials_exception
 
-    # db is already a RealDictCursor, use it directly
-    db.execute("SELECT id, username, email FROM users WHERE email = %s", (email,))
-    user = db.fetchone()
-    if user is None:
+    # Tokens issued with TOKEN_USER_CLAIMS carry the user, so no lookup at all
+    if TOKEN_USER_CLAIMS and "uid" in payload and "username" in payload:
+        return {"id": payload["uid"], "username": payload["username"], "email": email}
+
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
+    # Only check out a connection on a cache miss
+    async with acquire_connection() as conn:
+        row = await conn.fetchrow(
+            "SELECT id, username, email FROM users WHERE email = $1", email
+        )
+    if row is None:
         raise credentials_exception
 
-    # RealDictCursor returns dict-like objects, so we can access by key
-    return {"id": user["id"], "username": user["username"], "email": user["email"]}
+    user = {"id": row["id"], "username": row["username"], "email": row["email"]}
+    user_cache.set(email, user)
+    return user
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class AsyncTTLCache:
+    """`TTLCache` behind the coroutine interface of `RedisCache`, so callers
+    can await either backend the same way"""
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    async def set(self, key, value):
+        self.cache.set(key, value)
+
+    async def delete(self, key):
+        self.cache.delete(key)
+
+    async def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class RedisCache:
+    """Cache with the `AsyncTTLCache` interface kept in Redis, or any server
+    that speaks its protocol, so every worker process shares the same entries.
+
+    Uses the asyncio client, so `get`, `set`, `delete` and `clear` are
+    coroutines and a slow server never blocks the event loop. Values must be
+    bytes or str. The server evicts by `ttl`; an unreachable server counts as
+    a miss rather than failing the request.
+    """
+
+    def __init__(self, url, ttl=60.0, prefix="cache:"):
+        import redis
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(
+            url, socket_timeout=0.1, socket_connect_timeout=0.1
+        )
+        self.ttl = ttl
+        self.prefix = prefix
+        self._error = redis.RedisError
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def get(self, key, default=None):
+        try:
+            value = await self.client.get(self.prefix + key)
+        except self._error as e:
+            logger.warning(f"Cache read failed: {str(e)}")
+            self._count("errors")
+            value = None
+        if value is None:
+            self._count("misses")
+            return default
+        self._count("hits")
+        return value
+
+    async def set(self, key, value):
+        try:
+            await self.client.set(self.prefix + key, value, px=int(self.ttl * 1000))
+        except self._error as e:
+            logger.warning(f"Cache write failed: {str(e)}")
+            self._count("errors")
+
+    async def delete(self, key):
+        try:
+            await self.client.delete(self.prefix + key)
+        except self._error as e:
+            logger.warning(f"Cache delete failed: {str(e)}")
+            self._count("errors")
+
+    async def clear(self):
+        try:
+            async for key in self.client.scan_iter(match=self.prefix + "*"):
+                await self.client.delete(key)
+        except self._error as e:
+            logger.warning(f"Cache clear failed: {str(e)}")
+            self._count("errors")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -1,25 +1,218 @@
+import logging
 import os
-from json import load
+import threading
+import time
+from contextlib import contextmanager
 
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from dotenv import load_dotenv
+from fastapi import HTTPException, status
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def get_db():
-    conn = psycopg2.connect(
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-    )
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Connections idle for longer than this are pinged before being handed out
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool with a bounded wait and checkout health checks"""
+
+    def __init__(self, minconn, maxconn, timeout, ping_after, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn, **conn_kwargs
+        )
+        # psycopg2's pool raises immediately when exhausted, so the semaphore
+        # is what lets callers queue for up to `timeout` seconds instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def getconn(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+
+        try:
+            conn = self._pool.getconn()
+            # After a database restart every idle connection is stale, so keep
+            # replacing them; more than `maxconn` failures means fresh ones
+            # fail too
+            attempts = 0
+            while not self._is_healthy(conn):
+                self._discard(conn)
+                attempts += 1
+                if attempts > self.maxconn:
+                    raise psycopg2.OperationalError("No healthy database connection")
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return conn
+
+    def putconn(self, conn):
+        close = conn.closed != 0
+        with self._lock:
+            self.in_use -= 1
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+        try:
+            # psycopg2 rolls back anything left open before pooling the connection
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+            self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if (
+            conn.info.transaction_status
+            == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+        ):
+            return False
+
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.ping_after:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            logger.warning("Discarding broken pooled database connection")
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "open": len(self._pool._used) + len(self._pool._pool),
+                "in_use": self.in_use,
+                "idle": len(self._pool._pool),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "avg_wait_ms": round(
+                    self.total_wait / self.checkouts * 1000 if self.checkouts else 0, 3
+                ),
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "timeout_s": self.timeout,
+            }
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    DB_POOL_TIMEOUT,
+                    DB_POOL_PING_AFTER,
+                    dbname=os.getenv("DB_NAME"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    host=os.getenv("DB_HOST"),
+                    port=os.getenv("DB_PORT"),
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats():
+    if _pool is None:
+        return {"min_size": DB_POOL_MIN, "max_size": DB_POOL_MAX, "open": 0}
+    return _pool.stats()
+
+
+@contextmanager
+def db_cursor(name=None):
+    """Check out a pooled connection and yield a RealDictCursor on it.
+
+    Commits when the block exits cleanly and rolls back otherwise. Passing
+    `name` opens a server-side cursor instead.
+    """
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except PoolTimeout:
+        logger.warning("Database pool saturated, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    cur = conn.cursor(name=name, cursor_factory=psycopg2.extras.RealDictCursor)
     try:
         yield cur
+        cur.close()
         conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
     finally:
-        cur.close()
-        conn.close()
+        if not cur.closed:
+            cur.close()
+        pool.putconn(conn)
+
+
+def get_db():
+    with db_cursor() as cur:
+        yield cur
@@ -0,0 +1,53 @@
+"""ETag validators for conditional GETs on per-user list and stats endpoints"""
+
+import hashlib
+
+from fastapi import Response
+
+# Tell browsers to keep the response but revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+async def resource_etag(db, user_id, resources, *variant):
+    """Build a weak ETag from the user's write versions of `resources`.
+
+    The versions are bumped by triggers on every insert, update or delete, so
+    the tag changes exactly when the underlying rows do. `variant` carries
+    anything else the response depends on, such as the query string.
+    """
+    await db.execute(
+        """
+        SELECT resource, version FROM data_versions
+        WHERE user_id = %s AND resource = ANY(%s)
+    """,
+        (user_id, list(resources)),
+    )
+    versions = {row["resource"]: row["version"] for row in db.fetchall()}
+    key = "|".join(
+        [str(user_id)]
+        + [f"{resource}:{versions.get(resource, 0)}" for resource in resources]
+        + [str(part) for part in variant]
+    )
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:24]}"'
+
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(request, response, etag):
+    """Return a 304 response if the client already holds `etag`, otherwise
+    set the validator headers on `response` and return None"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,328 @@
+"""Bulk import of bank statements (CSV or OFX) into expenses and income.
+
+Files are parsed as a stream and loaded in chunks, each chunk validated with
+the same rules as `ExpenseCreate`/`IncomeCreate` and written with COPY in its
+own transaction, so memory stays bounded and a bad row never sinks the file:
+rows that break a column limit are reported before loading, and a chunk that
+the database still rejects is retried in halves until the failing line is
+isolated.
+"""
+
+import csv
+import io
+import logging
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+from pydantic import ValidationError
+from schemas import ExpenseCreate, IncomeCreate
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+# Column limits of expenses/income that the create schemas do not check
+MAX_COUNTERPARTY_LENGTH = 255
+MAX_CATEGORY_LENGTH = 100
+MAX_AMOUNT = Decimal("99999999.99")  # DECIMAL(10, 2)
+
+# Accepted header names (lower-cased) for each field
+COLUMN_ALIASES = {
+    "date": (
+        "date",
+        "expense_date",
+        "income_date",
+        "transaction date",
+        "posted date",
+        "posting date",
+        "value date",
+    ),
+    "amount": ("amount", "value", "transaction amount"),
+    "debit": ("debit", "withdrawal", "money out", "paid out"),
+    "credit": ("credit", "deposit", "money in", "paid in"),
+    "description": ("description", "memo", "details", "narrative", "reference"),
+    "counterparty": ("vendor", "source", "payee", "merchant", "name"),
+    "category": ("category",),
+}
+
+EXPENSE_COLUMNS = (
+    "user_id",
+    "vendor",
+    "description",
+    "amount",
+    "category",
+    "expense_date",
+)
+INCOME_COLUMNS = (
+    "user_id",
+    "source",
+    "description",
+    "amount",
+    "category",
+    "income_date",
+)
+
+
+class ImportFormatError(ValueError):
+    """Raised when a file cannot be read as the requested format at all"""
+
+
+def _parse_amount(value):
+    value = (value or "").strip().replace(",", "")
+    if not value:
+        return None
+    if value.startswith("(") and value.endswith(")"):
+        value = "-" + value[1:-1]
+    return Decimal(value)
+
+
+def _parse_date(value, date_format=None):
+    value = value.strip()
+    if date_format:
+        return datetime.strptime(value, date_format).date()
+    return date.fromisoformat(value[:10])
+
+
+def iter_csv_transactions(text_stream, date_format=None):
+    """Yield (line_number, transaction_dict_or_exception) from a CSV stream"""
+    reader = csv.reader(text_stream)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return
+
+    positions = {}
+    normalized = [column.strip().lower() for column in header]
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[field] = normalized.index(alias)
+                break
+
+    if "date" not in positions or not (
+        "amount" in positions or "debit" in positions or "credit" in positions
+    ):
+        raise ImportFormatError(
+            "CSV needs a date column and an amount (or debit/credit) column"
+        )
+
+    def cell(row, field):
+        index = positions.get(field)
+        return row[index] if index is not None and index < len(row) else ""
+
+    for row in reader:
+        line = reader.line_num
+        if not any(row):
+            continue
+        try:
+            amount = _parse_amount(cell(row, "amount"))
+            if amount is None:
+                debit = _parse_amount(cell(row, "debit"))
+                credit = _parse_amount(cell(row, "credit"))
+                amount = -abs(debit) if debit else credit
+            yield line, {
+                "date": _parse_date(cell(row, "date"), date_format),
+                "amount": amount,
+                "description": cell(row, "description").strip(),
+                "counterparty": cell(row, "counterparty").strip() or None,
+                "category": cell(row, "category").strip() or None,
+            }
+        except (ValueError, InvalidOperation) as e:
+            yield line, e
+
+
+_OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+_OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+def iter_ofx_transactions(text_stream, block_size=1 << 16):
+    """Yield (transaction_number, transaction_dict_or_exception) from an OFX
+    stream, reading it in blocks rather than loading the whole file"""
+    buffer = ""
+    number = 0
+    while True:
+        block = text_stream.read(block_size)
+        buffer += block
+        end = 0
+        for match in _OFX_TRANSACTION.finditer(buffer):
+            number += 1
+            end = match.end()
+            fields = {
+                k.upper(): v.strip() for k, v in _OFX_FIELD.findall(match.group(1))
+            }
+            try:
+                posted = fields.get("DTPOSTED", "")
+                yield number, {
+                    "date": datetime.strptime(posted[:8], "%Y%m%d").date(),
+                    "amount": _parse_amount(fields.get("TRNAMT")),
+                    "description": fields.get("MEMO") or fields.get("NAME") or "",
+                    "counterparty": fields.get("NAME") or None,
+                    "category": None,
+                }
+            except (ValueError, InvalidOperation) as e:
+                yield number, e
+        buffer = buffer[end:]
+        if not block:
+            break
+
+
+def _to_record(transaction, kind):
+    """Validate a parsed transaction and return ("expense"|"income", model)"""
+    amount = transaction["amount"]
+    if amount is None:
+        raise ValueError("missing amount")
+
+    if kind == "auto":
+        kind = "expense" if amount < 0 else "income"
+    description = transaction["description"] or transaction["counterparty"]
+    if not description:
+        raise ValueError("missing description")
+    if len(transaction["counterparty"] or "") > MAX_COUNTERPARTY_LENGTH:
+        raise ValueError(
+            f"{'vendor' if kind == 'expense' else 'source'} is longer than "
+            f"{MAX_COUNTERPARTY_LENGTH} characters"
+        )
+    if len(transaction["category"] or "") > MAX_CATEGORY_LENGTH:
+        raise ValueError(f"category is longer than {MAX_CATEGORY_LENGTH} characters")
+    if abs(amount).quantize(Decimal("0.01")) > MAX_AMOUNT:
+        raise ValueError(f"amount is larger than {MAX_AMOUNT}")
+
+    if kind == "expense":
+        return kind, ExpenseCreate(
+            vendor=transaction["counterparty"],
+            description=description,
+            amount=abs(amount),
+            category=transaction["category"],
+            expense_date=transaction["date"],
+        )
+    return kind, IncomeCreate(
+        source=transaction["counterparty"],
+        description=description,
+        amount=abs(amount),
+        category=transaction["category"],
+        income_date=transaction["date"],
+    )
+
+
+def _copy_rows(db, table, columns, rows):
+    if not rows:
+        return
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    db.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+
+def import_transactions(db, user_id, transactions, kind="auto", chunk_size=CHUNK_SIZE):
+    """Validate and load `transactions` (from one of the iterators above).
+
+    `db` is a psycopg2 cursor; every chunk is committed on its own. Returns a
+    summary with per-row errors.
+    """
+    if kind not in ("auto", "expense", "income"):
+        raise ValueError("kind must be one of: auto, expense, income")
+
+    started = time.perf_counter()
+    summary = {"rows": 0, "expenses": 0, "income": 0, "error_count": 0, "errors": []}
+
+    def record_error(line, message):
+        summary["error_count"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line, "error": message})
+
+    def flush(pending):
+        """COPY `pending` (line, kind, row) tuples in one transaction. If a row
+        is rejected, load each half on its own, so the good rows still go in
+        and the error is reported on the line that caused it. Any other error,
+        such as a lost connection, is raised rather than retried row by row."""
+        if not pending:
+            return
+        expenses = [row for _, record_kind, row in pending if record_kind == "expense"]
+        income = [row for _, record_kind, row in pending if record_kind == "income"]
+        try:
+            _copy_rows(db, "expenses", EXPENSE_COLUMNS, expenses)
+            _copy_rows(db, "income", INCOME_COLUMNS, income)
+            db.connection.commit()
+            summary["expenses"] += len(expenses)
+            summary["income"] += len(income)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            db.connection.rollback()
+            if len(pending) == 1:
+                record_error(pending[0][0], str(e).strip().splitlines()[0])
+                return
+            logger.warning(
+                f"Error importing lines {pending[0][0]}-{pending[-1][0]}, "
+                f"retrying in halves: {str(e)}"
+            )
+            middle = len(pending) // 2
+            flush(pending[:middle])
+            flush(pending[middle:])
+
+    pending = []
+    for line, transaction in transactions:
+        summary["rows"] += 1
+
+        if isinstance(transaction, Exception):
+            record_error(line, str(transaction))
+            continue
+        try:
+            record_kind, record = _to_record(transaction, kind)
+        except (ValidationError, ValueError) as e:
+            record_error(line, str(e))
+            continue
+
+        if record_kind == "expense":
+            pending.append(
+                (
+                    line,
+                    record_kind,
+                    (
+                        user_id,
+                        record.vendor,
+                        record.description,
+                        record.amount,
+                        record.category,
+                        record.expense_date,
+                    ),
+                )
+            )
+        else:
+            pending.append(
+                (
+                    line,
+                    record_kind,
+                    (
+                        user_id,
+                        record.source,
+                        record.description,
+                        record.amount,
+                        record.category,
+                        record.income_date,
+                    ),
+                )
+            )
+
+        if len(pending) >= chunk_size:
+            flush(pending)
+            pending = []
+
+    flush(pending)
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["rows_per_s"] = round(summary["rows"] / elapsed) if elapsed else 0
+    return summary
+
+
+def iter_transactions(text_stream, file_format, date_format=None):
+    if file_format == "csv":
+        return iter_csv_transactions(text_stream, date_format)
+    if file_format in ("ofx", "qfx"):
+        return iter_ofx_transactions(text_stream)
+    raise ImportFormatError(f"Unsupported import format: {file_format}")
@@ -1,15 +1,24 @@
 import logging
 
-from fastapi import FastAPI
+from analytics import ledger_cache
+from async_database import async_pool_stats, close_async_pool
+from auth import get_current_user, user_cache
+from database import close_pool, pool_stats
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
+from response_cache import response_cache
 from routes import (
+    analytics_route,
     auth_route,
     bill_route,
     expense_route,
+    export_route,
+    import_route,
     income_route,
     loan_route,
     stats_route,
+    sync_route,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -18,12 +27,39 @@ logger = logging.getLogger(__name__)
 app = FastAPI()
 
 
+@app.on_event("shutdown")
+async def shutdown_db_pool():
+    close_pool()
+    await close_async_pool()
+
+
+@app.get("/health/db", tags=["health"])
+def get_db_pool_stats(current_user=Depends(get_current_user)):
+    """Report database connection pool size, usage and wait times; signed-in
+    users only, since it exposes server internals"""
+    return {"sync": pool_stats(), "async": async_pool_stats()}
+
+
+@app.get("/health/cache", tags=["health"])
+def get_cache_stats(current_user=Depends(get_current_user)):
+    """Report in-process cache sizes and hit rates; signed-in users only"""
+    return {
+        "users": user_cache.stats(),
+        "responses": response_cache.stats(),
+        "analytics": ledger_cache.stats(),
+    }
+
+
 app.include_router(expense_route)
 app.include_router(income_route)
 app.include_router(stats_route)
 app.include_router(bill_route)
 app.include_router(auth_route)
 app.include_router(loan_route)
+app.include_router(import_route)
+app.include_router(export_route)
+app.include_router(sync_route)
+app.include_router(analytics_route)
 
 # Add CORS middleware
 app.add_middleware(
@@ -32,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -0,0 +1,22 @@
+-- Income and its optional line items (previously scripts/db_income.py)
+CREATE TABLE IF NOT EXISTS income (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    source VARCHAR(255),
+    description TEXT NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    category VARCHAR(100),
+    income_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS income_items (
+    id SERIAL PRIMARY KEY,
+    income_id INTEGER REFERENCES income(id) ON DELETE CASCADE,
+    description TEXT NOT NULL,
+    quantity DECIMAL(10, 3) DEFAULT 1.0,
+    unit_price DECIMAL(10, 2) NOT NULL,
+    line_total DECIMAL(10, 2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
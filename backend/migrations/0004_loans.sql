@@ -0,0 +1,101 @@
+-- Loans, loan transactions and the triggers that keep balances and status
+-- current (previously scripts/db_loan.py)
+CREATE TABLE IF NOT EXISTS loans (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    type VARCHAR(10) NOT NULL CHECK (type IN ('given', 'received')), -- 'given' = money you lent out, 'received' = money you borrowed
+    person_name VARCHAR(255) NOT NULL,
+    person_contact VARCHAR(255),
+    principal_amount DECIMAL(10,2) NOT NULL CHECK (principal_amount > 0),
+    current_balance DECIMAL(10,2) NOT NULL,
+    interest_rate DECIMAL(5,2) DEFAULT 0.00,
+    loan_date DATE NOT NULL,
+    due_date DATE,
+    status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'completed', 'overdue', 'cancelled')),
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS loan_transactions (
+    id SERIAL PRIMARY KEY,
+    loan_id INTEGER NOT NULL REFERENCES loans(id) ON DELETE CASCADE,
+    transaction_type VARCHAR(20) NOT NULL CHECK (transaction_type IN ('payment', 'interest', 'adjustment')),
+    amount DECIMAL(10,2) NOT NULL,
+    transaction_date DATE NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_loans_user_id ON loans(user_id);
+CREATE INDEX IF NOT EXISTS idx_loans_type ON loans(type);
+CREATE INDEX IF NOT EXISTS idx_loans_status ON loans(status);
+CREATE INDEX IF NOT EXISTS idx_loans_due_date ON loans(due_date);
+CREATE INDEX IF NOT EXISTS idx_loan_transactions_loan_id ON loan_transactions(loan_id);
+CREATE INDEX IF NOT EXISTS idx_loan_transactions_date ON loan_transactions(transaction_date);
+
+CREATE OR REPLACE FUNCTION update_loans_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_loans_updated_at ON loans;
+CREATE TRIGGER trigger_update_loans_updated_at
+    BEFORE UPDATE ON loans
+    FOR EACH ROW
+    EXECUTE FUNCTION update_loans_updated_at();
+
+CREATE OR REPLACE FUNCTION update_loan_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Mark as completed if balance is 0 or negative
+    IF NEW.current_balance <= 0 THEN
+        NEW.status = 'completed';
+    -- Mark as overdue if past due date and still has balance
+    ELSIF NEW.due_date IS NOT NULL AND NEW.due_date < CURRENT_DATE AND NEW.current_balance > 0 THEN
+        NEW.status = 'overdue';
+    -- Keep as active if balance exists and not overdue
+    ELSIF NEW.current_balance > 0 THEN
+        NEW.status = 'active';
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_loan_status ON loans;
+CREATE TRIGGER trigger_update_loan_status
+    BEFORE INSERT OR UPDATE ON loans
+    FOR EACH ROW
+    EXECUTE FUNCTION update_loan_status();
+
+CREATE OR REPLACE FUNCTION update_loan_balance_after_transaction()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Update the loan balance based on transaction type
+    IF NEW.transaction_type = 'payment' THEN
+        UPDATE loans
+        SET current_balance = current_balance - NEW.amount
+        WHERE id = NEW.loan_id;
+    ELSIF NEW.transaction_type = 'interest' THEN
+        UPDATE loans
+        SET current_balance = current_balance + NEW.amount
+        WHERE id = NEW.loan_id;
+    ELSIF NEW.transaction_type = 'adjustment' THEN
+        UPDATE loans
+        SET current_balance = current_balance + NEW.amount
+        WHERE id = NEW.loan_id;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_loan_balance ON loan_transactions;
+CREATE TRIGGER trigger_update_loan_balance
+    AFTER INSERT ON loan_transactions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_loan_balance_after_transaction();
@@ -0,0 +1,28 @@
+-- migrate:no-transaction
+-- Indexes behind the list endpoints: batched child loading, cursor
+-- pagination on the full sort key, and the server-side filters. Built
+-- CONCURRENTLY so they can be added to a live database without blocking writes.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expense_items_expense_id
+    ON expense_items(expense_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_items_income_id
+    ON income_items(income_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_keyset
+    ON expenses(user_id, expense_date DESC, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_user_keyset
+    ON income(user_id, income_date DESC, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loans_user_keyset
+    ON loans(user_id, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_category_date
+    ON expenses(user_id, category, expense_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_vendor_date
+    ON expenses(user_id, lower(vendor), expense_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_amount
+    ON expenses(user_id, amount);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_user_category_date
+    ON income(user_id, category, income_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_user_source_date
+    ON income(user_id, lower(source), income_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_user_amount
+    ON income(user_id, amount);
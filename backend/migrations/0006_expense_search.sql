@@ -0,0 +1,9 @@
+-- Full-text document for /expenses/search, kept up to date by Postgres;
+-- vendor names weigh more than descriptions and are not stemmed
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', COALESCE(vendor, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+    ) STORED;
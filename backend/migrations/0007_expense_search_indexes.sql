@@ -0,0 +1,10 @@
+-- migrate:no-transaction
+-- Full-text and trigram indexes for /expenses/search
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_search_vector
+    ON expenses USING GIN (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_vendor_trgm
+    ON expenses USING GIN (vendor gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_description_trgm
+    ON expenses USING GIN (description gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expense_items_description_trgm
+    ON expense_items USING GIN (description gin_trgm_ops);
@@ -0,0 +1,167 @@
+-- Per-user write counters for each resource, bumped by statement-level
+-- triggers so every write path (routes, bill upload, COPY imports) is covered.
+-- List and stats endpoints derive their ETags from these counters.
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    resource VARCHAR(32) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, resource)
+);
+
+-- TG_ARGV: resource name, then for child tables the parent table and the
+-- foreign key column used to find the owning user
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    resource TEXT := TG_ARGV[0];
+    parent_table TEXT := TG_ARGV[1];
+    parent_key TEXT := TG_ARGV[2];
+    changed TEXT := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+    users_query TEXT;
+BEGIN
+    IF parent_table IS NULL THEN
+        users_query := format('SELECT DISTINCT user_id FROM %I', changed);
+    ELSE
+        users_query := format(
+            'SELECT DISTINCT p.user_id FROM %I c JOIN %I p ON p.id = c.%I',
+            changed, parent_table, parent_key
+        );
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO data_versions (user_id, resource, version)
+         SELECT user_id, %L, 1 FROM (%s) changed_users WHERE user_id IS NOT NULL
+         ON CONFLICT (user_id, resource) DO UPDATE
+         SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP',
+        resource, users_query
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_expenses_version_insert ON expenses;
+CREATE TRIGGER trigger_expenses_version_insert
+    AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('expenses');
+
+DROP TRIGGER IF EXISTS trigger_expenses_version_update ON expenses;
+CREATE TRIGGER trigger_expenses_version_update
+    AFTER UPDATE ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('expenses');
+
+DROP TRIGGER IF EXISTS trigger_expenses_version_delete ON expenses;
+CREATE TRIGGER trigger_expenses_version_delete
+    AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('expenses');
+
+DROP TRIGGER IF EXISTS trigger_expense_items_version_insert ON expense_items;
+CREATE TRIGGER trigger_expense_items_version_insert
+    AFTER INSERT ON expense_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('expenses', 'expenses', 'expense_id');
+
+DROP TRIGGER IF EXISTS trigger_expense_items_version_update ON expense_items;
+CREATE TRIGGER trigger_expense_items_version_update
+    AFTER UPDATE ON expense_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('expenses', 'expenses', 'expense_id');
+
+DROP TRIGGER IF EXISTS trigger_expense_items_version_delete ON expense_items;
+CREATE TRIGGER trigger_expense_items_version_delete
+    AFTER DELETE ON expense_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('expenses', 'expenses', 'expense_id');
+
+DROP TRIGGER IF EXISTS trigger_income_version_insert ON income;
+CREATE TRIGGER trigger_income_version_insert
+    AFTER INSERT ON income
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('income');
+
+DROP TRIGGER IF EXISTS trigger_income_version_update ON income;
+CREATE TRIGGER trigger_income_version_update
+    AFTER UPDATE ON income
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('income');
+
+DROP TRIGGER IF EXISTS trigger_income_version_delete ON income;
+CREATE TRIGGER trigger_income_version_delete
+    AFTER DELETE ON income
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('income');
+
+DROP TRIGGER IF EXISTS trigger_income_items_version_insert ON income_items;
+CREATE TRIGGER trigger_income_items_version_insert
+    AFTER INSERT ON income_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('income', 'income', 'income_id');
+
+DROP TRIGGER IF EXISTS trigger_income_items_version_update ON income_items;
+CREATE TRIGGER trigger_income_items_version_update
+    AFTER UPDATE ON income_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('income', 'income', 'income_id');
+
+DROP TRIGGER IF EXISTS trigger_income_items_version_delete ON income_items;
+CREATE TRIGGER trigger_income_items_version_delete
+    AFTER DELETE ON income_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('income', 'income', 'income_id');
+
+DROP TRIGGER IF EXISTS trigger_loans_version_insert ON loans;
+CREATE TRIGGER trigger_loans_version_insert
+    AFTER INSERT ON loans
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('loans');
+
+DROP TRIGGER IF EXISTS trigger_loans_version_update ON loans;
+CREATE TRIGGER trigger_loans_version_update
+    AFTER UPDATE ON loans
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('loans');
+
+DROP TRIGGER IF EXISTS trigger_loans_version_delete ON loans;
+CREATE TRIGGER trigger_loans_version_delete
+    AFTER DELETE ON loans
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('loans');
+
+DROP TRIGGER IF EXISTS trigger_loan_transactions_version_insert ON loan_transactions;
+CREATE TRIGGER trigger_loan_transactions_version_insert
+    AFTER INSERT ON loan_transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('loans', 'loans', 'loan_id');
+
+DROP TRIGGER IF EXISTS trigger_loan_transactions_version_update ON loan_transactions;
+CREATE TRIGGER trigger_loan_transactions_version_update
+    AFTER UPDATE ON loan_transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('loans', 'loans', 'loan_id');
+
+DROP TRIGGER IF EXISTS trigger_loan_transactions_version_delete ON loan_transactions;
+CREATE TRIGGER trigger_loan_transactions_version_delete
+    AFTER DELETE ON loan_transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version('loans', 'loans', 'loan_id');
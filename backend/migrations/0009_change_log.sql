@@ -0,0 +1,180 @@
+-- Row-level change history for /sync/changes. Each entry records the writing
+-- transaction id; a sync token is the oldest transaction still running when
+-- the client last synced, so changes from transactions that commit late are
+-- never skipped.
+CREATE TABLE IF NOT EXISTS change_log (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    resource VARCHAR(32) NOT NULL,
+    row_id INTEGER NOT NULL,
+    operation CHAR(1) NOT NULL CHECK (operation IN ('I', 'U', 'D')),
+    txid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_user_txid ON change_log(user_id, txid);
+CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at);
+
+-- Tokens older than the last pruned transaction can no longer be served
+-- incrementally and get a full snapshot instead
+CREATE TABLE IF NOT EXISTS change_log_horizon (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_txid BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO change_log_horizon (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+-- TG_ARGV: resource name, then for child tables the parent table and the
+-- foreign key column used to find the owning user. Children deleted by a
+-- cascade have no parent left to join and are covered by the parent's entry.
+CREATE OR REPLACE FUNCTION log_changes()
+RETURNS TRIGGER AS $$
+DECLARE
+    resource TEXT := TG_ARGV[0];
+    parent_table TEXT := TG_ARGV[1];
+    parent_key TEXT := TG_ARGV[2];
+    changed TEXT := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+    rows_query TEXT;
+BEGIN
+    IF parent_table IS NULL THEN
+        rows_query := format('SELECT user_id, id FROM %I', changed);
+    ELSE
+        rows_query := format(
+            'SELECT p.user_id, c.id FROM %I c JOIN %I p ON p.id = c.%I',
+            changed, parent_table, parent_key
+        );
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO change_log (user_id, resource, row_id, operation)
+         SELECT user_id, %L, id, %L FROM (%s) changed_rows WHERE user_id IS NOT NULL',
+        resource, left(TG_OP, 1), rows_query
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_expenses_change_log_insert ON expenses;
+CREATE TRIGGER trigger_expenses_change_log_insert
+    AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('expenses');
+
+DROP TRIGGER IF EXISTS trigger_expenses_change_log_update ON expenses;
+CREATE TRIGGER trigger_expenses_change_log_update
+    AFTER UPDATE ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('expenses');
+
+DROP TRIGGER IF EXISTS trigger_expenses_change_log_delete ON expenses;
+CREATE TRIGGER trigger_expenses_change_log_delete
+    AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('expenses');
+
+DROP TRIGGER IF EXISTS trigger_expense_items_change_log_insert ON expense_items;
+CREATE TRIGGER trigger_expense_items_change_log_insert
+    AFTER INSERT ON expense_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('expense_items', 'expenses', 'expense_id');
+
+DROP TRIGGER IF EXISTS trigger_expense_items_change_log_update ON expense_items;
+CREATE TRIGGER trigger_expense_items_change_log_update
+    AFTER UPDATE ON expense_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('expense_items', 'expenses', 'expense_id');
+
+DROP TRIGGER IF EXISTS trigger_expense_items_change_log_delete ON expense_items;
+CREATE TRIGGER trigger_expense_items_change_log_delete
+    AFTER DELETE ON expense_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('expense_items', 'expenses', 'expense_id');
+
+DROP TRIGGER IF EXISTS trigger_income_change_log_insert ON income;
+CREATE TRIGGER trigger_income_change_log_insert
+    AFTER INSERT ON income
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('income');
+
+DROP TRIGGER IF EXISTS trigger_income_change_log_update ON income;
+CREATE TRIGGER trigger_income_change_log_update
+    AFTER UPDATE ON income
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('income');
+
+DROP TRIGGER IF EXISTS trigger_income_change_log_delete ON income;
+CREATE TRIGGER trigger_income_change_log_delete
+    AFTER DELETE ON income
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('income');
+
+DROP TRIGGER IF EXISTS trigger_income_items_change_log_insert ON income_items;
+CREATE TRIGGER trigger_income_items_change_log_insert
+    AFTER INSERT ON income_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('income_items', 'income', 'income_id');
+
+DROP TRIGGER IF EXISTS trigger_income_items_change_log_update ON income_items;
+CREATE TRIGGER trigger_income_items_change_log_update
+    AFTER UPDATE ON income_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('income_items', 'income', 'income_id');
+
+DROP TRIGGER IF EXISTS trigger_income_items_change_log_delete ON income_items;
+CREATE TRIGGER trigger_income_items_change_log_delete
+    AFTER DELETE ON income_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('income_items', 'income', 'income_id');
+
+DROP TRIGGER IF EXISTS trigger_loans_change_log_insert ON loans;
+CREATE TRIGGER trigger_loans_change_log_insert
+    AFTER INSERT ON loans
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('loans');
+
+DROP TRIGGER IF EXISTS trigger_loans_change_log_update ON loans;
+CREATE TRIGGER trigger_loans_change_log_update
+    AFTER UPDATE ON loans
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('loans');
+
+DROP TRIGGER IF EXISTS trigger_loans_change_log_delete ON loans;
+CREATE TRIGGER trigger_loans_change_log_delete
+    AFTER DELETE ON loans
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('loans');
+
+DROP TRIGGER IF EXISTS trigger_loan_transactions_change_log_insert ON loan_transactions;
+CREATE TRIGGER trigger_loan_transactions_change_log_insert
+    AFTER INSERT ON loan_transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('loan_transactions', 'loans', 'loan_id');
+
+DROP TRIGGER IF EXISTS trigger_loan_transactions_change_log_update ON loan_transactions;
+CREATE TRIGGER trigger_loan_transactions_change_log_update
+    AFTER UPDATE ON loan_transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('loan_transactions', 'loans', 'loan_id');
+
+DROP TRIGGER IF EXISTS trigger_loan_transactions_change_log_delete ON loan_transactions;
+CREATE TRIGGER trigger_loan_transactions_change_log_delete
+    AFTER DELETE ON loan_transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_changes('loan_transactions', 'loans', 'loan_id');
@@ -0,0 +1,14 @@
+-- Results of /sync/batch operations by client idempotency key, so a replayed
+-- batch returns the original outcome instead of writing twice. A key is
+-- claimed (status_code NULL) before its operation runs, which makes a
+-- concurrent retry of the same batch wait and then replay.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    status_code INTEGER,
+    response JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
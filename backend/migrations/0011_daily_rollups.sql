@@ -0,0 +1,146 @@
+-- Per-user, per-day, per-category totals of expenses and income, kept current
+-- by statement-level triggers so every write path (routes, bill upload, COPY
+-- imports) is covered. The stats endpoints read these instead of the ledgers.
+-- Uncategorized rows are stored under the empty category, since a primary
+-- key column cannot be NULL.
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    kind VARCHAR(16) NOT NULL CHECK (kind IN ('expenses', 'income')),
+    category VARCHAR(100) NOT NULL DEFAULT '',
+    amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, kind, category)
+);
+
+-- TG_ARGV: rollup kind and the ledger's date column. Inserted rows add to
+-- their day, deleted rows subtract, and an update does both, so a change of
+-- amount, date, category or owner moves the row between rollups. Days that
+-- drop to zero rows are removed.
+CREATE OR REPLACE FUNCTION update_daily_rollups()
+RETURNS TRIGGER AS $$
+DECLARE
+    kind TEXT := TG_ARGV[0];
+    date_column TEXT := TG_ARGV[1];
+    added TEXT := format(
+        'SELECT user_id, %I AS day, category, amount, 1 AS n FROM new_rows',
+        date_column
+    );
+    removed TEXT := format(
+        'SELECT user_id, %I AS day, category, -amount AS amount, -1 AS n FROM old_rows',
+        date_column
+    );
+    changes TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := added;
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := removed;
+    ELSE
+        changes := added || ' UNION ALL ' || removed;
+    END IF;
+
+    -- Rows removed by deleting their user are skipped, the user's rollups
+    -- are deleted with it
+    EXECUTE format(
+        'INSERT INTO daily_rollups AS r (user_id, day, kind, category, amount, count)
+         SELECT user_id, day, %L, COALESCE(category, %L), SUM(amount), SUM(n)
+         FROM (%s) changes
+         WHERE user_id IN (SELECT id FROM users)
+         GROUP BY user_id, day, COALESCE(category, %L)
+         HAVING SUM(amount) <> 0 OR SUM(n) <> 0
+         ON CONFLICT (user_id, day, kind, category) DO UPDATE
+         SET amount = r.amount + EXCLUDED.amount, count = r.count + EXCLUDED.count',
+        kind, '', changes, ''
+    );
+
+    IF TG_OP <> 'INSERT' THEN
+        EXECUTE format(
+            'DELETE FROM daily_rollups r
+             USING (SELECT DISTINCT user_id, %I AS day, COALESCE(category, %L) AS category
+                    FROM old_rows) emptied
+             WHERE r.user_id = emptied.user_id
+                 AND r.day = emptied.day
+                 AND r.kind = %L
+                 AND r.category = emptied.category
+                 AND r.count = 0',
+            date_column, '', kind
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute the rollups of one user, or of everyone when called without one,
+-- from the ledgers. Writes to the ledgers wait until the rebuild commits.
+CREATE OR REPLACE FUNCTION rebuild_daily_rollups(target_user INTEGER DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    rebuilt BIGINT;
+BEGIN
+    LOCK TABLE expenses, income IN SHARE MODE;
+
+    DELETE FROM daily_rollups
+    WHERE target_user IS NULL OR user_id = target_user;
+
+    INSERT INTO daily_rollups (user_id, day, kind, category, amount, count)
+    SELECT user_id, expense_date, 'expenses', COALESCE(category, ''), SUM(amount), COUNT(*)
+    FROM expenses
+    WHERE user_id IS NOT NULL AND (target_user IS NULL OR user_id = target_user)
+    GROUP BY user_id, expense_date, COALESCE(category, '')
+    UNION ALL
+    SELECT user_id, income_date, 'income', COALESCE(category, ''), SUM(amount), COUNT(*)
+    FROM income
+    WHERE user_id IS NOT NULL AND (target_user IS NULL OR user_id = target_user)
+    GROUP BY user_id, income_date, COALESCE(category, '');
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_expenses_rollup_insert ON expenses;
+CREATE TRIGGER trigger_expenses_rollup_insert
+    AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_daily_rollups('expenses', 'expense_date');
+
+DROP TRIGGER IF EXISTS trigger_expenses_rollup_update ON expenses;
+CREATE TRIGGER trigger_expenses_rollup_update
+    AFTER UPDATE ON expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_daily_rollups('expenses', 'expense_date');
+
+DROP TRIGGER IF EXISTS trigger_expenses_rollup_delete ON expenses;
+CREATE TRIGGER trigger_expenses_rollup_delete
+    AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_daily_rollups('expenses', 'expense_date');
+
+DROP TRIGGER IF EXISTS trigger_income_rollup_insert ON income;
+CREATE TRIGGER trigger_income_rollup_insert
+    AFTER INSERT ON income
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_daily_rollups('income', 'income_date');
+
+DROP TRIGGER IF EXISTS trigger_income_rollup_update ON income;
+CREATE TRIGGER trigger_income_rollup_update
+    AFTER UPDATE ON income
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_daily_rollups('income', 'income_date');
+
+DROP TRIGGER IF EXISTS trigger_income_rollup_delete ON income;
+CREATE TRIGGER trigger_income_rollup_delete
+    AFTER DELETE ON income
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION update_daily_rollups('income', 'income_date');
+
+-- Existing ledgers are backfilled by scripts/rebuild_rollups.py one user per
+-- transaction, not here: rebuilding everyone inside this transaction would
+-- hold the SHARE lock, and block every ledger write, until it all commits
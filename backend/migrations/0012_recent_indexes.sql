@@ -0,0 +1,7 @@
+-- migrate:no-transaction
+-- The dashboard's recent-transaction counts filter on created_at, which the
+-- daily rollups cannot answer; these keep them to an index range scan.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_user_created_at
+    ON expenses(user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_user_created_at
+    ON income(user_id, created_at);
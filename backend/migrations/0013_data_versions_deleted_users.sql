@@ -0,0 +1,33 @@
+-- Deleting a user cascades to their rows, and the version triggers from 0008
+-- then upserted counters for a user that no longer exists, failing the
+-- delete on the foreign key. Rows removed by deleting their user are now
+-- skipped; the user's counters are deleted with it.
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    resource TEXT := TG_ARGV[0];
+    parent_table TEXT := TG_ARGV[1];
+    parent_key TEXT := TG_ARGV[2];
+    changed TEXT := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+    users_query TEXT;
+BEGIN
+    IF parent_table IS NULL THEN
+        users_query := format('SELECT DISTINCT user_id FROM %I', changed);
+    ELSE
+        users_query := format(
+            'SELECT DISTINCT p.user_id FROM %I c JOIN %I p ON p.id = c.%I',
+            changed, parent_table, parent_key
+        );
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO data_versions (user_id, resource, version)
+         SELECT user_id, %L, 1 FROM (%s) changed_users
+         WHERE user_id IN (SELECT id FROM users)
+         ON CONFLICT (user_id, resource) DO UPDATE
+         SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP',
+        resource, users_query
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,31 @@
+-- Deleting a user cascades to their rows, and the change log triggers from
+-- 0009 then logged entries for a user that no longer exists, failing the
+-- delete on the foreign key. Rows removed by deleting their user need no
+-- entry at all, the user's log is deleted with it.
+CREATE OR REPLACE FUNCTION log_changes()
+RETURNS TRIGGER AS $$
+DECLARE
+    resource TEXT := TG_ARGV[0];
+    parent_table TEXT := TG_ARGV[1];
+    parent_key TEXT := TG_ARGV[2];
+    changed TEXT := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+    rows_query TEXT;
+BEGIN
+    IF parent_table IS NULL THEN
+        rows_query := format('SELECT user_id, id FROM %I', changed);
+    ELSE
+        rows_query := format(
+            'SELECT p.user_id, c.id FROM %I c JOIN %I p ON p.id = c.%I',
+            changed, parent_table, parent_key
+        );
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO change_log (user_id, resource, row_id, operation)
+         SELECT user_id, %L, id, %L FROM (%s) changed_rows
+         WHERE user_id IN (SELECT id FROM users)',
+        resource, left(TG_OP, 1), rows_query
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,9 @@
+-- migrate:no-transaction
+-- Full-text index for /expenses/search on the document expression the query
+-- uses (EXPENSE_SEARCH_DOCUMENT in routes/expense.py); vendor names weigh more
+-- than descriptions and are not stemmed
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_search_document
+    ON expenses USING GIN ((
+        setweight(to_tsvector('simple', COALESCE(vendor, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+    ));
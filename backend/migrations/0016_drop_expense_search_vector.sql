@@ -0,0 +1,4 @@
+-- 0006/0007 store the search document in a generated search_vector column,
+-- which search no longer reads now that 0015 indexes the expression; dropping
+-- the column only changes the catalog and removes its index with it
+ALTER TABLE expenses DROP COLUMN IF EXISTS search_vector;
@@ -0,0 +1,269 @@
+"""SQL helpers shared by the route modules"""
+
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+
+EXPENSE_ITEM_COLUMNS = "id, description, quantity, unit_price, line_total, created_at"
+INCOME_ITEM_COLUMNS = "id, description, quantity, unit_price, line_total, created_at"
+LOAN_TRANSACTION_COLUMNS = (
+    "id, loan_id, transaction_type, amount, transaction_date, description, created_at"
+)
+EXPENSE_COLUMNS = (
+    "id, user_id, vendor, description, amount, category, expense_date, "
+    "created_at, updated_at"
+)
+INCOME_COLUMNS = (
+    "id, user_id, source, description, amount, category, income_date, "
+    "created_at, updated_at"
+)
+LOAN_COLUMNS = (
+    "id, user_id, type, person_name, person_contact, principal_amount, "
+    "current_balance, interest_rate, loan_date, due_date, status, description, "
+    "created_at, updated_at"
+)
+
+
+async def insert_items(db, table, parent_column, parent_id, items):
+    """Insert all line items of one expense/income with a single statement and
+    return them, with their generated ids, in the order they were given"""
+    if not items:
+        return []
+
+    rows = await _insert_numbered_items(
+        db,
+        table,
+        parent_column,
+        [parent_id] * len(items),
+        items,
+    )
+    for row in rows:
+        del row["parent_id"]
+    return rows
+
+
+async def insert_items_many(db, table, parent_column, parents):
+    """Insert the line items of several parents with a single statement.
+
+    `parents` is a list of `(parent_id, items)`; returns `{parent_id: items}`
+    with every parent present and items in the order they were given.
+    """
+    inserted = {parent_id: [] for parent_id, _ in parents}
+    rows = [(parent_id, item) for parent_id, items in parents for item in items]
+    if not rows:
+        return inserted
+
+    for row in await _insert_numbered_items(
+        db,
+        table,
+        parent_column,
+        [parent_id for parent_id, _ in rows],
+        [item for _, item in rows],
+    ):
+        inserted[row.pop("parent_id")].append(row)
+    return inserted
+
+
+async def _insert_numbered_items(db, table, parent_column, parent_ids, items):
+    """Insert line items with one statement and return them in input order.
+
+    INSERT ... SELECT does not promise to draw ids in input order and RETURNING
+    cannot see the input's position, so each input row takes its id from the
+    sequence up front, next to its ordinality, and the inserted rows are
+    joined back on it.
+    """
+    await db.execute(
+        f"""
+        WITH input AS MATERIALIZED (
+            SELECT nextval(pg_get_serial_sequence('{table}', 'id')) AS id, u.*
+            FROM unnest(%s::int[], %s::text[], %s::numeric[], %s::numeric[], %s::numeric[])
+                WITH ORDINALITY
+                AS u(parent_id, description, quantity, unit_price, line_total, position)
+        ),
+        inserted AS (
+            INSERT INTO {table}
+                (id, {parent_column}, description, quantity, unit_price, line_total)
+            SELECT id, parent_id, description, quantity, unit_price, line_total
+            FROM input
+            RETURNING id, {parent_column} AS parent_id, description, quantity,
+                      unit_price, line_total, created_at
+        )
+        SELECT inserted.*
+        FROM inserted
+        JOIN input ON input.id = inserted.id
+        ORDER BY input.position
+    """,
+        (
+            parent_ids,
+            [item.description for item in items],
+            [item.quantity for item in items],
+            [item.unit_price for item in items],
+            [item.line_total for item in items],
+        ),
+    )
+    return db.fetchall()
+
+
+def children_json(table, foreign_key, columns, parent, order_by="c.id"):
+    """Correlated subquery that returns the children of the `parent` row alias
+    as a JSON array, so a single statement can return a row with its items"""
+    fields = ", ".join(
+        f"'{column.strip()}', c.{column.strip()}" for column in columns.split(",")
+    )
+    return f"""COALESCE(
+        (SELECT json_agg(json_build_object({fields}) ORDER BY {order_by})
+         FROM {table} c WHERE c.{foreign_key} = {parent}.id),
+        '[]'::json
+    )"""
+
+
+async def json_page(
+    db, page_query, params, columns, sort_columns, limit, children=None
+):
+    """Have Postgres render one list page as a JSON array.
+
+    `page_query` selects the page's parent rows (sorted DESC on
+    `sort_columns`); `children` maps a key to a `children_json` subquery on
+    the alias `p`. Returns the body as text, ready to send, and the cursor of
+    the next page or None.
+    """
+    fields = [
+        f"'{column.strip()}', p.{column.strip()}" for column in columns.split(",")
+    ]
+    fields += [f"'{key}', {subquery}" for key, subquery in (children or {}).items()]
+    order = ", ".join(f"p.{column} DESC" for column in sort_columns)
+    key_columns = ", ".join(f"p.{column}" for column in sort_columns)
+    await db.execute(
+        f"""
+        WITH p AS ({page_query})
+        SELECT COALESCE(
+                   json_agg(json_build_object({", ".join(fields)}) ORDER BY {order}),
+                   '[]'::json
+               )::text AS body,
+               count(*) AS row_count,
+               -- The last row in DESC order is the first in ascending order
+               (array_agg(json_build_array({key_columns})::text ORDER BY {key_columns}))[1]
+                   AS last_key
+        FROM p
+    """,
+        params,
+    )
+    page = db.fetchone()
+    cursor = None
+    if page["row_count"] >= limit:
+        cursor = encode_cursor(json.loads(page["last_key"]))
+    return page["body"], cursor
+
+
+def ledger_filters(
+    date_column,
+    counterparty_column,
+    start_date=None,
+    end_date=None,
+    categories=None,
+    counterparty=None,
+    min_amount=None,
+    max_amount=None,
+):
+    """Compile the optional expense/income list filters into SQL conditions
+    and their parameters. Dates are inclusive, counterparty matching ignores
+    case; every condition is served by a (user_id, ...) index."""
+    conditions, params = [], []
+    if start_date is not None:
+        conditions.append(f"{date_column} >= %s")
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append(f"{date_column} <= %s")
+        params.append(end_date)
+    if categories:
+        conditions.append("category = ANY(%s)")
+        params.append(list(categories))
+    if counterparty:
+        conditions.append(f"lower({counterparty_column}) = lower(%s)")
+        params.append(counterparty)
+    if min_amount is not None:
+        conditions.append("amount >= %s")
+        params.append(min_amount)
+    if max_amount is not None:
+        conditions.append("amount <= %s")
+        params.append(max_amount)
+    return conditions, params
+
+
+def bulk_conditions(user_id, ids, date_column, counterparty_column, **filters):
+    """Conditions selecting the user's rows for a bulk update or delete, by id
+    list, by `ledger_filters` filters, or both. Refuses an empty selection so
+    a missing body never touches every row."""
+    conditions, params = ["user_id = %s"], [user_id]
+    if ids is not None:
+        conditions.append("id = ANY(%s)")
+        params.append(list(ids))
+    filter_conditions, filter_params = ledger_filters(
+        date_column, counterparty_column, **filters
+    )
+    if ids is None and not filter_conditions:
+        raise HTTPException(
+            status_code=400, detail="Select rows with ids or at least one filter"
+        )
+    return conditions + filter_conditions, params + filter_params
+
+
+def period_bounds(year, month=None, week=None):
+    """First day of a calendar year, month or ISO week and the first day after
+    it, as a half-open `[start, end)` pair"""
+    try:
+        if week is not None:
+            start = date.fromisocalendar(year, week, 1)
+            return start, start + timedelta(days=7)
+        if month is not None:
+            start = date(year, month, 1)
+            return start, (start + timedelta(days=31)).replace(day=1)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid period")
+
+
+def period_condition(date_column, start=None, end=None):
+    """Half-open `start <= date_column < end` condition and its parameters;
+    either bound may be None. Comparing the bare column lets a (user_id, date)
+    index answer it with a range scan, which `EXTRACT(...) = %s` cannot."""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f"{date_column} >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{date_column} < %s")
+        params.append(end)
+    return " AND ".join(conditions) or "TRUE", params
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row on a page into an opaque cursor"""
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    """Unpack a cursor from `encode_cursor`, converting each value with `types`"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if len(values) != len(types):
+            raise ValueError("cursor has the wrong number of values")
+        return [
+            t.fromisoformat(v) if t in (date, datetime) else t(v)
+            for t, v in zip(types, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_condition(cursor, columns, types):
+    """Seek condition for a page after `cursor` when sorting DESC on `columns`"""
+    values = decode_cursor(cursor, types)
+    placeholders = ", ".join(["%s"] * len(columns))
+    return f"({', '.join(columns)}) < ({placeholders})", values
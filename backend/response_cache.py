@@ -0,0 +1,62 @@
+"""Cache of rendered stats responses, keyed by the user's data versions.
+
+The key is the response's ETag, which `resource_etag` derives from the
+user's write versions of the resources the response reads. Triggers bump
+those versions on every insert, update or delete, whatever route or import
+made it, so a write changes the key and a stale body is never served; old
+entries simply age out.
+
+Entries live in an in-process LRU by default. Set RESPONSE_CACHE_URL to a
+Redis URL to share one cache between uvicorn workers. Both backends are
+awaited the same way, so a slow server holds up only the request waiting on
+it and the helpers below never care which one is configured.
+"""
+
+import os
+
+from cache import AsyncTTLCache, RedisCache
+from dotenv import load_dotenv
+from etags import not_modified, resource_etag
+from responses import dump_json, raw_json
+
+load_dotenv()
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "4096"))
+
+if RESPONSE_CACHE_URL:
+    response_cache = RedisCache(
+        RESPONSE_CACHE_URL, ttl=RESPONSE_CACHE_TTL, prefix="responses:"
+    )
+else:
+    response_cache = AsyncTTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+async def cached_response(db, request, response, user_id, resources, *variant):
+    """Validate the request against the current ETag and look up its body.
+
+    Returns `(etag, early)`: `early` is a 304 or the cached response when one
+    can be sent as is, otherwise None and the caller renders the response and
+    hands it to `store_response` under `etag`. `variant` must name the
+    endpoint as well as its parameters, since the ETag is the cache key.
+    """
+    etag = await resource_etag(db, user_id, resources, *variant)
+    unchanged = not_modified(request, response, etag)
+    if unchanged:
+        return etag, unchanged
+    body = await response_cache.get(etag)
+    if body is not None:
+        return etag, raw_json(body, response)
+    return etag, None
+
+
+async def store_response(etag, content, response):
+    """Render `content`, cache the body under `etag` and return it"""
+    body = dump_json(content)
+    await response_cache.set(etag, body)
+    return raw_json(body, response)
+
+
+async def clear_responses():
+    """Drop every cached response"""
+    await response_cache.clear()
@@ -0,0 +1,74 @@
+"""Response helpers shared by the route modules"""
+
+import functools
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is the fallback
+    orjson = None
+
+
+def _json_default(value):
+    # Same output as FastAPI's encoder for the types our rows contain
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def dump_json(content):
+    """Encode rows straight from the database to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default)
+    return json.dumps(
+        content, default=_json_default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def raw_json(body, response=None):
+    """Send a JSON body that is already rendered, such as one built by
+    Postgres, without parsing it back into Python objects.
+
+    Headers set on the route's injected `response` (cursors, ETags) are
+    carried over, since FastAPI only applies them to responses it builds.
+    """
+    headers = {}
+    if response is not None:
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name != "content-length"
+        }
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def to_columns(rows, fields):
+    """Transpose a list of row dicts into one array per field, which is what
+    chart series want and avoids repeating every key in every row"""
+    return {field: [row[field] for row in rows] for field in fields}
+
+
+def trusted_response(handler):
+    """Serialize what a handler returns without validating it against the
+    route's `response_model`.
+
+    For handlers whose rows come straight from our own tables, so the model
+    only documents the route in OpenAPI. Responses the handler builds itself
+    pass through; the undecorated handler stays available as `__wrapped__`
+    for callers that want the plain rows.
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        result = await handler(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+        return raw_json(dump_json(result))
+
+    return wrapper
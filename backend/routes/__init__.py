@@ -1,9 +1,13 @@
+from .analytics import analytics_route
 from .auth import auth_route
 from .bill import bill_route
 from .expense import expense_route
+from .export import export_route
+from .imports import import_route
 from .income import income_route
 from .loan import loan_route
 from .stats import stats_route
+from .sync import sync_route
 
 __app_include__ = [
     expense_route,
@@ -12,4 +16,8 @@ __app_include__ = [
     bill_route,
     auth_route,
     loan_route,
+    import_route,
+    export_route,
+    sync_route,
+    analytics_route,
 ]
@@ -0,0 +1,180 @@
+import logging
+from datetime import date, timedelta
+from typing import Optional
+
+from analytics import (
+    LEDGERS,
+    PERIODS,
+    category_shares,
+    compare_periods,
+    end_exclusive,
+    load_ledgers,
+    period_totals,
+    previous_period,
+    rolling_totals,
+)
+from async_database import get_async_db
+from auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+analytics_route = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Longest range a single request may cover, to bound the response size
+MAX_RANGE_DAYS = 366 * 20
+MAX_WINDOW_DAYS = 366
+
+
+def _check_kind(kind):
+    if kind not in LEDGERS:
+        raise HTTPException(
+            status_code=400, detail="Kind must be one of: expenses, income"
+        )
+
+
+def _check_period(period):
+    if period not in PERIODS:
+        raise HTTPException(
+            status_code=400, detail="Period must be one of: day, week, month, year"
+        )
+
+
+def _date_range(start_date, end_date):
+    """Resolve inclusive API dates, defaulting to the last year, into `[start, end)`"""
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=364)
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=400, detail="start_date must not be after end_date"
+        )
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail="Date range is too long")
+    return start_date, end_exclusive(end_date)
+
+
+@analytics_route.get("/totals")
+async def get_period_totals(
+    kind: str = "expenses",
+    period: str = "month",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get the total and count of every day, week, month or year in a range"""
+    _check_kind(kind)
+    _check_period(period)
+    start, end = _date_range(start_date, end_date)
+    try:
+        ledgers = await load_ledgers(db, current_user["id"])
+        return {
+            "kind": kind,
+            "period": period,
+            **period_totals(ledgers[kind], start, end, period),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing period totals: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute totals")
+
+
+@analytics_route.get("/category-shares")
+async def get_category_shares(
+    kind: str = "expenses",
+    period: str = "month",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get each category's total and share of the total per period; `amounts`
+    and `shares` hold one series per category, aligned with `periods`"""
+    _check_kind(kind)
+    _check_period(period)
+    start, end = _date_range(start_date, end_date)
+    try:
+        ledgers = await load_ledgers(db, current_user["id"])
+        return {
+            "kind": kind,
+            "period": period,
+            **category_shares(ledgers[kind], start, end, period),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing category shares: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute category shares")
+
+
+@analytics_route.get("/rolling")
+async def get_rolling_totals(
+    kind: str = "expenses",
+    window: int = 30,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get daily totals with the rolling sum and average of the trailing
+    `window` days, which may reach back before `start_date`"""
+    _check_kind(kind)
+    if not 1 <= window <= MAX_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Window must be 1 to {MAX_WINDOW_DAYS} days"
+        )
+    start, end = _date_range(start_date, end_date)
+    try:
+        ledgers = await load_ledgers(db, current_user["id"])
+        return {
+            "kind": kind,
+            "window": window,
+            **rolling_totals(ledgers[kind], start, end, window),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing rolling totals: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute rolling totals")
+
+
+@analytics_route.get("/compare")
+async def get_period_comparison(
+    kind: str = "expenses",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    previous_start_date: Optional[date] = None,
+    previous_end_date: Optional[date] = None,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Compare a range with another one, by default the equally long range
+    right before it, overall and per category"""
+    _check_kind(kind)
+    current = _date_range(start_date, end_date)
+    if previous_start_date or previous_end_date:
+        if not (previous_start_date and previous_end_date):
+            raise HTTPException(
+                status_code=400,
+                detail="Give both previous_start_date and previous_end_date",
+            )
+        previous = _date_range(previous_start_date, previous_end_date)
+    else:
+        previous = previous_period(*current)
+    try:
+        ledgers = await load_ledgers(db, current_user["id"])
+        return {
+            "kind": kind,
+            "start_date": current[0],
+            "end_date": current[1] - timedelta(days=1),
+            "previous_start_date": previous[0],
+            "previous_end_date": previous[1] - timedelta(days=1),
+            **compare_periods(ledgers[kind], current, previous),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error comparing periods: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compare periods")
@@ -4,7 +4,12 @@ from database import get_db
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from schemas import Token, UserCreate, UserOut
-from security import create_access_token, get_password_hash, verify_password
+from security import (
+    TOKEN_USER_CLAIMS,
+    create_access_token,
+    get_password_hash,
+    verify_password,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -58,5 +63,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_db)):
         )
 
     logger.info("Login successful, creating token")
-    token = create_access_token(data={"sub": user["email"]})
+    claims = {"sub": user["email"]}
+    if TOKEN_USER_CLAIMS:
+        claims.update({"uid": user["id"], "username": user["username"]})
+    token = create_access_token(data=claims)
     return {"access_token": token, "token_type": "bearer"}
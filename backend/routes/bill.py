@@ -54,8 +54,6 @@ def save_bill_expenses(
 ):
     """Save parsed bill data as individual expenses for each item"""
     try:
-        saved_expenses = []
-
         # Parse the invoice date
         try:
             expense_date = (
@@ -66,60 +64,87 @@ def save_bill_expenses(
         except ValueError:
             expense_date = date.today()
 
-        # Save each item as a separate expense
+        # Convert to Decimal for precise calculations
+        quantities, unit_prices, line_totals = [], [], []
         for item in bill_data.items:
-            # Convert to Decimal for precise calculations
-            quantity = Decimal(str(item.quantity)).quantize(
-                Decimal("0.001"), rounding=ROUND_HALF_UP
+            quantities.append(
+                Decimal(str(item.quantity)).quantize(
+                    Decimal("0.001"), rounding=ROUND_HALF_UP
+                )
             )
-            unit_price = Decimal(str(item.unit_price)).quantize(
-                Decimal("0.01"), rounding=ROUND_HALF_UP
+            unit_prices.append(
+                Decimal(str(item.unit_price)).quantize(
+                    Decimal("0.01"), rounding=ROUND_HALF_UP
+                )
             )
-            line_total = Decimal(str(item.line_total)).quantize(
-                Decimal("0.01"), rounding=ROUND_HALF_UP
+            line_totals.append(
+                Decimal(str(item.line_total)).quantize(
+                    Decimal("0.01"), rounding=ROUND_HALF_UP
+                )
             )
 
-            # Insert expense for this item
+        if not bill_data.items:
+            saved_expenses = []
+        else:
+            descriptions = [item.description for item in bill_data.items]
+
+            # Insert one expense per item in a single statement. Ids are drawn
+            # up front next to each item's position, since INSERT ... SELECT
+            # does not promise to assign them in input order
             db.execute(
                 """
-                INSERT INTO expenses (user_id, vendor, description, amount, category, expense_date) 
-                VALUES (%s, %s, %s, %s, %s, %s) 
-                RETURNING id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
+                WITH input AS MATERIALIZED (
+                    SELECT nextval(pg_get_serial_sequence('expenses', 'id')) AS id, t.*
+                    FROM unnest(%s::text[], %s::numeric[], %s::text[])
+                        WITH ORDINALITY AS t(description, amount, category, position)
+                ),
+                inserted AS (
+                    INSERT INTO expenses (id, user_id, vendor, description, amount, category, expense_date)
+                    SELECT id, %s, %s, description, amount, category, %s
+                    FROM input
+                    RETURNING id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
+                )
+                SELECT inserted.*
+                FROM inserted
+                JOIN input ON input.id = inserted.id
+                ORDER BY input.position
             """,
                 (
+                    descriptions,
+                    line_totals,
+                    [
+                        item.category if hasattr(item, "category") else "Others"
+                        for item in bill_data.items
+                    ],
                     current_user["id"],
                     bill_data.vendor,
-                    item.description,
-                    float(line_total),
-                    item.category if hasattr(item, "category") else "Others",
                     expense_date,
                 ),
             )
+            new_expenses = db.fetchall()
 
-            new_expense = db.fetchone()
-            expense_id = new_expense["id"]
-
-            # Insert the item details
+            # Insert the item details of every expense in a single statement
             db.execute(
                 """
                 INSERT INTO expense_items (expense_id, description, quantity, unit_price, line_total) 
-                VALUES (%s, %s, %s, %s, %s) 
-                RETURNING id, description, quantity, unit_price, line_total, created_at
+                SELECT * FROM unnest(%s::int[], %s::text[], %s::numeric[], %s::numeric[], %s::numeric[])
+                RETURNING expense_id, id, description, quantity, unit_price, line_total, created_at
             """,
                 (
-                    expense_id,
-                    item.description,
-                    float(quantity),
-                    float(unit_price),
-                    float(line_total),
+                    [expense["id"] for expense in new_expenses],
+                    descriptions,
+                    quantities,
+                    unit_prices,
+                    line_totals,
                 ),
             )
+            item_details = {row.pop("expense_id"): row for row in db.fetchall()}
 
-            item_details = db.fetchone()
-
-            # Add the expense with its item to results
-            expense_with_items = {**new_expense, "items": [item_details]}
-            saved_expenses.append(expense_with_items)
+            # Add each expense with its item to results
+            saved_expenses = [
+                {**expense, "items": [item_details[expense["id"]]]}
+                for expense in new_expenses
+            ]
 
         return {
             "message": f"Successfully saved {len(saved_expenses)} expenses",
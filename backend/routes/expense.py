@@ -1,12 +1,33 @@
 import logging
 import os
 import sys
-from typing import List
+from datetime import date, datetime
+from typing import List, Optional
 
+from async_database import get_async_db
 from auth import get_current_user
-from database import get_db
-from fastapi import APIRouter, Depends, HTTPException
-from schemas import ExpenseCreate, ExpenseOut, ExpenseUpdate
+from etags import not_modified, resource_etag
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from queries import (
+    EXPENSE_COLUMNS,
+    EXPENSE_ITEM_COLUMNS,
+    bulk_conditions,
+    children_json,
+    insert_items,
+    json_page,
+    keyset_condition,
+    ledger_filters,
+)
+from responses import raw_json, trusted_response
+from schemas import (
+    ExpenseBulkDelete,
+    ExpenseBulkUpdate,
+    ExpenseCreate,
+    ExpenseFilter,
+    ExpenseOut,
+    ExpenseSearchHit,
+    ExpenseUpdate,
+)
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,16 +38,22 @@ logger = logging.getLogger(__name__)
 # expense router
 expense_route = APIRouter(prefix="/expenses", tags=["expenses"])
 
+# Sort key of the expense list, newest first; also what page cursors encode
+EXPENSE_SORT_COLUMNS = ("expense_date", "created_at", "id")
+
 
 # Expense endpoints
 @expense_route.post("/", response_model=ExpenseOut)
-def create_expense(
-    expense: ExpenseCreate, db=Depends(get_db), current_user=Depends(get_current_user)
+@trusted_response
+async def create_expense(
+    expense: ExpenseCreate,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
 ):
     """Create a new expense"""
     try:
         # Insert expense
-        db.execute(
+        await db.execute(
             """
             INSERT INTO expenses (user_id, vendor, description, amount, category, expense_date) 
             VALUES (%s, %s, %s, %s, %s, %s) 
@@ -45,25 +72,10 @@ def create_expense(
         new_expense = db.fetchone()
         expense_id = new_expense["id"]
 
-        # Insert expense items if provided
-        items = []
-        if expense.items:
-            for item in expense.items:
-                db.execute(
-                    """
-                    INSERT INTO expense_items (expense_id, description, quantity, unit_price, line_total) 
-                    VALUES (%s, %s, %s, %s, %s) 
-                    RETURNING id, description, quantity, unit_price, line_total, created_at
-                """,
-                    (
-                        expense_id,
-                        item.description,
-                        item.quantity,
-                        item.unit_price,
-                        item.line_total,
-                    ),
-                )
-                items.append(db.fetchone())
+        # Insert all expense items in one statement
+        items = await insert_items(
+            db, "expense_items", "expense_id", expense_id, expense.items
+        )
 
         # Return expense with items
         return {**new_expense, "items": items}
@@ -74,57 +86,177 @@ def create_expense(
 
 
 @expense_route.get("/", response_model=List[ExpenseOut])
-def get_expenses(
-    db=Depends(get_db),
+async def get_expenses(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category: Optional[List[str]] = Query(None),
+    vendor: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
 ):
-    """Get user's expenses"""
+    """Get user's expenses.
+
+    Pass the `X-Next-Cursor` header of a page as `after` to fetch the next
+    one by seeking on the sort key; `skip` is ignored when `after` is given.
+    `category` may be repeated to match any of several categories.
+    Send the returned `ETag` back as `If-None-Match` to get a 304 while
+    nothing has changed.
+    """
     try:
-        # Get expenses
-        db.execute(
-            """
-            SELECT id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at 
-            FROM expenses 
-            WHERE user_id = %s 
-            ORDER BY expense_date DESC, created_at DESC 
-            LIMIT %s OFFSET %s
-        """,
-            (current_user["id"], limit, skip),
+        etag = await resource_etag(
+            db, current_user["id"], ("expenses",), request.url.query
         )
+        unchanged = not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
+        where_conditions = ["user_id = %s"]
+        params = [current_user["id"]]
+
+        filter_conditions, filter_params = ledger_filters(
+            "expense_date",
+            "vendor",
+            start_date=start_date,
+            end_date=end_date,
+            categories=category,
+            counterparty=vendor,
+            min_amount=min_amount,
+            max_amount=max_amount,
+        )
+        where_conditions.extend(filter_conditions)
+        params.extend(filter_params)
 
-        expenses = db.fetchall()
-
-        # Get items for each expense
-        result = []
-        for expense in expenses:
-            db.execute(
-                """
-                SELECT id, description, quantity, unit_price, line_total, created_at 
-                FROM expense_items 
-                WHERE expense_id = %s
-            """,
-                (expense["id"],),
+        if after:
+            condition, values = keyset_condition(
+                after, EXPENSE_SORT_COLUMNS, (date, datetime, int)
             )
-            items = db.fetchall()
-            result.append({**expense, "items": items})
+            where_conditions.append(condition)
+            params.extend(values)
+            skip = 0
+
+        params.extend([limit, skip])
+
+        # Postgres renders the page, items included, straight to JSON text
+        body, cursor = await json_page(
+            db,
+            f"""
+            SELECT {EXPENSE_COLUMNS}
+            FROM expenses
+            WHERE {' AND '.join(where_conditions)}
+            ORDER BY expense_date DESC, created_at DESC, id DESC
+            LIMIT %s OFFSET %s
+        """,
+            params,
+            EXPENSE_COLUMNS,
+            EXPENSE_SORT_COLUMNS,
+            limit,
+            children={
+                "items": children_json(
+                    "expense_items", "expense_id", EXPENSE_ITEM_COLUMNS, "p"
+                )
+            },
+        )
+        if cursor:
+            response.headers["X-Next-Cursor"] = cursor
 
-        return result
+        return raw_json(body, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting expenses: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get expenses")
 
 
+# Full-text document of an expense `e`; must stay identical to the expression
+# of idx_expenses_search_document (migration 0015) for the index to be used
+EXPENSE_SEARCH_DOCUMENT = """(
+    setweight(to_tsvector('simple', COALESCE(e.vendor, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(e.description, '')), 'B')
+)"""
+
+
+@expense_route.get("/search", response_model=List[ExpenseSearchHit])
+@trusted_response
+async def search_expenses(
+    q: str = Query(..., min_length=1, max_length=200),
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+    skip: int = 0,
+    limit: int = 20,
+):
+    """Search expenses by vendor, description and item descriptions.
+
+    Combines full-text matching (ranked, with highlighted snippets) with
+    trigram similarity, so misspelled or partial vendor names still match.
+    """
+    try:
+        user_id = current_user["id"]
+        await db.execute(
+            f"""
+            WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+            matches AS (
+                SELECT e.id
+                FROM expenses e, q
+                WHERE e.user_id = %s
+                    AND ({EXPENSE_SEARCH_DOCUMENT} @@ q.query OR e.vendor %% %s OR e.description %% %s)
+                UNION
+                SELECT i.expense_id
+                FROM expense_items i
+                JOIN expenses e ON e.id = i.expense_id
+                WHERE e.user_id = %s AND i.description %% %s
+            )
+            SELECT e.id, e.user_id, e.vendor, e.description, e.amount, e.category,
+                   e.expense_date, e.created_at, e.updated_at,
+                   GREATEST(
+                       ts_rank({EXPENSE_SEARCH_DOCUMENT}, q.query),
+                       similarity(COALESCE(e.vendor, ''), %s),
+                       similarity(e.description, %s),
+                       COALESCE(items.best_similarity, 0)
+                   ) AS rank,
+                   ts_headline(
+                       'english', e.description, q.query,
+                       'StartSel=<mark>, StopSel=</mark>, MaxFragments=2'
+                   ) AS snippet,
+                   COALESCE(items.matched_items, '{{}}') AS matched_items
+            FROM matches m
+            JOIN expenses e ON e.id = m.id
+            CROSS JOIN q
+            LEFT JOIN LATERAL (
+                SELECT MAX(similarity(i.description, %s)) AS best_similarity,
+                       ARRAY_AGG(i.description ORDER BY i.id) AS matched_items
+                FROM expense_items i
+                WHERE i.expense_id = e.id AND i.description %% %s
+            ) items ON TRUE
+            ORDER BY rank DESC, e.expense_date DESC, e.id DESC
+            LIMIT %s OFFSET %s
+        """,
+            (q, user_id, q, q, user_id, q, q, q, q, q, limit, skip),
+        )
+
+        return db.fetchall()
+
+    except Exception as e:
+        logger.error(f"Error searching expenses: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to search expenses")
+
+
 @expense_route.get("/{expense_id}", response_model=ExpenseOut)
-def get_expense(
-    expense_id: int, db=Depends(get_db), current_user=Depends(get_current_user)
+@trusted_response
+async def get_expense(
+    expense_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Get specific expense"""
     try:
         # Get expense
-        db.execute(
+        await db.execute(
             """
             SELECT id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at 
             FROM expenses 
@@ -138,7 +270,7 @@ def get_expense(
             raise HTTPException(status_code=404, detail="Expense not found")
 
         # Get items
-        db.execute(
+        await db.execute(
             """
             SELECT id, description, quantity, unit_price, line_total, created_at 
             FROM expense_items 
@@ -158,22 +290,15 @@ def get_expense(
 
 
 @expense_route.put("/{expense_id}", response_model=ExpenseOut)
-def update_expense(
+@trusted_response
+async def update_expense(
     expense_id: int,
     expense: ExpenseUpdate,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """Update expense"""
     try:
-        # Check if expense exists and belongs to user
-        db.execute(
-            "SELECT id FROM expenses WHERE id = %s AND user_id = %s",
-            (expense_id, current_user["id"]),
-        )
-        if not db.fetchone():
-            raise HTTPException(status_code=404, detail="Expense not found")
-
         # Build update query dynamically
         updates = []
         values = []
@@ -194,35 +319,38 @@ def update_expense(
             updates.append("expense_date = %s")
             values.append(expense.expense_date)
 
-        if not updates:
-            # If no updates, just return current expense
-            return get_expense(expense_id, db, current_user)
-
-        values.append(expense_id)
-        values.append(current_user["id"])
-
-        update_query = f"""
-            UPDATE expenses 
-            SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s AND user_id = %s 
-            RETURNING id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
-        """
+        if updates:
+            target = f"""
+                UPDATE expenses
+                SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND user_id = %s
+                RETURNING id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
+            """
+        else:
+            target = """
+                SELECT id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
+                FROM expenses
+                WHERE id = %s AND user_id = %s
+            """
+        values.extend([expense_id, current_user["id"]])
 
-        db.execute(update_query, values)
-        updated_expense = db.fetchone()
+        items = children_json("expense_items", "expense_id", EXPENSE_ITEM_COLUMNS, "t")
 
-        # Get items
-        db.execute(
-            """
-            SELECT id, description, quantity, unit_price, line_total, created_at 
-            FROM expense_items 
-            WHERE expense_id = %s
+        # Update (or read) the row and collect its items in one round trip;
+        # no row back means it does not exist or belongs to someone else
+        await db.execute(
+            f"""
+            WITH t AS ({target})
+            SELECT t.*, {items} AS items
+            FROM t
         """,
-            (expense_id,),
+            values,
         )
-        items = db.fetchall()
+        updated_expense = db.fetchone()
+        if not updated_expense:
+            raise HTTPException(status_code=404, detail="Expense not found")
 
-        return {**updated_expense, "items": items}
+        return updated_expense
 
     except HTTPException:
         raise
@@ -232,25 +360,19 @@ def update_expense(
 
 
 @expense_route.delete("/{expense_id}")
-def delete_expense(
-    expense_id: int, db=Depends(get_db), current_user=Depends(get_current_user)
+async def delete_expense(
+    expense_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Delete expense"""
     try:
-        # Check if expense exists and belongs to user
-        db.execute(
-            "SELECT id FROM expenses WHERE id = %s AND user_id = %s",
+        # Delete expense (items will be deleted by cascade)
+        await db.execute(
+            "DELETE FROM expenses WHERE id = %s AND user_id = %s RETURNING id",
             (expense_id, current_user["id"]),
         )
         if not db.fetchone():
             raise HTTPException(status_code=404, detail="Expense not found")
 
-        # Delete expense (items will be deleted by cascade)
-        db.execute(
-            "DELETE FROM expenses WHERE id = %s AND user_id = %s",
-            (expense_id, current_user["id"]),
-        )
-
         return {"message": "Expense deleted successfully"}
 
     except HTTPException:
@@ -258,3 +380,99 @@ def delete_expense(
     except Exception as e:
         logger.error(f"Error deleting expense: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to delete expense")
+
+
+@expense_route.post("/bulk-update")
+async def bulk_update_expenses(
+    bulk: ExpenseBulkUpdate,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Apply the same changes to many expenses rows in one statement.
+
+    Rows are picked by `ids`, by `filter` (the list endpoint's filters), or
+    by both; returns how many rows were updated.
+    """
+    try:
+        changes = bulk.changes.model_dump(exclude_none=True)
+        if not changes:
+            raise HTTPException(status_code=400, detail="No changes given")
+
+        filters = bulk.filter or ExpenseFilter()
+        conditions, params = bulk_conditions(
+            current_user["id"],
+            bulk.ids,
+            "expense_date",
+            "vendor",
+            start_date=filters.start_date,
+            end_date=filters.end_date,
+            categories=filters.category,
+            counterparty=filters.vendor,
+            min_amount=filters.min_amount,
+            max_amount=filters.max_amount,
+        )
+
+        # Column names come from the ExpenseUpdate fields, never from input
+        updates = [f"{column} = %s" for column in changes]
+        await db.execute(
+            f"""
+            WITH updated AS (
+                UPDATE expenses
+                SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP
+                WHERE {' AND '.join(conditions)}
+                RETURNING 1
+            )
+            SELECT count(*) AS updated FROM updated
+        """,
+            list(changes.values()) + params,
+        )
+        return db.fetchone()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk updating expenses: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to update expenses")
+
+
+@expense_route.post("/bulk-delete")
+async def bulk_delete_expenses(
+    bulk: ExpenseBulkDelete,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Delete many expenses rows in one statement, picked by `ids`, by `filter`
+    or by both; items go with them by cascade. Returns how many were deleted"""
+    try:
+        filters = bulk.filter or ExpenseFilter()
+        conditions, params = bulk_conditions(
+            current_user["id"],
+            bulk.ids,
+            "expense_date",
+            "vendor",
+            start_date=filters.start_date,
+            end_date=filters.end_date,
+            categories=filters.category,
+            counterparty=filters.vendor,
+            min_amount=filters.min_amount,
+            max_amount=filters.max_amount,
+        )
+
+        await db.execute(
+            f"""
+            WITH deleted AS (
+                DELETE FROM expenses
+                WHERE {' AND '.join(conditions)}
+                RETURNING 1
+            )
+            SELECT count(*) AS deleted FROM deleted
+        """,
+            params,
+        )
+        return db.fetchone()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk deleting expenses: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to delete expenses")
@@ -0,0 +1,232 @@
+import csv
+import io
+import itertools
+import logging
+import os
+import threading
+from datetime import date
+from decimal import Decimal
+
+from auth import get_current_user
+from database import db_cursor
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from responses import dump_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+export_route = APIRouter(prefix="/export", tags=["export"])
+
+load_dotenv()
+
+# Rows pulled from the server-side cursor per network round trip
+EXPORT_BATCH_SIZE = 2000
+
+# An export holds a pooled connection until its client has downloaded the
+# last byte, so slow clients could otherwise take all of DB_POOL_MAX; further
+# exports are turned away with 503 while this many are running
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+_export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+EXPORT_QUERIES = {
+    "expenses": """
+        SELECT e.id, e.vendor, e.description, e.amount, e.category, e.expense_date,
+               e.created_at, e.updated_at,
+               COALESCE(
+                   (SELECT json_agg(json_build_object(
+                        'id', i.id, 'description', i.description, 'quantity', i.quantity,
+                        'unit_price', i.unit_price, 'line_total', i.line_total)
+                        ORDER BY i.id)
+                    FROM expense_items i WHERE i.expense_id = e.id),
+                   '[]'::json
+               ) AS items
+        FROM expenses e
+        WHERE e.user_id = %s
+        ORDER BY e.expense_date, e.id
+    """,
+    "income": """
+        SELECT n.id, n.source, n.description, n.amount, n.category, n.income_date,
+               n.created_at, n.updated_at,
+               COALESCE(
+                   (SELECT json_agg(json_build_object(
+                        'id', i.id, 'description', i.description, 'quantity', i.quantity,
+                        'unit_price', i.unit_price, 'line_total', i.line_total)
+                        ORDER BY i.id)
+                    FROM income_items i WHERE i.income_id = n.id),
+                   '[]'::json
+               ) AS items
+        FROM income n
+        WHERE n.user_id = %s
+        ORDER BY n.income_date, n.id
+    """,
+    "loans": """
+        SELECT l.id, l.type, l.person_name, l.person_contact, l.principal_amount,
+               l.current_balance, l.interest_rate, l.loan_date, l.due_date, l.status,
+               l.description, l.created_at, l.updated_at,
+               COALESCE(
+                   (SELECT json_agg(json_build_object(
+                        'id', t.id, 'transaction_type', t.transaction_type,
+                        'amount', t.amount, 'transaction_date', t.transaction_date,
+                        'description', t.description)
+                        ORDER BY t.transaction_date, t.id)
+                    FROM loan_transactions t WHERE t.loan_id = l.id),
+                   '[]'::json
+               ) AS transactions
+        FROM loans l
+        WHERE l.user_id = %s
+        ORDER BY l.loan_date, l.id
+    """,
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _iter_batches(resource, user_id):
+    """Yield lists of rows from a server-side cursor, so only one batch is in
+    memory at a time no matter how large the ledger is. Holds one of the
+    EXPORT_MAX_CONCURRENT slots, and the connection, until closed."""
+    if not _export_slots.acquire(blocking=False):
+        logger.warning("Too many exports running, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many exports in progress, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        with db_cursor(name=f"export_{resource}") as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            cur.execute(EXPORT_QUERIES[resource], (user_id,))
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        _export_slots.release()
+
+
+def _stream_ndjson(batches):
+    for rows in batches:
+        yield b"".join(dump_json(row) + b"\n" for row in rows)
+
+
+def _stream_csv(batches):
+    buffer = io.StringIO()
+    writer = None
+    for rows in batches:
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(
+                {
+                    key: dump_json(value).decode() if isinstance(value, list) else value
+                    for key, value in row.items()
+                }
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each batch"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _stream_parquet(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for rows in batches:
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, list):
+                    row[key] = dump_json(value).decode()
+                elif isinstance(value, Decimal):
+                    row[key] = float(value)
+        table = pa.Table.from_pylist(rows)
+        if writer is None:
+            # Columns that are all NULL in the first batch are typed as text
+            schema = pa.schema(
+                [
+                    (
+                        field.with_type(pa.string())
+                        if pa.types.is_null(field.type)
+                        else field
+                    )
+                    for field in table.schema
+                ]
+            )
+            writer = pq.ParquetWriter(sink, schema)
+        # One row group per batch keeps the writer's buffer bounded
+        writer.write_table(table.cast(writer.schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+STREAMERS = {
+    "csv": _stream_csv,
+    "ndjson": _stream_ndjson,
+    "parquet": _stream_parquet,
+}
+
+
+@export_route.get("/{resource}")
+def export_ledger(
+    resource: str, format: str = "csv", current_user=Depends(get_current_user)
+):
+    """Stream all of the user's expenses (with items), income or loans (with
+    transactions) as CSV, NDJSON or Parquet"""
+    if resource not in EXPORT_QUERIES:
+        raise HTTPException(
+            status_code=404, detail="Export must be one of: expenses, income, loans"
+        )
+    if format not in STREAMERS:
+        raise HTTPException(
+            status_code=400, detail="Format must be one of: csv, ndjson, parquet"
+        )
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=501, detail="Parquet export requires pyarrow"
+            )
+
+    # Fetch the first batch before responding, so a busy pool or too many
+    # running exports is a 503 instead of a download that breaks off
+    batches = _iter_batches(resource, current_user["id"])
+    first = next(batches, None)
+    batches = itertools.chain([first], batches) if first is not None else []
+
+    filename = f"{resource}-{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        STREAMERS[format](batches),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,53 @@
+import io
+import logging
+from typing import Optional
+
+from auth import get_current_user
+from database import get_db
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from ledger_import import ImportFormatError, import_transactions, iter_transactions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+import_route = APIRouter(prefix="/import", tags=["import"])
+
+
+@import_route.post("/statement")
+def import_statement(
+    file: UploadFile = File(...),
+    kind: str = "auto",
+    date_format: Optional[str] = None,
+    db=Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Bulk import a bank statement (CSV or OFX) as expenses and income.
+
+    With `kind=auto` negative amounts become expenses and positive amounts
+    income. Rows are loaded in chunks; invalid rows are reported, not fatal.
+    """
+    extension = file.filename.split(".")[-1].lower()
+    if extension not in ["csv", "ofx", "qfx"]:
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported file type. Please upload a CSV, OFX or QFX file.",
+        )
+    if kind not in ["auto", "expense", "income"]:
+        raise HTTPException(
+            status_code=400, detail="kind must be one of: auto, expense, income"
+        )
+
+    try:
+        text_stream = io.TextIOWrapper(
+            file.file, encoding="utf-8-sig", errors="replace", newline=""
+        )
+        transactions = iter_transactions(text_stream, extension, date_format)
+        summary = import_transactions(db, current_user["id"], transactions, kind)
+        text_stream.detach()
+        return summary
+
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing statement: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to import statement")
@@ -1,25 +1,51 @@
 import logging
-from typing import List
+from datetime import date, datetime
+from typing import List, Optional
 
+from async_database import get_async_db
 from auth import get_current_user
-from database import get_db
-from fastapi import APIRouter, Depends, HTTPException
-from schemas import IncomeCreate, IncomeOut, IncomeUpdate
+from etags import not_modified, resource_etag
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from queries import (
+    INCOME_COLUMNS,
+    INCOME_ITEM_COLUMNS,
+    bulk_conditions,
+    children_json,
+    insert_items,
+    json_page,
+    keyset_condition,
+    ledger_filters,
+)
+from responses import raw_json, trusted_response
+from schemas import (
+    IncomeBulkDelete,
+    IncomeBulkUpdate,
+    IncomeCreate,
+    IncomeFilter,
+    IncomeOut,
+    IncomeUpdate,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 income_route = APIRouter(prefix="/income", tags=["income"])
 
+# Sort key of the income list, newest first; also what page cursors encode
+INCOME_SORT_COLUMNS = ("income_date", "created_at", "id")
+
 
 @income_route.post("/", response_model=IncomeOut)
-def create_income(
-    income: IncomeCreate, db=Depends(get_db), current_user=Depends(get_current_user)
+@trusted_response
+async def create_income(
+    income: IncomeCreate,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
 ):
     """Create a new income"""
     try:
         # Insert income
-        db.execute(
+        await db.execute(
             """
             INSERT INTO income (user_id, source, description, amount, category, income_date) 
             VALUES (%s, %s, %s, %s, %s, %s) 
@@ -38,25 +64,10 @@ def create_income(
         new_income = db.fetchone()
         income_id = new_income["id"]
 
-        # Insert income items if provided
-        items = []
-        if income.items:
-            for item in income.items:
-                db.execute(
-                    """
-                    INSERT INTO income_items (income_id, description, quantity, unit_price, line_total) 
-                    VALUES (%s, %s, %s, %s, %s) 
-                    RETURNING id, description, quantity, unit_price, line_total, created_at
-                """,
-                    (
-                        income_id,
-                        item.description,
-                        item.quantity,
-                        item.unit_price,
-                        item.line_total,
-                    ),
-                )
-                items.append(db.fetchone())
+        # Insert all income items in one statement
+        items = await insert_items(
+            db, "income_items", "income_id", income_id, income.items
+        )
 
         # Return income with items
         return {**new_income, "items": items}
@@ -67,57 +78,104 @@ def create_income(
 
 
 @income_route.get("/", response_model=List[IncomeOut])
-def get_income(
-    db=Depends(get_db),
+async def get_income(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category: Optional[List[str]] = Query(None),
+    source: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
 ):
-    """Get user's income"""
+    """Get user's income.
+
+    Pass the `X-Next-Cursor` header of a page as `after` to fetch the next
+    one by seeking on the sort key; `skip` is ignored when `after` is given.
+    `category` may be repeated to match any of several categories.
+    Send the returned `ETag` back as `If-None-Match` to get a 304 while
+    nothing has changed.
+    """
     try:
-        # Get income
-        db.execute(
-            """
-            SELECT id, user_id, source, description, amount, category, income_date, created_at, updated_at 
-            FROM income 
-            WHERE user_id = %s 
-            ORDER BY income_date DESC, created_at DESC 
-            LIMIT %s OFFSET %s
-        """,
-            (current_user["id"], limit, skip),
+        etag = await resource_etag(
+            db, current_user["id"], ("income",), request.url.query
         )
+        unchanged = not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
+        where_conditions = ["user_id = %s"]
+        params = [current_user["id"]]
+
+        filter_conditions, filter_params = ledger_filters(
+            "income_date",
+            "source",
+            start_date=start_date,
+            end_date=end_date,
+            categories=category,
+            counterparty=source,
+            min_amount=min_amount,
+            max_amount=max_amount,
+        )
+        where_conditions.extend(filter_conditions)
+        params.extend(filter_params)
 
-        income_records = db.fetchall()
-
-        # Get items for each income
-        result = []
-        for income_record in income_records:
-            db.execute(
-                """
-                SELECT id, description, quantity, unit_price, line_total, created_at 
-                FROM income_items 
-                WHERE income_id = %s
-            """,
-                (income_record["id"],),
+        if after:
+            condition, values = keyset_condition(
+                after, INCOME_SORT_COLUMNS, (date, datetime, int)
             )
-            items = db.fetchall()
-            result.append({**income_record, "items": items})
+            where_conditions.append(condition)
+            params.extend(values)
+            skip = 0
+
+        params.extend([limit, skip])
+
+        # Postgres renders the page, items included, straight to JSON text
+        body, cursor = await json_page(
+            db,
+            f"""
+            SELECT {INCOME_COLUMNS}
+            FROM income
+            WHERE {' AND '.join(where_conditions)}
+            ORDER BY income_date DESC, created_at DESC, id DESC
+            LIMIT %s OFFSET %s
+        """,
+            params,
+            INCOME_COLUMNS,
+            INCOME_SORT_COLUMNS,
+            limit,
+            children={
+                "items": children_json(
+                    "income_items", "income_id", INCOME_ITEM_COLUMNS, "p"
+                )
+            },
+        )
+        if cursor:
+            response.headers["X-Next-Cursor"] = cursor
 
-        return result
+        return raw_json(body, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting income: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get income")
 
 
 @income_route.get("/{income_id}", response_model=IncomeOut)
-def get_income_by_id(
-    income_id: int, db=Depends(get_db), current_user=Depends(get_current_user)
+@trusted_response
+async def get_income_by_id(
+    income_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Get specific income"""
     try:
         # Get income
-        db.execute(
+        await db.execute(
             """
             SELECT id, user_id, source, description, amount, category, income_date, created_at, updated_at 
             FROM income 
@@ -131,7 +189,7 @@ def get_income_by_id(
             raise HTTPException(status_code=404, detail="Income not found")
 
         # Get items
-        db.execute(
+        await db.execute(
             """
             SELECT id, description, quantity, unit_price, line_total, created_at 
             FROM income_items 
@@ -151,22 +209,15 @@ def get_income_by_id(
 
 
 @income_route.put("/{income_id}", response_model=IncomeOut)
-def update_income(
+@trusted_response
+async def update_income(
     income_id: int,
     income: IncomeUpdate,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """Update income"""
     try:
-        # Check if income exists and belongs to user
-        db.execute(
-            "SELECT id FROM income WHERE id = %s AND user_id = %s",
-            (income_id, current_user["id"]),
-        )
-        if not db.fetchone():
-            raise HTTPException(status_code=404, detail="Income not found")
-
         # Build update query dynamically
         updates = []
         values = []
@@ -187,35 +238,38 @@ def update_income(
             updates.append("income_date = %s")
             values.append(income.income_date)
 
-        if not updates:
-            # If no updates, just return current income
-            return get_income_by_id(income_id, db, current_user)
-
-        values.append(income_id)
-        values.append(current_user["id"])
-
-        update_query = f"""
-            UPDATE income 
-            SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s AND user_id = %s 
-            RETURNING id, user_id, source, description, amount, category, income_date, created_at, updated_at
-        """
+        if updates:
+            target = f"""
+                UPDATE income
+                SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND user_id = %s
+                RETURNING id, user_id, source, description, amount, category, income_date, created_at, updated_at
+            """
+        else:
+            target = """
+                SELECT id, user_id, source, description, amount, category, income_date, created_at, updated_at
+                FROM income
+                WHERE id = %s AND user_id = %s
+            """
+        values.extend([income_id, current_user["id"]])
 
-        db.execute(update_query, values)
-        updated_income = db.fetchone()
+        items = children_json("income_items", "income_id", INCOME_ITEM_COLUMNS, "t")
 
-        # Get items
-        db.execute(
-            """
-            SELECT id, description, quantity, unit_price, line_total, created_at 
-            FROM income_items 
-            WHERE income_id = %s
+        # Update (or read) the row and collect its items in one round trip;
+        # no row back means it does not exist or belongs to someone else
+        await db.execute(
+            f"""
+            WITH t AS ({target})
+            SELECT t.*, {items} AS items
+            FROM t
         """,
-            (income_id,),
+            values,
         )
-        items = db.fetchall()
+        updated_income = db.fetchone()
+        if not updated_income:
+            raise HTTPException(status_code=404, detail="Income not found")
 
-        return {**updated_income, "items": items}
+        return updated_income
 
     except HTTPException:
         raise
@@ -225,25 +279,19 @@ def update_income(
 
 
 @income_route.delete("/{income_id}")
-def delete_income(
-    income_id: int, db=Depends(get_db), current_user=Depends(get_current_user)
+async def delete_income(
+    income_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Delete income"""
     try:
-        # Check if income exists and belongs to user
-        db.execute(
-            "SELECT id FROM income WHERE id = %s AND user_id = %s",
+        # Delete income (items will be deleted by cascade)
+        await db.execute(
+            "DELETE FROM income WHERE id = %s AND user_id = %s RETURNING id",
             (income_id, current_user["id"]),
         )
         if not db.fetchone():
             raise HTTPException(status_code=404, detail="Income not found")
 
-        # Delete income (items will be deleted by cascade)
-        db.execute(
-            "DELETE FROM income WHERE id = %s AND user_id = %s",
-            (income_id, current_user["id"]),
-        )
-
         return {"message": "Income deleted successfully"}
 
     except HTTPException:
@@ -251,3 +299,99 @@ def delete_income(
     except Exception as e:
         logger.error(f"Error deleting income: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to delete income")
+
+
+@income_route.post("/bulk-update")
+async def bulk_update_income(
+    bulk: IncomeBulkUpdate,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Apply the same changes to many income rows in one statement.
+
+    Rows are picked by `ids`, by `filter` (the list endpoint's filters), or
+    by both; returns how many rows were updated.
+    """
+    try:
+        changes = bulk.changes.model_dump(exclude_none=True)
+        if not changes:
+            raise HTTPException(status_code=400, detail="No changes given")
+
+        filters = bulk.filter or IncomeFilter()
+        conditions, params = bulk_conditions(
+            current_user["id"],
+            bulk.ids,
+            "income_date",
+            "source",
+            start_date=filters.start_date,
+            end_date=filters.end_date,
+            categories=filters.category,
+            counterparty=filters.source,
+            min_amount=filters.min_amount,
+            max_amount=filters.max_amount,
+        )
+
+        # Column names come from the IncomeUpdate fields, never from input
+        updates = [f"{column} = %s" for column in changes]
+        await db.execute(
+            f"""
+            WITH updated AS (
+                UPDATE income
+                SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP
+                WHERE {' AND '.join(conditions)}
+                RETURNING 1
+            )
+            SELECT count(*) AS updated FROM updated
+        """,
+            list(changes.values()) + params,
+        )
+        return db.fetchone()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk updating income: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to update income")
+
+
+@income_route.post("/bulk-delete")
+async def bulk_delete_income(
+    bulk: IncomeBulkDelete,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Delete many income rows in one statement, picked by `ids`, by `filter`
+    or by both; items go with them by cascade. Returns how many were deleted"""
+    try:
+        filters = bulk.filter or IncomeFilter()
+        conditions, params = bulk_conditions(
+            current_user["id"],
+            bulk.ids,
+            "income_date",
+            "source",
+            start_date=filters.start_date,
+            end_date=filters.end_date,
+            categories=filters.category,
+            counterparty=filters.source,
+            min_amount=filters.min_amount,
+            max_amount=filters.max_amount,
+        )
+
+        await db.execute(
+            f"""
+            WITH deleted AS (
+                DELETE FROM income
+                WHERE {' AND '.join(conditions)}
+                RETURNING 1
+            )
+            SELECT count(*) AS deleted FROM deleted
+        """,
+            params,
+        )
+        return db.fetchone()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk deleting income: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to delete income")
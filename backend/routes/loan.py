@@ -1,10 +1,20 @@
 import logging
-from datetime import date
-from typing import List
+from datetime import date, datetime
+from typing import List, Optional
 
+from async_database import get_async_db
 from auth import get_current_user
-from database import get_db
-from fastapi import APIRouter, Depends, HTTPException
+from etags import not_modified, resource_etag
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from queries import (
+    LOAN_COLUMNS,
+    LOAN_TRANSACTION_COLUMNS,
+    children_json,
+    json_page,
+    keyset_condition,
+)
+from response_cache import cached_response, store_response
+from responses import raw_json, trusted_response
 from schemas import (
     LoanCreate,
     LoanOut,
@@ -19,15 +29,19 @@ logger = logging.getLogger(__name__)
 
 loan_route = APIRouter(prefix="/loans", tags=["loans"])
 
+# Sort key of the loan list, newest first; also what page cursors encode
+LOAN_SORT_COLUMNS = ("created_at", "id")
+
 
 @loan_route.post("/", response_model=LoanOut)
-def create_loan(
-    loan: LoanCreate, db=Depends(get_db), current_user=Depends(get_current_user)
+@trusted_response
+async def create_loan(
+    loan: LoanCreate, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Create a new loan"""
     try:
         # Insert loan
-        db.execute(
+        await db.execute(
             """
             INSERT INTO loans (user_id, type, person_name, person_contact, principal_amount, 
                              current_balance, interest_rate, loan_date, due_date, description) 
@@ -59,16 +73,32 @@ def create_loan(
 
 
 @loan_route.get("/", response_model=List[LoanOut])
-def get_loans(
-    db=Depends(get_db),
+async def get_loans(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
     loan_type: str = None,
     status: str = None,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
 ):
-    """Get user's loans with optional filtering"""
+    """Get user's loans with optional filtering.
+
+    Pass the `X-Next-Cursor` header of a page as `after` to fetch the next
+    one by seeking on the sort key; `skip` is ignored when `after` is given.
+    Send the returned `ETag` back as `If-None-Match` to get a 304 while
+    nothing has changed.
+    """
     try:
+        etag = await resource_etag(
+            db, current_user["id"], ("loans",), request.url.query
+        )
+        unchanged = not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
         # Build query with optional filters
         where_conditions = ["user_id = %s"]
         params = [current_user["id"]]
@@ -81,53 +111,69 @@ def get_loans(
             where_conditions.append("status = %s")
             params.append(status)
 
+        if after:
+            condition, values = keyset_condition(
+                after, LOAN_SORT_COLUMNS, (datetime, int)
+            )
+            where_conditions.append(condition)
+            params.extend(values)
+            skip = 0
+
         params.extend([limit, skip])
 
-        # Get loans
-        db.execute(
+        # Postgres renders the page, items included, straight to JSON text
+        body, cursor = await json_page(
+            db,
             f"""
-            SELECT id, user_id, type, person_name, person_contact, principal_amount, 
-                   current_balance, interest_rate, loan_date, due_date, status, 
-                   description, created_at, updated_at 
-            FROM loans 
+            SELECT {LOAN_COLUMNS}
+            FROM loans
             WHERE {' AND '.join(where_conditions)}
-            ORDER BY created_at DESC 
+            ORDER BY created_at DESC, id DESC
             LIMIT %s OFFSET %s
         """,
             params,
+            LOAN_COLUMNS,
+            LOAN_SORT_COLUMNS,
+            limit,
+            children={
+                "transactions": children_json(
+                    "loan_transactions",
+                    "loan_id",
+                    LOAN_TRANSACTION_COLUMNS,
+                    "p",
+                    order_by="c.transaction_date DESC, c.created_at DESC",
+                )
+            },
         )
+        if cursor:
+            response.headers["X-Next-Cursor"] = cursor
 
-        loans = db.fetchall()
-
-        # Get transactions for each loan
-        result = []
-        for loan in loans:
-            db.execute(
-                """
-                SELECT id, loan_id, transaction_type, amount, transaction_date, 
-                       description, created_at 
-                FROM loan_transactions 
-                WHERE loan_id = %s
-                ORDER BY transaction_date DESC, created_at DESC
-            """,
-                (loan["id"],),
-            )
-            transactions = db.fetchall()
-            result.append({**loan, "transactions": transactions})
-
-        return result
+        return raw_json(body, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting loans: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get loans")
 
 
 @loan_route.get("/summary", response_model=LoanSummary)
-def get_loan_summary(db=Depends(get_db), current_user=Depends(get_current_user)):
+async def get_loan_summary(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
     """Get loan summary statistics"""
     try:
+        etag, cached = await cached_response(
+            db, request, response, current_user["id"], ("loans",), "loan-summary"
+        )
+        if cached:
+            return cached
+
         # Get summary statistics
-        db.execute(
+        await db.execute(
             """
             SELECT 
                 SUM(CASE WHEN type = 'given' THEN principal_amount ELSE 0 END) as total_loans_given,
@@ -145,7 +191,7 @@ def get_loan_summary(db=Depends(get_db), current_user=Depends(get_current_user))
         )
 
         summary = db.fetchone()
-        return {
+        result = {
             "total_loans_given": float(summary["total_loans_given"] or 0),
             "total_loans_received": float(summary["total_loans_received"] or 0),
             "total_outstanding_given": float(summary["total_outstanding_given"] or 0),
@@ -157,6 +203,7 @@ def get_loan_summary(db=Depends(get_db), current_user=Depends(get_current_user))
             "overdue_loans_given": int(summary["overdue_loans_given"] or 0),
             "overdue_loans_received": int(summary["overdue_loans_received"] or 0),
         }
+        return await store_response(etag, result, response)
 
     except Exception as e:
         logger.error(f"Error getting loan summary: {str(e)}")
@@ -164,11 +211,14 @@ def get_loan_summary(db=Depends(get_db), current_user=Depends(get_current_user))
 
 
 @loan_route.get("/{loan_id}", response_model=LoanOut)
-def get_loan(loan_id: int, db=Depends(get_db), current_user=Depends(get_current_user)):
+@trusted_response
+async def get_loan(
+    loan_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
+):
     """Get specific loan"""
     try:
         # Get loan
-        db.execute(
+        await db.execute(
             """
             SELECT id, user_id, type, person_name, person_contact, principal_amount, 
                    current_balance, interest_rate, loan_date, due_date, status, 
@@ -184,7 +234,7 @@ def get_loan(loan_id: int, db=Depends(get_db), current_user=Depends(get_current_
             raise HTTPException(status_code=404, detail="Loan not found")
 
         # Get transactions
-        db.execute(
+        await db.execute(
             """
             SELECT id, loan_id, transaction_type, amount, transaction_date, 
                    description, created_at 
@@ -206,22 +256,15 @@ def get_loan(loan_id: int, db=Depends(get_db), current_user=Depends(get_current_
 
 
 @loan_route.put("/{loan_id}", response_model=LoanOut)
-def update_loan(
+@trusted_response
+async def update_loan(
     loan_id: int,
     loan: LoanUpdate,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """Update loan"""
     try:
-        # Check if loan exists and belongs to user
-        db.execute(
-            "SELECT id FROM loans WHERE id = %s AND user_id = %s",
-            (loan_id, current_user["id"]),
-        )
-        if not db.fetchone():
-            raise HTTPException(status_code=404, detail="Loan not found")
-
         # Build update query dynamically
         updates = []
         values = []
@@ -245,38 +288,48 @@ def update_loan(
             updates.append("status = %s")
             values.append(loan.status)
 
-        if not updates:
-            # If no updates, just return current loan
-            return get_loan(loan_id, db, current_user)
-
-        values.extend([loan_id, current_user["id"]])
-
-        update_query = f"""
-            UPDATE loans 
-            SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s AND user_id = %s 
-            RETURNING id, user_id, type, person_name, person_contact, principal_amount, 
-                     current_balance, interest_rate, loan_date, due_date, status, 
+        if updates:
+            target = f"""
+                UPDATE loans
+                SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND user_id = %s
+                RETURNING id, user_id, type, person_name, person_contact, principal_amount,
+                     current_balance, interest_rate, loan_date, due_date, status,
                      description, created_at, updated_at
-        """
+            """
+        else:
+            target = """
+                SELECT id, user_id, type, person_name, person_contact, principal_amount,
+                     current_balance, interest_rate, loan_date, due_date, status,
+                     description, created_at, updated_at
+                FROM loans
+                WHERE id = %s AND user_id = %s
+            """
+        values.extend([loan_id, current_user["id"]])
 
-        db.execute(update_query, values)
-        updated_loan = db.fetchone()
+        transactions = children_json(
+            "loan_transactions",
+            "loan_id",
+            LOAN_TRANSACTION_COLUMNS,
+            "t",
+            order_by="c.transaction_date DESC, c.created_at DESC",
+        )
 
-        # Get transactions
-        db.execute(
-            """
-            SELECT id, loan_id, transaction_type, amount, transaction_date, 
-                   description, created_at 
-            FROM loan_transactions 
-            WHERE loan_id = %s
-            ORDER BY transaction_date DESC, created_at DESC
+        # Update (or read) the row and collect its transactions in one round trip;
+        # no row back means it does not exist or belongs to someone else
+        await db.execute(
+            f"""
+            WITH t AS ({target})
+            SELECT t.*, {transactions} AS transactions
+            FROM t
         """,
-            (loan_id,),
+            values,
         )
-        transactions = db.fetchall()
+        updated_loan = db.fetchone()
+        if not updated_loan:
+            raise HTTPException(status_code=404, detail="Loan not found")
 
-        return {**updated_loan, "transactions": transactions}
+        return updated_loan
 
     except HTTPException:
         raise
@@ -286,25 +339,19 @@ def update_loan(
 
 
 @loan_route.delete("/{loan_id}")
-def delete_loan(
-    loan_id: int, db=Depends(get_db), current_user=Depends(get_current_user)
+async def delete_loan(
+    loan_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Delete loan"""
     try:
-        # Check if loan exists and belongs to user
-        db.execute(
-            "SELECT id FROM loans WHERE id = %s AND user_id = %s",
+        # Delete loan (transactions will be deleted by cascade)
+        await db.execute(
+            "DELETE FROM loans WHERE id = %s AND user_id = %s RETURNING id",
             (loan_id, current_user["id"]),
         )
         if not db.fetchone():
             raise HTTPException(status_code=404, detail="Loan not found")
 
-        # Delete loan (transactions will be deleted by cascade)
-        db.execute(
-            "DELETE FROM loans WHERE id = %s AND user_id = %s",
-            (loan_id, current_user["id"]),
-        )
-
         return {"message": "Loan deleted successfully"}
 
     except HTTPException:
@@ -315,16 +362,17 @@ def delete_loan(
 
 
 @loan_route.post("/{loan_id}/transactions", response_model=LoanTransactionOut)
-def add_loan_transaction(
+@trusted_response
+async def add_loan_transaction(
     loan_id: int,
     transaction: LoanTransactionCreate,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """Add a transaction to a loan (payment, interest, or adjustment)"""
     try:
         # Check if loan exists and belongs to user
-        db.execute(
+        await db.execute(
             "SELECT id, current_balance FROM loans WHERE id = %s AND user_id = %s",
             (loan_id, current_user["id"]),
         )
@@ -333,7 +381,7 @@ def add_loan_transaction(
             raise HTTPException(status_code=404, detail="Loan not found")
 
         # Insert transaction
-        db.execute(
+        await db.execute(
             """
             INSERT INTO loan_transactions (loan_id, transaction_type, amount, transaction_date, description) 
             VALUES (%s, %s, %s, %s, %s) 
@@ -359,13 +407,14 @@ def add_loan_transaction(
 
 
 @loan_route.get("/{loan_id}/transactions", response_model=List[LoanTransactionOut])
-def get_loan_transactions(
-    loan_id: int, db=Depends(get_db), current_user=Depends(get_current_user)
+@trusted_response
+async def get_loan_transactions(
+    loan_id: int, db=Depends(get_async_db), current_user=Depends(get_current_user)
 ):
     """Get all transactions for a specific loan"""
     try:
         # Check if loan exists and belongs to user
-        db.execute(
+        await db.execute(
             "SELECT id FROM loans WHERE id = %s AND user_id = %s",
             (loan_id, current_user["id"]),
         )
@@ -373,7 +422,7 @@ def get_loan_transactions(
             raise HTTPException(status_code=404, detail="Loan not found")
 
         # Get transactions
-        db.execute(
+        await db.execute(
             """
             SELECT id, loan_id, transaction_type, amount, transaction_date, 
                    description, created_at 
@@ -394,16 +443,16 @@ def get_loan_transactions(
 
 
 @loan_route.delete("/{loan_id}/transactions/{transaction_id}")
-def delete_loan_transaction(
+async def delete_loan_transaction(
     loan_id: int,
     transaction_id: int,
-    db=Depends(get_db),
+    db=Depends(get_async_db),
     current_user=Depends(get_current_user),
 ):
     """Delete a loan transaction and recalculate loan balance"""
     try:
         # Check if loan exists and belongs to user
-        db.execute(
+        await db.execute(
             "SELECT id FROM loans WHERE id = %s AND user_id = %s",
             (loan_id, current_user["id"]),
         )
@@ -411,7 +460,7 @@ def delete_loan_transaction(
             raise HTTPException(status_code=404, detail="Loan not found")
 
         # Get transaction details before deletion
-        db.execute(
+        await db.execute(
             "SELECT transaction_type, amount FROM loan_transactions WHERE id = %s AND loan_id = %s",
             (transaction_id, loan_id),
         )
@@ -420,7 +469,7 @@ def delete_loan_transaction(
             raise HTTPException(status_code=404, detail="Transaction not found")
 
         # Delete transaction
-        db.execute(
+        await db.execute(
             "DELETE FROM loan_transactions WHERE id = %s AND loan_id = %s",
             (transaction_id, loan_id),
         )
@@ -428,19 +477,19 @@ def delete_loan_transaction(
         # Reverse the balance change
         if transaction["transaction_type"] == "payment":
             # Reverse payment: add amount back to balance
-            db.execute(
+            await db.execute(
                 "UPDATE loans SET current_balance = current_balance + %s WHERE id = %s",
                 (transaction["amount"], loan_id),
             )
         elif transaction["transaction_type"] == "interest":
             # Reverse interest: subtract amount from balance
-            db.execute(
+            await db.execute(
                 "UPDATE loans SET current_balance = current_balance - %s WHERE id = %s",
                 (transaction["amount"], loan_id),
             )
         elif transaction["transaction_type"] == "adjustment":
             # Reverse adjustment: subtract amount from balance
-            db.execute(
+            await db.execute(
                 "UPDATE loans SET current_balance = current_balance - %s WHERE id = %s",
                 (transaction["amount"], loan_id),
             )
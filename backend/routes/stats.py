@@ -1,18 +1,81 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 
+from async_database import get_async_db
 from auth import get_current_user
-from database import get_db
-from fastapi import APIRouter, Depends, HTTPException
+from queries import period_bounds, period_condition
+from response_cache import cached_response, store_response
+from responses import to_columns
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 stats_route = APIRouter(tags=["stats"])
 
+# Per-row fields of the breakdowns, in the order `format=columnar` lists them
+MONTHLY_BREAKDOWN_FIELDS = (
+    "month",
+    "month_name",
+    "expense_total",
+    "income_total",
+    "net_total",
+    "expense_transactions",
+    "income_transactions",
+)
+DAILY_BREAKDOWN_FIELDS = ("day", "expenses", "income", "net_amount")
+CATEGORY_BREAKDOWN_FIELDS = ("category", "amount", "count")
+WEEKLY_SUMMARY_FIELDS = ("week_number", "expenses", "income", "net", "date_range")
+ROLLING_TREND_FIELDS = ("day", "amount", "rolling_7", "rolling_30", "rolling_90")
+MONTHLY_TREND_FIELDS = (
+    "month",
+    "amount",
+    "count",
+    "previous_month",
+    "mom_change",
+    "mom_change_pct",
+    "previous_year",
+    "yoy_change",
+    "yoy_change_pct",
+)
+CATEGORY_TREND_FIELDS = ("period", "amount", "count", "running_total")
+
+STATS_FORMATS = ("rows", "columnar")
+TREND_KINDS = ("expenses", "income")
+TREND_PERIODS = ("day", "week", "month")
+
+# Longest range a trend request may cover
+MAX_TREND_DAYS = 366 * 20
+
+
+def _check_format(format):
+    if format not in STATS_FORMATS:
+        raise HTTPException(
+            status_code=400, detail="Format must be one of: rows, columnar"
+        )
+
+
+def _trend_range(kind, start_date, end_date):
+    """Validate a trend request's kind and resolve its inclusive date range,
+    by default the year up to today"""
+    if kind not in TREND_KINDS:
+        raise HTTPException(
+            status_code=400, detail="Kind must be one of: expenses, income"
+        )
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=364)
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=400, detail="start_date must not be after end_date"
+        )
+    if (end_date - start_date).days >= MAX_TREND_DAYS:
+        raise HTTPException(status_code=400, detail="Date range is too long")
+    return start_date, end_date
+
 
 @stats_route.get("/me")
-def get_current_user_info(current_user=Depends(get_current_user)):
+async def get_current_user_info(current_user=Depends(get_current_user)):
     """Get current user information"""
     return {
         "id": current_user["id"],
@@ -22,134 +85,114 @@ def get_current_user_info(current_user=Depends(get_current_user)):
 
 
 @stats_route.get("/dashboard-stats")
-def get_dashboard_stats(db=Depends(get_db), current_user=Depends(get_current_user)):
+async def get_dashboard_stats(
+    request: Request,
+    response: Response,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
     """Get dashboard statistics"""
     try:
         user_id = current_user["id"]
 
-        # Total expenses
-        db.execute(
-            """
-            SELECT COALESCE(SUM(amount), 0) as total_expenses,
-                   COUNT(*) as total_expense_transactions
-            FROM expenses 
-            WHERE user_id = %s
-        """,
-            (user_id,),
-        )
-        expense_result = db.fetchone()
-
-        # Total income
-        db.execute(
-            """
-            SELECT COALESCE(SUM(amount), 0) as total_income,
-                   COUNT(*) as total_income_transactions
-            FROM income 
-            WHERE user_id = %s
-        """,
-            (user_id,),
-        )
-        income_result = db.fetchone()
-
-        # Monthly expenses (current month)
-        current_month = datetime.now().replace(day=1)
-        db.execute(
-            """
-            SELECT COALESCE(SUM(amount), 0) as monthly_expenses,
-                   COUNT(*) as monthly_expense_transactions
-            FROM expenses 
-            WHERE user_id = %s AND expense_date >= %s
-        """,
-            (user_id, current_month.date()),
+        # The monthly and last-7-days figures move with the clock, so the
+        # validator also rolls over every hour
+        etag, cached = await cached_response(
+            db,
+            request,
+            response,
+            user_id,
+            ("expenses", "income"),
+            "dashboard",
+            datetime.now().strftime("%Y-%m-%dT%H"),
         )
-        monthly_expense_result = db.fetchone()
+        if cached:
+            return cached
 
-        # Monthly income (current month)
-        db.execute(
-            """
-            SELECT COALESCE(SUM(amount), 0) as monthly_income,
-                   COUNT(*) as monthly_income_transactions
-            FROM income 
-            WHERE user_id = %s AND income_date >= %s
-        """,
-            (user_id, current_month.date()),
-        )
-        monthly_income_result = db.fetchone()
-
-        # Categories count
-        db.execute(
-            """
-            SELECT COUNT(DISTINCT category) as expense_categories_count
-            FROM expenses 
-            WHERE user_id = %s AND category IS NOT NULL
-        """,
-            (user_id,),
-        )
-        expense_categories_result = db.fetchone()
-
-        db.execute(
-            """
-            SELECT COUNT(DISTINCT category) as income_categories_count
-            FROM income 
-            WHERE user_id = %s AND category IS NOT NULL
-        """,
-            (user_id,),
-        )
-        income_categories_result = db.fetchone()
-
-        # Recent transactions count (last 7 days)
+        today = date.today()
+        month_start, month_end = period_bounds(today.year, today.month)
+        this_month, month_params = period_condition("day", month_start, month_end)
         week_ago = datetime.now() - timedelta(days=7)
-        db.execute(
-            """
-            SELECT COUNT(*) as recent_expense_transactions
-            FROM expenses 
-            WHERE user_id = %s AND created_at >= %s
-        """,
-            (user_id, week_ago),
-        )
-        recent_expense_result = db.fetchone()
 
-        db.execute(
-            """
-            SELECT COUNT(*) as recent_income_transactions
-            FROM income 
-            WHERE user_id = %s AND created_at >= %s
+        # All-time and current-month figures come from the daily rollups; the
+        # recent counts go by entry time, which only the ledgers record
+        await db.execute(
+            f"""
+            WITH rollup_stats AS (
+                SELECT COALESCE(SUM(amount) FILTER (WHERE kind = 'expenses'), 0)
+                           as total_expenses,
+                       COALESCE(SUM(count) FILTER (WHERE kind = 'expenses'), 0)
+                           as total_expense_transactions,
+                       COALESCE(SUM(amount) FILTER (
+                           WHERE kind = 'expenses' AND {this_month}
+                       ), 0) as monthly_expenses,
+                       COALESCE(SUM(count) FILTER (
+                           WHERE kind = 'expenses' AND {this_month}
+                       ), 0) as monthly_expense_transactions,
+                       COUNT(DISTINCT NULLIF(category, '')) FILTER (
+                           WHERE kind = 'expenses'
+                       ) as expense_categories_count,
+                       COALESCE(SUM(amount) FILTER (WHERE kind = 'income'), 0)
+                           as total_income,
+                       COALESCE(SUM(count) FILTER (WHERE kind = 'income'), 0)
+                           as total_income_transactions,
+                       COALESCE(SUM(amount) FILTER (
+                           WHERE kind = 'income' AND {this_month}
+                       ), 0) as monthly_income,
+                       COALESCE(SUM(count) FILTER (
+                           WHERE kind = 'income' AND {this_month}
+                       ), 0) as monthly_income_transactions,
+                       COUNT(DISTINCT NULLIF(category, '')) FILTER (
+                           WHERE kind = 'income'
+                       ) as income_categories_count
+                FROM daily_rollups
+                WHERE user_id = %s
+            )
+            SELECT rollup_stats.*,
+                   (SELECT COUNT(*) FROM expenses
+                    WHERE user_id = %s AND created_at >= %s)
+                       as recent_expense_transactions,
+                   (SELECT COUNT(*) FROM income
+                    WHERE user_id = %s AND created_at >= %s)
+                       as recent_income_transactions
+            FROM rollup_stats
         """,
-            (user_id, week_ago),
+            (
+                *month_params,
+                *month_params,
+                *month_params,
+                *month_params,
+                user_id,
+                user_id,
+                week_ago,
+                user_id,
+                week_ago,
+            ),
         )
-        recent_income_result = db.fetchone()
+        stats = db.fetchone()
 
-        total_expenses = float(expense_result["total_expenses"] or 0)
-        total_income = float(income_result["total_income"] or 0)
-        monthly_expenses = float(monthly_expense_result["monthly_expenses"] or 0)
-        monthly_income = float(monthly_income_result["monthly_income"] or 0)
+        total_expenses = float(stats["total_expenses"] or 0)
+        total_income = float(stats["total_income"] or 0)
+        monthly_expenses = float(stats["monthly_expenses"] or 0)
+        monthly_income = float(stats["monthly_income"] or 0)
 
-        return {
+        result = {
             "total_expenses": total_expenses,
             "total_income": total_income,
             "net_worth": total_income - total_expenses,
             "monthly_expenses": monthly_expenses,
             "monthly_income": monthly_income,
             "monthly_net": monthly_income - monthly_expenses,
-            "total_expense_categories": int(
-                expense_categories_result["expense_categories_count"] or 0
-            ),
-            "total_income_categories": int(
-                income_categories_result["income_categories_count"] or 0
-            ),
+            "total_expense_categories": int(stats["expense_categories_count"] or 0),
+            "total_income_categories": int(stats["income_categories_count"] or 0),
             "recent_expense_transactions": int(
-                recent_expense_result["recent_expense_transactions"] or 0
-            ),
-            "recent_income_transactions": int(
-                recent_income_result["recent_income_transactions"] or 0
-            ),
-            "total_expense_transactions": int(
-                expense_result["total_expense_transactions"] or 0
-            ),
-            "total_income_transactions": int(
-                income_result["total_income_transactions"] or 0
+                stats["recent_expense_transactions"] or 0
             ),
+            "recent_income_transactions": int(stats["recent_income_transactions"] or 0),
+            "total_expense_transactions": int(stats["total_expense_transactions"] or 0),
+            "total_income_transactions": int(stats["total_income_transactions"] or 0),
         }
+        return await store_response(etag, result, response)
 
     except Exception as e:
         logger.error(f"Error getting dashboard stats: {str(e)}")
@@ -157,75 +200,76 @@ def get_dashboard_stats(db=Depends(get_db), current_user=Depends(get_current_use
 
 
 @stats_route.get("/yearly-stats/{year}")
-def get_yearly_stats(
-    year: int, db=Depends(get_db), current_user=Depends(get_current_user)
+async def get_yearly_stats(
+    year: int,
+    request: Request,
+    response: Response,
+    format: str = "rows",
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
 ):
-    """Get yearly statistics with monthly breakdown for both expenses and income"""
+    """Get yearly statistics with monthly breakdown for both expenses and income.
+
+    With `format=columnar` the monthly breakdown is one array per field
+    instead of one object per month.
+    """
+    _check_format(format)
     try:
         user_id = current_user["id"]
 
-        # Get monthly expense breakdown for the year
-        db.execute(
-            """
-            SELECT 
-                EXTRACT(MONTH FROM expense_date) as month,
-                COALESCE(SUM(amount), 0) as month_total,
-                COUNT(*) as month_transactions
-            FROM expenses 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM expense_date) = %s
-            GROUP BY EXTRACT(MONTH FROM expense_date)
-            ORDER BY EXTRACT(MONTH FROM expense_date)
-        """,
-            (user_id, year),
-        )
-        monthly_expense_data = db.fetchall()
-
-        # Get monthly income breakdown for the year
-        db.execute(
-            """
-            SELECT 
-                EXTRACT(MONTH FROM income_date) as month,
-                COALESCE(SUM(amount), 0) as month_total,
-                COUNT(*) as month_transactions
-            FROM income 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM income_date) = %s
-            GROUP BY EXTRACT(MONTH FROM income_date)
-            ORDER BY EXTRACT(MONTH FROM income_date)
-        """,
-            (user_id, year),
-        )
-        monthly_income_data = db.fetchall()
-
-        # Get total for the year
-        db.execute(
-            """
-            SELECT 
-                COALESCE(SUM(amount), 0) as year_total,
-                COUNT(*) as year_transactions,
-                COUNT(DISTINCT category) as year_categories
-            FROM expenses 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM expense_date) = %s
-        """,
-            (user_id, year),
+        year_start, year_end = period_bounds(year)
+        period, period_params = period_condition("day", year_start, year_end)
+
+        etag, cached = await cached_response(
+            db,
+            request,
+            response,
+            user_id,
+            ("expenses", "income"),
+            "yearly",
+            year,
+            format,
         )
-        year_expense_totals = db.fetchone()
-
-        db.execute(
-            """
+        if cached:
+            return cached
+
+        # Monthly breakdown and year totals from the year's daily rollups;
+        # the grouping set without `month` yields each kind's year total
+        await db.execute(
+            f"""
+            WITH rollups AS (
+                SELECT kind,
+                       EXTRACT(MONTH FROM day) as month,
+                       NULLIF(category, '') as category,
+                       amount,
+                       count
+                FROM daily_rollups
+                WHERE user_id = %s 
+                    AND {period}
+            )
             SELECT 
-                COALESCE(SUM(amount), 0) as year_total,
-                COUNT(*) as year_transactions,
-                COUNT(DISTINCT category) as year_categories
-            FROM income 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM income_date) = %s
+                kind,
+                month,
+                GROUPING(month) = 1 as is_year_total,
+                COALESCE(SUM(amount), 0) as total,
+                COALESCE(SUM(count), 0) as transactions,
+                COUNT(DISTINCT category) as categories
+            FROM rollups
+            GROUP BY GROUPING SETS ((kind, month), (kind))
         """,
-            (user_id, year),
+            (user_id, *period_params),
         )
-        year_income_totals = db.fetchone()
+        monthly_data = {"expenses": {}, "income": {}}
+        year_totals = {}
+        for row in db.fetchall():
+            if row["is_year_total"]:
+                year_totals[row["kind"]] = row
+            else:
+                monthly_data[row["kind"]][int(row["month"])] = row
+
+        no_rows = {"total": 0, "transactions": 0, "categories": 0}
+        year_expense_totals = year_totals.get("expenses", no_rows)
+        year_income_totals = year_totals.get("income", no_rows)
 
         # Initialize all 12 months with zero values
         monthly_breakdown = []
@@ -244,21 +288,13 @@ def get_yearly_stats(
             "December",
         ]
 
-        # Create dictionaries for easy lookup
-        expense_monthly_dict = {int(row["month"]): row for row in monthly_expense_data}
-        income_monthly_dict = {int(row["month"]): row for row in monthly_income_data}
-
         # Build complete monthly breakdown
         for month_num in range(1, 13):
-            expense_data = expense_monthly_dict.get(
-                month_num, {"month_total": 0, "month_transactions": 0}
-            )
-            income_data = income_monthly_dict.get(
-                month_num, {"month_total": 0, "month_transactions": 0}
-            )
+            expense_data = monthly_data["expenses"].get(month_num, no_rows)
+            income_data = monthly_data["income"].get(month_num, no_rows)
 
-            expense_total = float(expense_data["month_total"])
-            income_total = float(income_data["month_total"])
+            expense_total = float(expense_data["total"])
+            income_total = float(income_data["total"])
 
             monthly_breakdown.append(
                 {
@@ -267,54 +303,69 @@ def get_yearly_stats(
                     "expense_total": expense_total,
                     "income_total": income_total,
                     "net_total": income_total - expense_total,
-                    "expense_transactions": int(expense_data["month_transactions"]),
-                    "income_transactions": int(income_data["month_transactions"]),
+                    "expense_transactions": int(expense_data["transactions"]),
+                    "income_transactions": int(income_data["transactions"]),
                 }
             )
 
-        year_expense_total = float(year_expense_totals["year_total"] or 0)
-        year_income_total = float(year_income_totals["year_total"] or 0)
+        year_expense_total = float(year_expense_totals["total"] or 0)
+        year_income_total = float(year_income_totals["total"] or 0)
         year_net_total = year_income_total - year_expense_total
         avg_monthly_expense = year_expense_total / 12 if year_expense_total > 0 else 0
         avg_monthly_income = year_income_total / 12 if year_income_total > 0 else 0
 
-        return {
+        if format == "columnar":
+            monthly_breakdown = to_columns(monthly_breakdown, MONTHLY_BREAKDOWN_FIELDS)
+
+        result = {
             "year": year,
             "monthly_breakdown": monthly_breakdown,
             "year_expense_total": year_expense_total,
             "year_income_total": year_income_total,
             "year_net_total": year_net_total,
-            "year_expense_transactions": int(
-                year_expense_totals["year_transactions"] or 0
-            ),
-            "year_income_transactions": int(
-                year_income_totals["year_transactions"] or 0
-            ),
-            "year_expense_categories": int(year_expense_totals["year_categories"] or 0),
-            "year_income_categories": int(year_income_totals["year_categories"] or 0),
+            "year_expense_transactions": int(year_expense_totals["transactions"] or 0),
+            "year_income_transactions": int(year_income_totals["transactions"] or 0),
+            "year_expense_categories": int(year_expense_totals["categories"] or 0),
+            "year_income_categories": int(year_income_totals["categories"] or 0),
             "avg_monthly_expense": round(avg_monthly_expense, 2),
             "avg_monthly_income": round(avg_monthly_income, 2),
         }
+        return await store_response(etag, result, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting yearly stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get yearly stats")
 
 
 @stats_route.get("/available-years")
-def get_available_years(db=Depends(get_db), current_user=Depends(get_current_user)):
+async def get_available_years(
+    db=Depends(get_async_db), current_user=Depends(get_current_user)
+):
     """Get years that have expense or income data"""
     try:
         user_id = current_user["id"]
 
-        # Get years from both expenses and income
-        db.execute(
+        # Get years that have expense or income rollups. Each step jumps
+        # straight to the latest day before the year found last, so the index
+        # is probed once per year instead of reading every day
+        await db.execute(
             """
-            SELECT DISTINCT year FROM (
-                SELECT EXTRACT(YEAR FROM expense_date) as year FROM expenses WHERE user_id = %s
-                UNION
-                SELECT EXTRACT(YEAR FROM income_date) as year FROM income WHERE user_id = %s
-            ) as all_years
+            WITH RECURSIVE rollup_years AS (
+                SELECT MAX(day) as latest FROM daily_rollups WHERE user_id = %s
+                UNION ALL
+                SELECT (
+                    SELECT MAX(day) FROM daily_rollups
+                    WHERE user_id = %s
+                        AND day < date_trunc('year', y.latest)::date
+                )
+                FROM rollup_years y
+                WHERE y.latest IS NOT NULL
+            )
+            SELECT EXTRACT(YEAR FROM latest) as year
+            FROM rollup_years
+            WHERE latest IS NOT NULL
             ORDER BY year DESC
         """,
             (user_id, user_id),
@@ -334,10 +385,21 @@ def get_available_years(db=Depends(get_db), current_user=Depends(get_current_use
 
 
 @stats_route.get("/monthly-stats/{year}/{month}")
-def get_monthly_stats(
-    year: int, month: int, db=Depends(get_db), current_user=Depends(get_current_user)
+async def get_monthly_stats(
+    year: int,
+    month: int,
+    request: Request,
+    response: Response,
+    format: str = "rows",
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
 ):
-    """Get detailed monthly statistics with daily breakdown, category analysis, and weekly summary"""
+    """Get detailed monthly statistics with daily breakdown, category analysis, and weekly summary.
+
+    With `format=columnar` each breakdown is one array per field instead of
+    one object per day, category or week.
+    """
+    _check_format(format)
     try:
         user_id = current_user["id"]
 
@@ -347,206 +409,140 @@ def get_monthly_stats(
                 status_code=400, detail="Month must be between 1 and 12"
             )
 
-        # Get monthly totals
-        db.execute(
-            """
-            SELECT 
-                COALESCE(SUM(amount), 0) as total_expenses,
-                COUNT(*) as expense_transactions
-            FROM expenses 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM expense_date) = %s
-                AND EXTRACT(MONTH FROM expense_date) = %s
-        """,
-            (user_id, year, month),
-        )
-        expense_totals = db.fetchone()
-
-        db.execute(
-            """
-            SELECT 
-                COALESCE(SUM(amount), 0) as total_income,
-                COUNT(*) as income_transactions
-            FROM income 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM income_date) = %s
-                AND EXTRACT(MONTH FROM income_date) = %s
-        """,
-            (user_id, year, month),
+        month_start, month_end = period_bounds(year, month)
+        period, period_params = period_condition("day", month_start, month_end)
+
+        etag, cached = await cached_response(
+            db,
+            request,
+            response,
+            user_id,
+            ("expenses", "income"),
+            "monthly",
+            year,
+            month,
+            format,
         )
-        income_totals = db.fetchone()
-
-        total_expenses = float(expense_totals["total_expenses"] or 0)
-        total_income = float(income_totals["total_income"] or 0)
-        net_amount = total_income - total_expenses
-        expense_transactions = int(expense_totals["expense_transactions"] or 0)
-        income_transactions = int(income_totals["income_transactions"] or 0)
-
-        # Get daily breakdown
-        db.execute(
-            """
-            WITH daily_expenses AS (
-                SELECT 
-                    EXTRACT(DAY FROM expense_date) as day,
-                    COALESCE(SUM(amount), 0) as expenses
-                FROM expenses 
-                WHERE user_id = %s 
-                    AND EXTRACT(YEAR FROM expense_date) = %s
-                    AND EXTRACT(MONTH FROM expense_date) = %s
-                GROUP BY EXTRACT(DAY FROM expense_date)
-            ),
-            daily_income AS (
-                SELECT 
-                    EXTRACT(DAY FROM income_date) as day,
-                    COALESCE(SUM(amount), 0) as income
-                FROM income 
+        if cached:
+            return cached
+
+        # Totals and the daily, category and weekly breakdowns from the
+        # month's daily rollups, one grouping set each; GROUPING() tells the
+        # sets' rows apart
+        await db.execute(
+            f"""
+            WITH rollups AS (
+                SELECT kind,
+                       day as entry_date,
+                       EXTRACT(DAY FROM day) as day,
+                       EXTRACT(WEEK FROM day) as week_number,
+                       NULLIF(category, '') as category,
+                       amount,
+                       count
+                FROM daily_rollups
                 WHERE user_id = %s 
-                    AND EXTRACT(YEAR FROM income_date) = %s
-                    AND EXTRACT(MONTH FROM income_date) = %s
-                GROUP BY EXTRACT(DAY FROM income_date)
+                    AND {period}
             )
             SELECT 
-                COALESCE(de.day, di.day) as day,
-                COALESCE(de.expenses, 0) as expenses,
-                COALESCE(di.income, 0) as income,
-                COALESCE(di.income, 0) - COALESCE(de.expenses, 0) as net_amount
-            FROM daily_expenses de
-            FULL OUTER JOIN daily_income di ON de.day = di.day
-            ORDER BY day
+                kind,
+                CASE GROUPING(day, week_number, category)
+                    WHEN 3 THEN 'day'
+                    WHEN 5 THEN 'week'
+                    WHEN 6 THEN 'category'
+                    ELSE 'total'
+                END as breakdown,
+                day,
+                week_number,
+                category,
+                COALESCE(SUM(amount), 0) as amount,
+                COALESCE(SUM(count), 0) as count,
+                MIN(entry_date) as start_date,
+                MAX(entry_date) as end_date
+            FROM rollups
+            GROUP BY GROUPING SETS (
+                (kind), (kind, day), (kind, week_number), (kind, category)
+            )
         """,
-            (user_id, year, month, user_id, year, month),
+            (user_id, *period_params),
         )
-        daily_data = db.fetchall()
+        totals = {}
+        daily_data = {}
+        category_data = {"expenses": [], "income": []}
+        weekly_data = {}
+        for row in db.fetchall():
+            kind = row["kind"]
+            if row["breakdown"] == "total":
+                totals[kind] = row
+            elif row["breakdown"] == "day":
+                daily_data.setdefault(int(row["day"]), {})[kind] = row
+            elif row["breakdown"] == "week":
+                weekly_data.setdefault(int(row["week_number"]), {})[kind] = row
+            elif row["category"] is not None:
+                category_data[kind].append(row)
+
+        no_rows = {"amount": 0, "count": 0}
+        expense_totals = totals.get("expenses", no_rows)
+        income_totals = totals.get("income", no_rows)
+        total_expenses = float(expense_totals["amount"] or 0)
+        total_income = float(income_totals["amount"] or 0)
+        net_amount = total_income - total_expenses
+        expense_transactions = int(expense_totals["count"] or 0)
+        income_transactions = int(income_totals["count"] or 0)
 
         daily_breakdown = []
-        for row in daily_data:
+        for day in sorted(daily_data):
+            expenses = daily_data[day].get("expenses", no_rows)["amount"]
+            income = daily_data[day].get("income", no_rows)["amount"]
             daily_breakdown.append(
                 {
-                    "day": int(row["day"]),
-                    "expenses": float(row["expenses"]),
-                    "income": float(row["income"]),
-                    "net_amount": float(row["net_amount"]),
+                    "day": day,
+                    "expenses": float(expenses),
+                    "income": float(income),
+                    "net_amount": float(income - expenses),
                 }
             )
 
-        # Get category breakdown for expenses
-        db.execute(
-            """
-            SELECT 
-                category,
-                COALESCE(SUM(amount), 0) as amount,
-                COUNT(*) as count
-            FROM expenses 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM expense_date) = %s
-                AND EXTRACT(MONTH FROM expense_date) = %s
-                AND category IS NOT NULL
-            GROUP BY category
-            ORDER BY amount DESC
-        """,
-            (user_id, year, month),
-        )
-        expense_categories = db.fetchall()
-
-        # Get category breakdown for income
-        db.execute(
-            """
-            SELECT 
-                category,
-                COALESCE(SUM(amount), 0) as amount,
-                COUNT(*) as count
-            FROM income 
-            WHERE user_id = %s 
-                AND EXTRACT(YEAR FROM income_date) = %s
-                AND EXTRACT(MONTH FROM income_date) = %s
-                AND category IS NOT NULL
-            GROUP BY category
-            ORDER BY amount DESC
-        """,
-            (user_id, year, month),
-        )
-        income_categories = db.fetchall()
-
         category_breakdown = {
-            "expenses": [
+            kind: [
                 {
                     "category": row["category"],
                     "amount": float(row["amount"]),
                     "count": int(row["count"]),
                 }
-                for row in expense_categories
-            ],
-            "income": [
-                {
-                    "category": row["category"],
-                    "amount": float(row["amount"]),
-                    "count": int(row["count"]),
-                }
-                for row in income_categories
-            ],
+                for row in sorted(rows, key=lambda row: row["amount"], reverse=True)
+            ]
+            for kind, rows in category_data.items()
         }
 
-        # Get weekly summary
-        db.execute(
-            """
-            WITH weekly_expenses AS (
-                SELECT 
-                    EXTRACT(WEEK FROM expense_date) as week_number,
-                    COALESCE(SUM(amount), 0) as expenses,
-                    MIN(expense_date) as start_date,
-                    MAX(expense_date) as end_date
-                FROM expenses 
-                WHERE user_id = %s 
-                    AND EXTRACT(YEAR FROM expense_date) = %s
-                    AND EXTRACT(MONTH FROM expense_date) = %s
-                GROUP BY EXTRACT(WEEK FROM expense_date)
-            ),
-            weekly_income AS (
-                SELECT 
-                    EXTRACT(WEEK FROM income_date) as week_number,
-                    COALESCE(SUM(amount), 0) as income,
-                    MIN(income_date) as start_date,
-                    MAX(income_date) as end_date
-                FROM income 
-                WHERE user_id = %s 
-                    AND EXTRACT(YEAR FROM income_date) = %s
-                    AND EXTRACT(MONTH FROM income_date) = %s
-                GROUP BY EXTRACT(WEEK FROM income_date)
-            )
-            SELECT 
-                COALESCE(we.week_number, wi.week_number) as week_number,
-                COALESCE(we.expenses, 0) as expenses,
-                COALESCE(wi.income, 0) as income,
-                COALESCE(wi.income, 0) - COALESCE(we.expenses, 0) as net,
-                COALESCE(we.start_date, wi.start_date) as start_date,
-                COALESCE(we.end_date, wi.end_date) as end_date
-            FROM weekly_expenses we
-            FULL OUTER JOIN weekly_income wi ON we.week_number = wi.week_number
-            ORDER BY week_number
-        """,
-            (user_id, year, month, user_id, year, month),
-        )
-        weekly_data = db.fetchall()
-
         weekly_summary = []
-        for row in weekly_data:
-            start_date = (
-                row["start_date"].strftime("%b %d") if row["start_date"] else ""
-            )
-            end_date = row["end_date"].strftime("%b %d") if row["end_date"] else ""
-            date_range = f"{start_date} - {end_date}" if start_date and end_date else ""
+        for week_number in sorted(weekly_data):
+            week = weekly_data[week_number]
+            expenses = week.get("expenses", no_rows)["amount"]
+            income = week.get("income", no_rows)["amount"]
+            # Date range of the week's expenses, or of its income if it had none
+            dates = week.get("expenses") or week["income"]
+            start_date = dates["start_date"].strftime("%b %d")
+            end_date = dates["end_date"].strftime("%b %d")
 
             weekly_summary.append(
                 {
-                    "week_number": int(row["week_number"]),
-                    "expenses": float(row["expenses"]),
-                    "income": float(row["income"]),
-                    "net": float(row["net"]),
-                    "date_range": date_range,
+                    "week_number": week_number,
+                    "expenses": float(expenses),
+                    "income": float(income),
+                    "net": float(income - expenses),
+                    "date_range": f"{start_date} - {end_date}",
                 }
             )
 
-        return {
+        if format == "columnar":
+            daily_breakdown = to_columns(daily_breakdown, DAILY_BREAKDOWN_FIELDS)
+            category_breakdown = {
+                kind: to_columns(rows, CATEGORY_BREAKDOWN_FIELDS)
+                for kind, rows in category_breakdown.items()
+            }
+            weekly_summary = to_columns(weekly_summary, WEEKLY_SUMMARY_FIELDS)
+
+        result = {
             "year": year,
             "month": month,
             "total_expenses": total_expenses,
@@ -558,7 +554,325 @@ def get_monthly_stats(
             "category_breakdown": category_breakdown,
             "weekly_summary": weekly_summary,
         }
+        return await store_response(etag, result, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting monthly stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get monthly stats")
+
+
+@stats_route.get("/trends/rolling")
+async def get_rolling_trends(
+    request: Request,
+    response: Response,
+    kind: str = "expenses",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = "rows",
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get every day's total with the rolling 7, 30 and 90-day totals ending
+    on it; the windows reach back before `start_date`"""
+    _check_format(format)
+    start_date, end_date = _trend_range(kind, start_date, end_date)
+    try:
+        user_id = current_user["id"]
+
+        etag, cached = await cached_response(
+            db,
+            request,
+            response,
+            user_id,
+            (kind,),
+            "trends-rolling",
+            kind,
+            start_date,
+            end_date,
+            format,
+        )
+        if cached:
+            return cached
+
+        # Every day of the range and the 89 before it, so the frames can
+        # count rows: ROWS over a gapless series equals a range of days
+        series_start = start_date - timedelta(days=89)
+        period, period_params = period_condition(
+            "day", series_start, end_date + timedelta(days=1)
+        )
+        await db.execute(
+            f"""
+            WITH daily AS (
+                SELECT day, SUM(amount) as amount
+                FROM daily_rollups
+                WHERE user_id = %s
+                    AND kind = %s
+                    AND {period}
+                GROUP BY day
+            ),
+            series AS (
+                SELECT days.day::date as day,
+                       COALESCE(daily.amount, 0) as amount
+                FROM generate_series(%s::timestamp, %s::timestamp, interval '1 day')
+                    as days(day)
+                LEFT JOIN daily ON daily.day = days.day::date
+            ),
+            rolling AS (
+                SELECT day,
+                       amount,
+                       SUM(amount) OVER (w ROWS BETWEEN 6 PRECEDING AND CURRENT ROW)
+                           as rolling_7,
+                       SUM(amount) OVER (w ROWS BETWEEN 29 PRECEDING AND CURRENT ROW)
+                           as rolling_30,
+                       SUM(amount) OVER (w ROWS BETWEEN 89 PRECEDING AND CURRENT ROW)
+                           as rolling_90
+                FROM series
+                WINDOW w AS (ORDER BY day)
+            )
+            SELECT day, amount, rolling_7, rolling_30, rolling_90
+            FROM rolling
+            WHERE day >= %s
+            ORDER BY day
+        """,
+            (user_id, kind, *period_params, series_start, end_date, start_date),
+        )
+        days = db.fetchall()
+
+        if format == "columnar":
+            days = to_columns(days, ROLLING_TREND_FIELDS)
+
+        result = {
+            "kind": kind,
+            "start_date": start_date,
+            "end_date": end_date,
+            "days": days,
+        }
+        return await store_response(etag, result, response)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting rolling trends: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get rolling trends")
+
+
+@stats_route.get("/trends/monthly")
+async def get_monthly_trends(
+    request: Request,
+    response: Response,
+    kind: str = "expenses",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = "rows",
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get the total of every month the range touches with the change from
+    the month before and from the same month a year earlier. Percentages are
+    null when the earlier month had no spend."""
+    _check_format(format)
+    start_date, end_date = _trend_range(kind, start_date, end_date)
+    try:
+        user_id = current_user["id"]
+
+        etag, cached = await cached_response(
+            db,
+            request,
+            response,
+            user_id,
+            (kind,),
+            "trends-monthly",
+            kind,
+            start_date,
+            end_date,
+            format,
+        )
+        if cached:
+            return cached
+
+        # Whole months, starting twelve before the first so every month in
+        # the range has both comparisons
+        first_month = start_date.replace(day=1)
+        series_start = first_month.replace(year=first_month.year - 1)
+        last_month = end_date.replace(day=1)
+        period, period_params = period_condition(
+            "day", series_start, period_bounds(last_month.year, last_month.month)[1]
+        )
+        await db.execute(
+            f"""
+            WITH monthly AS (
+                SELECT date_trunc('month', day::timestamp)::date as month,
+                       SUM(amount) as amount,
+                       SUM(count) as count
+                FROM daily_rollups
+                WHERE user_id = %s
+                    AND kind = %s
+                    AND {period}
+                GROUP BY 1
+            ),
+            series AS (
+                SELECT months.month::date as month,
+                       COALESCE(monthly.amount, 0) as amount,
+                       COALESCE(monthly.count, 0) as count
+                FROM generate_series(%s::timestamp, %s::timestamp, interval '1 month')
+                    as months(month)
+                LEFT JOIN monthly ON monthly.month = months.month::date
+            ),
+            compared AS (
+                SELECT month,
+                       amount,
+                       count,
+                       LAG(amount, 1) OVER w as previous_month,
+                       LAG(amount, 12) OVER w as previous_year
+                FROM series
+                WINDOW w AS (ORDER BY month)
+            )
+            SELECT month,
+                   amount,
+                   count,
+                   previous_month,
+                   amount - previous_month as mom_change,
+                   ROUND((amount - previous_month) / NULLIF(previous_month, 0) * 100, 2)
+                       as mom_change_pct,
+                   previous_year,
+                   amount - previous_year as yoy_change,
+                   ROUND((amount - previous_year) / NULLIF(previous_year, 0) * 100, 2)
+                       as yoy_change_pct
+            FROM compared
+            WHERE month >= %s
+            ORDER BY month
+        """,
+            (
+                user_id,
+                kind,
+                *period_params,
+                series_start,
+                last_month,
+                first_month,
+            ),
+        )
+        months = db.fetchall()
+
+        if format == "columnar":
+            months = to_columns(months, MONTHLY_TREND_FIELDS)
+
+        result = {
+            "kind": kind,
+            "start_date": start_date,
+            "end_date": end_date,
+            "months": months,
+        }
+        return await store_response(etag, result, response)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting monthly trends: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get monthly trends")
+
+
+@stats_route.get("/trends/categories")
+async def get_category_trends(
+    request: Request,
+    response: Response,
+    kind: str = "expenses",
+    period: str = "month",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = "rows",
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get each category's total per day, ISO week or month of the range with
+    its running total since `start_date`; periods without spend are left out.
+
+    With `format=columnar` each category's periods are one array per field.
+    """
+    _check_format(format)
+    start_date, end_date = _trend_range(kind, start_date, end_date)
+    if period not in TREND_PERIODS:
+        raise HTTPException(
+            status_code=400, detail="Period must be one of: day, week, month"
+        )
+    try:
+        user_id = current_user["id"]
+
+        etag, cached = await cached_response(
+            db,
+            request,
+            response,
+            user_id,
+            (kind,),
+            "trends-categories",
+            kind,
+            period,
+            start_date,
+            end_date,
+            format,
+        )
+        if cached:
+            return cached
+
+        range_condition, range_params = period_condition(
+            "day", start_date, end_date + timedelta(days=1)
+        )
+        await db.execute(
+            f"""
+            WITH buckets AS (
+                SELECT NULLIF(category, '') as category,
+                       date_trunc(%s, day::timestamp)::date as period,
+                       SUM(amount) as amount,
+                       SUM(count) as count
+                FROM daily_rollups
+                WHERE user_id = %s
+                    AND kind = %s
+                    AND {range_condition}
+                GROUP BY 1, 2
+            )
+            SELECT category,
+                   period,
+                   amount,
+                   count,
+                   SUM(amount) OVER (PARTITION BY category ORDER BY period)
+                       as running_total
+            FROM buckets
+            ORDER BY category NULLS LAST, period
+        """,
+            (period, user_id, kind, *range_params),
+        )
+
+        categories = {}
+        for row in db.fetchall():
+            categories.setdefault(row.pop("category"), []).append(row)
+
+        category_trends = [
+            {
+                "category": category,
+                "total": periods[-1]["running_total"],
+                "periods": (
+                    to_columns(periods, CATEGORY_TREND_FIELDS)
+                    if format == "columnar"
+                    else periods
+                ),
+            }
+            for category, periods in categories.items()
+        ]
+
+        result = {
+            "kind": kind,
+            "period": period,
+            "start_date": start_date,
+            "end_date": end_date,
+            "categories": sorted(
+                category_trends, key=lambda trend: trend["total"], reverse=True
+            ),
+        }
+        return await store_response(etag, result, response)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting category trends: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get category trends")
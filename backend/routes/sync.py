@@ -0,0 +1,476 @@
+import logging
+from typing import Optional
+
+from async_database import get_async_db
+from auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from queries import decode_cursor, encode_cursor, insert_items_many
+from responses import trusted_response
+from schemas import (
+    ExpenseCreate,
+    ExpenseUpdate,
+    IncomeCreate,
+    IncomeUpdate,
+    LoanCreate,
+    LoanUpdate,
+    SyncBatch,
+    SyncBatchOut,
+    SyncChangesOut,
+)
+
+from .expense import update_expense
+from .income import update_income
+from .loan import update_loan
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+sync_route = APIRouter(prefix="/sync", tags=["sync"])
+
+# Synced tables: columns sent to the client and, for child tables, the parent
+# table and foreign key that tie a row to its owner
+SYNC_RESOURCES = {
+    "expenses": (
+        "id, vendor, description, amount, category, expense_date, created_at, updated_at",
+        None,
+    ),
+    "expense_items": (
+        "id, expense_id, description, quantity, unit_price, line_total, created_at",
+        ("expenses", "expense_id"),
+    ),
+    "income": (
+        "id, source, description, amount, category, income_date, created_at, updated_at",
+        None,
+    ),
+    "income_items": (
+        "id, income_id, description, quantity, unit_price, line_total, created_at",
+        ("income", "income_id"),
+    ),
+    "loans": (
+        "id, type, person_name, person_contact, principal_amount, current_balance, "
+        "interest_rate, loan_date, due_date, status, description, created_at, updated_at",
+        None,
+    ),
+    "loan_transactions": (
+        "id, loan_id, transaction_type, amount, transaction_date, description, created_at",
+        ("loans", "loan_id"),
+    ),
+}
+
+
+def _rows_query(resource, by_id):
+    columns, parent = SYNC_RESOURCES[resource]
+    if parent is None:
+        query = f"SELECT {columns} FROM {resource} WHERE user_id = %s"
+        return query + (" AND id = ANY(%s)" if by_id else "") + " ORDER BY id"
+
+    parent_table, foreign_key = parent
+    prefixed = ", ".join(f"c.{column.strip()}" for column in columns.split(","))
+    query = f"""
+        SELECT {prefixed} FROM {resource} c
+        JOIN {parent_table} p ON p.id = c.{foreign_key}
+        WHERE p.user_id = %s
+    """
+    return query + (" AND c.id = ANY(%s)" if by_id else "") + " ORDER BY c.id"
+
+
+@sync_route.get("/changes", response_model=SyncChangesOut)
+@trusted_response
+async def get_changes(
+    since: Optional[str] = None,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Get everything created, updated or deleted since a sync token.
+
+    Without `since`, or when the token predates the pruned change history,
+    the response is a full snapshot with `reset` set and the client should
+    replace its copy. Otherwise `upserted` holds the current state of changed
+    rows and `deleted` the ids of removed ones; deleting a parent also removes
+    its items or transactions. Pass the returned `token` as the next `since`.
+    Rows may repeat across consecutive responses, so apply them idempotently.
+    """
+    since_txid = None
+    if since:
+        try:
+            (since_txid,) = decode_cursor(since, (int,))
+        except HTTPException:
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+
+    try:
+        user_id = current_user["id"]
+
+        # Every transaction that has not committed yet is at or above this
+        # xmin, so reading the log from here next time cannot miss a change
+        await db.execute("""
+            SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS token,
+                   (SELECT pruned_txid FROM change_log_horizon) AS pruned_txid
+        """)
+        state = db.fetchone()
+        reset = since_txid is None or since_txid < (state["pruned_txid"] or 0)
+        changes = {}
+
+        if reset:
+            for resource in SYNC_RESOURCES:
+                await db.execute(_rows_query(resource, by_id=False), (user_id,))
+                changes[resource] = {"upserted": db.fetchall(), "deleted": []}
+        else:
+            await db.execute(
+                """
+                SELECT resource, row_id,
+                       (array_agg(operation ORDER BY id DESC))[1] AS operation
+                FROM change_log
+                WHERE user_id = %s AND txid >= %s
+                GROUP BY resource, row_id
+            """,
+                (user_id, since_txid),
+            )
+            upserted_ids = {resource: [] for resource in SYNC_RESOURCES}
+            deleted_ids = {resource: [] for resource in SYNC_RESOURCES}
+            for row in db.fetchall():
+                target = deleted_ids if row["operation"] == "D" else upserted_ids
+                target[row["resource"]].append(row["row_id"])
+
+            for resource in SYNC_RESOURCES:
+                upserted = []
+                if upserted_ids[resource]:
+                    await db.execute(
+                        _rows_query(resource, by_id=True),
+                        (user_id, upserted_ids[resource]),
+                    )
+                    upserted = db.fetchall()
+                changes[resource] = {
+                    "upserted": upserted,
+                    "deleted": sorted(deleted_ids[resource]),
+                }
+
+        return {
+            "token": encode_cursor([state["token"]]),
+            "reset": reset,
+            "changes": changes,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting sync changes: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get sync changes")
+
+
+# How each batch resource is written. Creates and deletes of consecutive
+# operations on the same resource go out as one statement; updates reuse the
+# single-row route handlers, undecorated so they return plain rows.
+BATCH_RESOURCES = {
+    "expense": {
+        "table": "expenses",
+        "create": ExpenseCreate,
+        "update": ExpenseUpdate,
+        "update_handler": update_expense.__wrapped__,
+        "columns": (
+            ("vendor", "text"),
+            ("description", "text"),
+            ("amount", "numeric"),
+            ("category", "text"),
+            ("expense_date", "date"),
+        ),
+        "values": lambda expense: (
+            expense.vendor,
+            expense.description,
+            expense.amount,
+            expense.category,
+            expense.expense_date,
+        ),
+        "returning": "id, user_id, vendor, description, amount, category, "
+        "expense_date, created_at, updated_at",
+        "children": ("expense_items", "expense_id", "items"),
+        "not_found": "Expense not found",
+    },
+    "income": {
+        "table": "income",
+        "create": IncomeCreate,
+        "update": IncomeUpdate,
+        "update_handler": update_income.__wrapped__,
+        "columns": (
+            ("source", "text"),
+            ("description", "text"),
+            ("amount", "numeric"),
+            ("category", "text"),
+            ("income_date", "date"),
+        ),
+        "values": lambda income: (
+            income.source,
+            income.description,
+            income.amount,
+            income.category,
+            income.income_date,
+        ),
+        "returning": "id, user_id, source, description, amount, category, "
+        "income_date, created_at, updated_at",
+        "children": ("income_items", "income_id", "items"),
+        "not_found": "Income not found",
+    },
+    "loan": {
+        "table": "loans",
+        "create": LoanCreate,
+        "update": LoanUpdate,
+        "update_handler": update_loan.__wrapped__,
+        "columns": (
+            ("type", "text"),
+            ("person_name", "text"),
+            ("person_contact", "text"),
+            ("principal_amount", "numeric"),
+            ("current_balance", "numeric"),
+            ("interest_rate", "numeric"),
+            ("loan_date", "date"),
+            ("due_date", "date"),
+            ("description", "text"),
+        ),
+        # current_balance starts as principal_amount
+        "values": lambda loan: (
+            loan.type,
+            loan.person_name,
+            loan.person_contact,
+            loan.principal_amount,
+            loan.principal_amount,
+            loan.interest_rate,
+            loan.loan_date,
+            loan.due_date,
+            loan.description,
+        ),
+        "returning": "id, user_id, type, person_name, person_contact, principal_amount, "
+        "current_balance, interest_rate, loan_date, due_date, status, description, "
+        "created_at, updated_at",
+        "children": None,
+        "not_found": "Loan not found",
+    },
+}
+
+
+def _result(op, status, id=None, data=None, detail=None):
+    return {"key": op.key, "status": status, "id": id, "data": data, "detail": detail}
+
+
+def _parse(op, schema):
+    """Validate an operation's payload, returning (model, error result)"""
+    if op.action in ("update", "delete") and op.id is None:
+        return None, _result(op, 422, detail=f"{op.action} requires an id")
+    if op.action == "delete":
+        return None, None
+    try:
+        return schema(**(op.data or {})), None
+    except ValidationError as e:
+        detail = "; ".join(error["msg"] for error in e.errors())
+        return None, _result(op, 422, id=op.id, detail=detail)
+
+
+async def _bulk_create(db, user_id, resource, ops, models):
+    config = BATCH_RESOURCES[resource]
+    names = ", ".join(name for name, _ in config["columns"])
+    arrays = ", ".join(f"%s::{pg_type}[]" for _, pg_type in config["columns"])
+    rows = [config["values"](model) for model in models]
+    # Ids are drawn up front next to each operation's position, since
+    # INSERT ... SELECT does not promise to assign them in input order
+    await db.execute(
+        f"""
+        WITH input AS MATERIALIZED (
+            SELECT nextval(pg_get_serial_sequence('{config["table"]}', 'id')) AS id, u.*
+            FROM unnest({arrays}) WITH ORDINALITY AS u({names}, position)
+        ),
+        inserted AS (
+            INSERT INTO {config["table"]} (id, user_id, {names})
+            SELECT id, %s, {names} FROM input
+            RETURNING {config["returning"]}
+        )
+        SELECT inserted.*
+        FROM inserted
+        JOIN input ON input.id = inserted.id
+        ORDER BY input.position
+    """,
+        [list(column) for column in zip(*rows)] + [user_id],
+    )
+    created = db.fetchall()
+
+    if config["children"]:
+        table, parent_column, key = config["children"]
+        children = await insert_items_many(
+            db,
+            table,
+            parent_column,
+            [(row["id"], model.items) for row, model in zip(created, models)],
+        )
+        created = [{**row, key: children[row["id"]]} for row in created]
+    else:
+        created = [{**row, "transactions": []} for row in created]
+
+    return [_result(op, 200, id=row["id"], data=row) for op, row in zip(ops, created)]
+
+
+async def _bulk_delete(db, user_id, resource, ops, models):
+    config = BATCH_RESOURCES[resource]
+    await db.execute(
+        f"DELETE FROM {config['table']} WHERE user_id = %s AND id = ANY(%s) RETURNING id",
+        (user_id, [op.id for op in ops]),
+    )
+    deleted = {row["id"] for row in db.fetchall()}
+    results = []
+    for op in ops:
+        if op.id in deleted:
+            # A second delete of the same row in this batch finds nothing
+            deleted.discard(op.id)
+            results.append(_result(op, 200, id=op.id))
+        else:
+            results.append(_result(op, 404, id=op.id, detail=config["not_found"]))
+    return results
+
+
+async def _update(db, current_user, resource, ops, models):
+    config = BATCH_RESOURCES[resource]
+    (op,), (model,) = ops, models
+    updated = await config["update_handler"](
+        op.id, model, db=db, current_user=current_user
+    )
+    return [_result(op, 200, id=op.id, data=updated)]
+
+
+async def _run_group(db, current_user, resource, action, ops, models):
+    """Run a group of operations in a savepoint; if a bulk statement fails,
+    retry its operations one by one so only the bad ones fail"""
+    try:
+        async with db.connection.transaction():
+            if action == "create":
+                return await _bulk_create(db, current_user["id"], resource, ops, models)
+            if action == "delete":
+                return await _bulk_delete(db, current_user["id"], resource, ops, models)
+            return await _update(db, current_user, resource, ops, models)
+    except HTTPException as e:
+        return [_result(op, e.status_code, id=op.id, detail=e.detail) for op in ops]
+    except Exception as e:
+        if len(ops) > 1:
+            results = []
+            for op, model in zip(ops, models):
+                results.extend(
+                    await _run_group(db, current_user, resource, action, [op], [model])
+                )
+            return results
+        logger.error(f"Error running sync operation {ops[0].key}: {str(e)}")
+        return [_result(ops[0], 500, id=ops[0].id, detail="Operation failed")]
+
+
+@sync_route.post("/batch", response_model=SyncBatchOut)
+async def sync_batch(
+    batch: SyncBatch,
+    db=Depends(get_async_db),
+    current_user=Depends(get_current_user),
+):
+    """Apply an ordered list of queued expense, income and loan operations.
+
+    Each operation is `{key, resource, action, id?, data?}` where `key` is a
+    client-chosen idempotency key: replaying a key returns the stored result
+    with `replayed` set instead of writing again. The batch runs in one
+    transaction; a failing operation is rolled back on its own and reported
+    in its result without affecting the others.
+    """
+    try:
+        user_id = current_user["id"]
+        keys = list(dict.fromkeys(op.key for op in batch.operations))
+
+        # Claim every new key up front; a concurrent retry of the same batch
+        # blocks here until this transaction commits and then replays
+        await db.execute(
+            """
+            INSERT INTO idempotency_keys (user_id, key)
+            SELECT %s, unnest(%s::text[])
+            ON CONFLICT DO NOTHING
+            RETURNING key
+        """,
+            (user_id, keys),
+        )
+        claimed = {row["key"] for row in db.fetchall()}
+
+        stored = {}
+        if len(claimed) < len(keys):
+            await db.execute(
+                """
+                SELECT key, response FROM idempotency_keys
+                WHERE user_id = %s AND key = ANY(%s) AND status_code IS NOT NULL
+            """,
+                (user_id, [key for key in keys if key not in claimed]),
+            )
+            stored = {row["key"]: row["response"] for row in db.fetchall()}
+
+        # Group consecutive operations that can share one statement
+        groups = []
+        results = {}
+        for op in batch.operations:
+            if op.key not in claimed or op.key in results:
+                continue
+            config = BATCH_RESOURCES[op.resource]
+            model, error = _parse(op, config.get(op.action))
+            if error:
+                results[op.key] = error
+                continue
+            results[op.key] = None
+            last = groups[-1] if groups else None
+            if (
+                last
+                and op.action != "update"
+                and (last[0], last[1]) == (op.resource, op.action)
+            ):
+                last[2].append(op)
+                last[3].append(model)
+            else:
+                groups.append((op.resource, op.action, [op], [model]))
+
+        for resource, action, ops, models in groups:
+            for result in await _run_group(
+                db, current_user, resource, action, ops, models
+            ):
+                results[result["key"]] = jsonable_encoder(result)
+
+        # Server errors are not remembered, so retrying the key runs it again
+        await db.execute(
+            """
+            UPDATE idempotency_keys k
+            SET status_code = r.status, response = r.response
+            FROM jsonb_to_recordset(%s::jsonb) AS r(key text, status int, response jsonb)
+            WHERE k.user_id = %s AND k.key = r.key
+        """,
+            (
+                [
+                    {"key": key, "status": result["status"], "response": result}
+                    for key, result in results.items()
+                    if result["status"] < 500
+                ],
+                user_id,
+            ),
+        )
+        failed = [key for key, result in results.items() if result["status"] >= 500]
+        if failed:
+            await db.execute(
+                "DELETE FROM idempotency_keys WHERE user_id = %s AND key = ANY(%s)",
+                (user_id, failed),
+            )
+
+        response = []
+        seen = set()
+        for op in batch.operations:
+            if op.key in results and op.key not in seen:
+                response.append(results[op.key])
+            elif op.key in stored or op.key in results:
+                response.append(
+                    {**(stored.get(op.key) or results[op.key]), "replayed": True}
+                )
+            else:
+                response.append(
+                    _result(op, 409, id=op.id, detail="Operation is still in progress")
+                )
+            seen.add(op.key)
+        return {"results": response}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error applying sync batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to apply sync batch")
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from decimal import Decimal
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, EmailStr, validator
 
@@ -85,6 +85,21 @@ class ExpenseOut(BaseModel):
         from_attributes = True
 
 
+class ExpenseSearchHit(BaseModel):
+    id: int
+    user_id: int
+    vendor: Optional[str]
+    description: str
+    amount: float
+    category: Optional[str]
+    expense_date: date
+    created_at: datetime
+    updated_at: datetime
+    rank: float
+    snippet: Optional[str]
+    matched_items: List[str] = []
+
+
 class ExpenseUpdate(BaseModel):
     vendor: Optional[str] = None
     description: Optional[str] = None
@@ -93,6 +108,26 @@ class ExpenseUpdate(BaseModel):
     expense_date: Optional[date] = None
 
 
+class ExpenseFilter(BaseModel):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    category: Optional[List[str]] = None
+    vendor: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+
+class ExpenseBulkUpdate(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[ExpenseFilter] = None
+    changes: ExpenseUpdate
+
+
+class ExpenseBulkDelete(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[ExpenseFilter] = None
+
+
 # Income Item schemas
 class IncomeItemCreate(BaseModel):
     description: str
@@ -160,6 +195,26 @@ class IncomeUpdate(BaseModel):
     income_date: Optional[date] = None
 
 
+class IncomeFilter(BaseModel):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    category: Optional[List[str]] = None
+    source: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+
+class IncomeBulkUpdate(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[IncomeFilter] = None
+    changes: IncomeUpdate
+
+
+class IncomeBulkDelete(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[IncomeFilter] = None
+
+
 # Bill processing schema
 class BillData(BaseModel):
     vendor: str
@@ -298,3 +353,66 @@ class LoanSummary(BaseModel):
     active_loans_received: int
     overdue_loans_given: int
     overdue_loans_received: int
+
+
+# Sync schemas
+class SyncResourceChanges(BaseModel):
+    upserted: List[Dict[str, Any]] = []
+    deleted: List[int] = []
+
+
+class SyncChangesOut(BaseModel):
+    token: str
+    reset: bool
+    changes: Dict[str, SyncResourceChanges]
+
+
+class SyncOperation(BaseModel):
+    key: str
+    resource: str
+    action: str
+    id: Optional[int] = None
+    data: Optional[Dict[str, Any]] = None
+
+    @validator("key")
+    def validate_key(cls, v):
+        if not v or len(v) > 255:
+            raise ValueError("Idempotency key must be 1 to 255 characters")
+        return v
+
+    @validator("resource")
+    def validate_resource(cls, v):
+        allowed_resources = ["expense", "income", "loan"]
+        if v not in allowed_resources:
+            raise ValueError(f"Resource must be one of: {allowed_resources}")
+        return v
+
+    @validator("action")
+    def validate_action(cls, v):
+        allowed_actions = ["create", "update", "delete"]
+        if v not in allowed_actions:
+            raise ValueError(f"Action must be one of: {allowed_actions}")
+        return v
+
+
+class SyncBatch(BaseModel):
+    operations: List[SyncOperation]
+
+    @validator("operations")
+    def validate_operations(cls, v):
+        if len(v) > 1000:
+            raise ValueError("A batch holds at most 1000 operations")
+        return v
+
+
+class SyncOperationResult(BaseModel):
+    key: str
+    status: int
+    id: Optional[int] = None
+    data: Optional[Dict[str, Any]] = None
+    detail: Optional[str] = None
+    replayed: bool = False
+
+
+class SyncBatchOut(BaseModel):
+    results: List[SyncOperationResult]
@@ -0,0 +1,694 @@
+"""Database access benchmarks for the expense tracker backend.
+
+Each scenario seeds a throwaway user into the database configured in .env,
+measures it, and deletes the user (and everything cascading from it) again.
+
+    python benchmark.py db-modes --rows 5000 --requests 2000 --concurrency 200
+    python benchmark.py list-children --rows 5000 --requests 200
+    python benchmark.py mutations --rows 5000 --requests 500
+    python benchmark.py json-render --rows 10000 --requests 20
+    python benchmark.py response-encoding --limit 100 --requests 2000
+    python benchmark.py stats --rows 1000000 --requests 50
+    python benchmark.py analytics --rows 1000000 --requests 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anyio  # noqa: E402
+from analytics import ledger_cache  # noqa: E402
+from async_database import AsyncCursor, get_async_pool  # noqa: E402
+from database import db_cursor, get_pool  # noqa: E402
+from fastapi import Request, Response  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from queries import (  # noqa: E402
+    EXPENSE_COLUMNS,
+    EXPENSE_ITEM_COLUMNS,
+    children_json,
+    json_page,
+)
+from response_cache import clear_responses  # noqa: E402
+from routes.analytics import (  # noqa: E402
+    get_category_shares,
+    get_period_comparison,
+    get_period_totals,
+    get_rolling_totals,
+)
+from responses import dump_json, orjson  # noqa: E402
+from routes.expense import delete_expense, update_expense  # noqa: E402
+from routes.stats import (  # noqa: E402
+    get_dashboard_stats,
+    get_monthly_stats,
+    get_yearly_stats,
+)
+from schemas import ExpenseOut, ExpenseUpdate  # noqa: E402
+
+LIST_EXPENSES_QUERY = """
+    SELECT id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
+    FROM expenses
+    WHERE user_id = %s
+    ORDER BY expense_date DESC, created_at DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def seed_user(rows, items_per_expense=2):
+    """Create a throwaway user with `rows` expenses spread over ~3 years"""
+    email = f"bench_{uuid.uuid4().hex[:12]}@example.com"
+    with db_cursor() as db:
+        db.execute(
+            "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s) RETURNING id",
+            (email.split("@")[0], email, "!"),
+        )
+        user_id = db.fetchone()["id"]
+        db.execute(
+            """
+            INSERT INTO expenses (user_id, vendor, description, amount, category, expense_date)
+            SELECT %s,
+                   'Vendor ' || (g %% 50),
+                   'Benchmark expense ' || g,
+                   round((random() * 200)::numeric, 2),
+                   (ARRAY['Groceries', 'Transport', 'Dining', 'Bills', 'Others'])[1 + g %% 5],
+                   CURRENT_DATE - (g %% 1095)
+            FROM generate_series(1, %s) AS g
+        """,
+            (user_id, rows),
+        )
+        db.execute(
+            """
+            INSERT INTO expense_items (expense_id, description, quantity, unit_price, line_total)
+            SELECT e.id, 'Item ' || n, 1, e.amount / %s, e.amount / %s
+            FROM expenses e, generate_series(1, %s) AS n
+            WHERE e.user_id = %s
+        """,
+            (items_per_expense, items_per_expense, items_per_expense, user_id),
+        )
+        db.execute(
+            """
+            INSERT INTO income (user_id, source, description, amount, category, income_date)
+            SELECT %s, 'Employer', 'Benchmark income ' || g, 2500, 'Salary',
+                   CURRENT_DATE - (g * 30)
+            FROM generate_series(1, GREATEST(%s / 50, 1)) AS g
+        """,
+            (user_id, rows),
+        )
+    return user_id
+
+
+def drop_user(user_id):
+    with db_cursor() as db:
+        db.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+
+def summarize(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{label:<12} {len(latencies) / elapsed:>9.1f} req/s   "
+        f"p50 {statistics.median(latencies) * 1000:>7.2f} ms   "
+        f"p95 {p95 * 1000:>7.2f} ms"
+    )
+
+
+async def run_sync_mode(user_id, requests, concurrency):
+    """Blocking psycopg2 calls on the threadpool, as sync `def` routes run"""
+    get_pool()
+    latencies = []
+    limiter = anyio.CapacityLimiter(40)  # Starlette's default threadpool size
+
+    def handler():
+        with db_cursor() as db:
+            db.execute(LIST_EXPENSES_QUERY, (user_id, 100, 0))
+            db.fetchall()
+
+    async def one_request():
+        started = time.perf_counter()
+        await anyio.to_thread.run_sync(handler, limiter=limiter)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await _run_concurrently(one_request, requests, concurrency)
+    return latencies, time.perf_counter() - started
+
+
+async def run_async_mode(user_id, requests, concurrency):
+    """asyncpg on the event loop, as the `async def` routes run"""
+    pool = await get_async_pool()
+    latencies = []
+
+    async def one_request():
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            db = AsyncCursor(conn)
+            await db.execute(LIST_EXPENSES_QUERY, (user_id, 100, 0))
+            db.fetchall()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await _run_concurrently(one_request, requests, concurrency)
+    return latencies, time.perf_counter() - started
+
+
+async def _run_concurrently(fn, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded():
+        async with semaphore:
+            await fn()
+
+    await asyncio.gather(*(guarded() for _ in range(requests)))
+
+
+def bench_db_modes(args):
+    user_id = seed_user(args.rows)
+    try:
+        print(
+            f"{args.requests} list requests, {args.concurrency} concurrent, "
+            f"{args.rows} expenses"
+        )
+        latencies, elapsed = asyncio.run(
+            run_sync_mode(user_id, args.requests, args.concurrency)
+        )
+        summarize("sync", latencies, elapsed)
+        latencies, elapsed = asyncio.run(
+            run_async_mode(user_id, args.requests, args.concurrency)
+        )
+        summarize("async", latencies, elapsed)
+    finally:
+        drop_user(user_id)
+
+
+async def _list_page_n_plus_one(db, user_id, limit):
+    await db.execute(LIST_EXPENSES_QUERY, (user_id, limit, 0))
+    result = []
+    for expense in db.fetchall():
+        await db.execute(
+            f"SELECT {EXPENSE_ITEM_COLUMNS} FROM expense_items WHERE expense_id = %s",
+            (expense["id"],),
+        )
+        result.append({**expense, "items": db.fetchall()})
+    return result
+
+
+async def _list_page_batched(db, user_id, limit):
+    # The page, then every item of it with one `= ANY(...)` query
+    await db.execute(LIST_EXPENSES_QUERY, (user_id, limit, 0))
+    expenses = db.fetchall()
+    await db.execute(
+        f"""
+        SELECT expense_id AS parent_id, {EXPENSE_ITEM_COLUMNS}
+        FROM expense_items
+        WHERE expense_id = ANY(%s)
+    """,
+        ([expense["id"] for expense in expenses],),
+    )
+    items = defaultdict(list)
+    for row in db.fetchall():
+        items[row.pop("parent_id")].append(row)
+    return [{**expense, "items": items.get(expense["id"], [])} for expense in expenses]
+
+
+async def run_list_children(user_id, requests, limit):
+    pool = await get_async_pool()
+    for label, loader in (
+        ("per-row", _list_page_n_plus_one),
+        ("batched", _list_page_batched),
+    ):
+        latencies = []
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            for _ in range(requests):
+                db = AsyncCursor(conn)
+                page_started = time.perf_counter()
+                await loader(db, user_id, limit)
+                latencies.append(time.perf_counter() - page_started)
+        summarize(label, latencies, time.perf_counter() - started)
+        print(f"{'':<12} {db.query_count} round trips per page")
+
+
+def bench_list_children(args):
+    user_id = seed_user(args.rows)
+    try:
+        print(f"{args.requests} pages of {args.limit} expenses with 2 items each")
+        asyncio.run(run_list_children(user_id, args.requests, args.limit))
+    finally:
+        drop_user(user_id)
+
+
+async def _update_check_first(db, user_id, expense_id, changes):
+    """The previous update path: existence check, UPDATE, then the items"""
+    await db.execute(
+        "SELECT id FROM expenses WHERE id = %s AND user_id = %s", (expense_id, user_id)
+    )
+    db.fetchone()
+    await db.execute(
+        """
+        UPDATE expenses SET category = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND user_id = %s
+        RETURNING id, user_id, vendor, description, amount, category, expense_date, created_at, updated_at
+    """,
+        (changes.category, expense_id, user_id),
+    )
+    updated = db.fetchone()
+    await db.execute(
+        f"SELECT {EXPENSE_ITEM_COLUMNS} FROM expense_items WHERE expense_id = %s",
+        (expense_id,),
+    )
+    return {**updated, "items": db.fetchall()}
+
+
+async def _delete_check_first(db, user_id, expense_id):
+    """The previous delete path: existence check, then DELETE"""
+    await db.execute(
+        "SELECT id FROM expenses WHERE id = %s AND user_id = %s", (expense_id, user_id)
+    )
+    db.fetchone()
+    await db.execute(
+        "DELETE FROM expenses WHERE id = %s AND user_id = %s", (expense_id, user_id)
+    )
+
+
+async def run_mutations(user_id, requests):
+    pool = await get_async_pool()
+    current_user = {"id": user_id}
+    changes = ExpenseUpdate(category="Benchmark")
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT id FROM expenses WHERE user_id = $1 ORDER BY id LIMIT $2",
+            user_id,
+            requests,
+        )
+        ids = [row["id"] for row in rows]
+
+        cases = (
+            ("update 3rt", lambda db, i: _update_check_first(db, user_id, i, changes)),
+            (
+                "update 1rt",
+                lambda db, i: update_expense.__wrapped__(
+                    i, changes, db=db, current_user=current_user
+                ),
+            ),
+            ("delete 2rt", lambda db, i: _delete_check_first(db, user_id, i)),
+            (
+                "delete 1rt",
+                lambda db, i: delete_expense(i, db=db, current_user=current_user),
+            ),
+        )
+        for label, mutate in cases:
+            latencies = []
+            started = time.perf_counter()
+            for expense_id in ids:
+                db = AsyncCursor(conn)
+                # Roll every mutation back so each case sees the same rows
+                transaction = conn.transaction()
+                await transaction.start()
+                call_started = time.perf_counter()
+                await mutate(db, expense_id)
+                latencies.append(time.perf_counter() - call_started)
+                await transaction.rollback()
+            summarize(label, latencies, time.perf_counter() - started)
+            print(f"{'':<12} {db.query_count} round trips per call")
+
+
+def bench_mutations(args):
+    user_id = seed_user(args.rows)
+    try:
+        print(f"{args.requests} updates and deletes of expenses with 2 items each")
+        asyncio.run(run_mutations(user_id, args.requests))
+    finally:
+        drop_user(user_id)
+
+
+EXPENSE_PAGE_ADAPTER = TypeAdapter(List[ExpenseOut])
+
+
+async def _render_in_python(db, user_id, limit):
+    """Rows to dicts, merged with items, validated into ExpenseOut, encoded"""
+    return _encode_validated(await _list_page_batched(db, user_id, limit))
+
+
+def _encode_validated(rows):
+    """What FastAPI does with a `response_model`: validate, dump, json.dumps"""
+    models = EXPENSE_PAGE_ADAPTER.validate_python(rows)
+    return json.dumps(
+        EXPENSE_PAGE_ADAPTER.dump_python(models, mode="json"),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+async def _render_in_postgres(db, user_id, limit):
+    """The list endpoint's path: Postgres returns the finished JSON text"""
+    body, _ = await json_page(
+        db,
+        f"""
+        SELECT {EXPENSE_COLUMNS} FROM expenses WHERE user_id = %s
+        ORDER BY expense_date DESC, created_at DESC, id DESC
+        LIMIT %s OFFSET %s
+    """,
+        (user_id, limit, 0),
+        EXPENSE_COLUMNS,
+        ("expense_date", "created_at", "id"),
+        limit,
+        children={
+            "items": children_json(
+                "expense_items", "expense_id", EXPENSE_ITEM_COLUMNS, "p"
+            )
+        },
+    )
+    return body.encode()
+
+
+async def run_json_render(user_id, requests, sizes):
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        for size in sizes:
+            for label, render in (
+                ("python", _render_in_python),
+                ("postgres", _render_in_postgres),
+            ):
+                cpu, wall = [], []
+                for _ in range(requests):
+                    cpu_started = time.process_time()
+                    started = time.perf_counter()
+                    body = await render(AsyncCursor(conn), user_id, size)
+                    wall.append(time.perf_counter() - started)
+                    cpu.append(time.process_time() - cpu_started)
+
+                # Separate run, tracemalloc slows allocation down
+                tracemalloc.start()
+                await render(AsyncCursor(conn), user_id, size)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print(
+                    f"{size:>6} rows  {label:<9} "
+                    f"cpu {statistics.median(cpu) * 1000:>8.2f} ms/page   "
+                    f"wall {statistics.median(wall) * 1000:>8.2f} ms/page   "
+                    f"peak {peak / 1024 / 1024:>7.2f} MiB   "
+                    f"body {len(body) / 1024:>7.0f} KiB"
+                )
+
+
+def bench_json_render(args):
+    user_id = seed_user(args.rows)
+    try:
+        sizes = [size for size in (1000, 2500, 5000, 10000) if size <= args.rows]
+        print(
+            f"Median of {args.requests} pages per size; cpu is this process only, "
+            f"not the database server"
+        )
+        asyncio.run(run_json_render(user_id, args.requests, sizes))
+    finally:
+        drop_user(user_id)
+
+
+def _synthetic_page(rows, items_per_expense=2):
+    """Rows shaped like asyncpg returns them, so no database is needed"""
+    now = datetime.now()
+    return [
+        {
+            "id": n,
+            "user_id": 1,
+            "vendor": f"Vendor {n % 50}",
+            "description": f"Benchmark expense {n}",
+            "amount": Decimal("42.50"),
+            "category": "Groceries",
+            "expense_date": date.today(),
+            "created_at": now,
+            "updated_at": now,
+            "items": [
+                {
+                    "id": n * 10 + i,
+                    "description": f"Item {i}",
+                    "quantity": Decimal("1.000"),
+                    "unit_price": Decimal("21.25"),
+                    "line_total": Decimal("21.25"),
+                    "created_at": now,
+                }
+                for i in range(items_per_expense)
+            ],
+        }
+        for n in range(rows)
+    ]
+
+
+def bench_response_encoding(args):
+    page = _synthetic_page(args.limit)
+    encoder = "orjson" if orjson is not None else "json"
+    print(
+        f"{args.requests} encodes of a {args.limit}-row expense page with 2 items "
+        f"each; trusted path uses {encoder}"
+    )
+    timings = {}
+    for label, encode in (
+        ("validated", _encode_validated),
+        ("trusted", dump_json),
+    ):
+        cpu = []
+        for _ in range(args.requests):
+            started = time.process_time()
+            body = encode(page)
+            cpu.append(time.process_time() - started)
+        timings[label] = statistics.mean(cpu)
+        print(
+            f"{label:<12} {timings[label] * 1e6:>9.1f} us cpu/request   "
+            f"body {len(body) / 1024:>6.1f} KiB"
+        )
+    print(f"{'':<12} {timings['validated'] / timings['trusted']:.1f}x less CPU")
+
+
+# Ledger sizes the stats scenario seeds, up to --rows
+STATS_SIZES = (1_000, 100_000, 1_000_000)
+
+
+def _stats_request():
+    """A bare GET without validators, so the ETag check never short-circuits"""
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "query_string": b"",
+            "headers": [],
+            "scheme": "http",
+            "server": ("benchmark", 80),
+        }
+    )
+
+
+async def _dashboard_sequential(db, user_id):
+    """The previous dashboard path: one aggregate query per figure"""
+    month_start = date.today().replace(day=1)
+    week_ago = datetime.now() - timedelta(days=7)
+    for table, date_column in (("expenses", "expense_date"), ("income", "income_date")):
+        for condition, params in (
+            ("TRUE", ()),
+            (f"{date_column} >= %s", (month_start,)),
+            ("category IS NOT NULL", ()),
+            ("created_at >= %s", (week_ago,)),
+        ):
+            await db.execute(
+                f"""
+                SELECT COALESCE(SUM(amount), 0), COUNT(*), COUNT(DISTINCT category)
+                FROM {table}
+                WHERE user_id = %s AND {condition}
+            """,
+                (user_id, *params),
+            )
+            db.fetchone()
+
+
+async def run_stats(users, requests):
+    pool = await get_async_pool()
+    today = date.today()
+    async with pool.acquire() as conn:
+        for rows, user_id in users:
+            current_user = {"id": user_id}
+            cases = (
+                ("sequential", lambda db: _dashboard_sequential(db, user_id)),
+                (
+                    "dashboard",
+                    lambda db: get_dashboard_stats(
+                        _stats_request(), Response(), db=db, current_user=current_user
+                    ),
+                ),
+                (
+                    "yearly",
+                    lambda db: get_yearly_stats(
+                        today.year,
+                        _stats_request(),
+                        Response(),
+                        db=db,
+                        current_user=current_user,
+                    ),
+                ),
+                (
+                    "monthly",
+                    lambda db: get_monthly_stats(
+                        today.year,
+                        today.month,
+                        _stats_request(),
+                        Response(),
+                        db=db,
+                        current_user=current_user,
+                    ),
+                ),
+            )
+            print(f"{rows} expenses, {max(rows // 50, 1)} income rows")
+            # Every case is measured uncached, then the endpoints again with
+            # their responses served from the cache (marked *)
+            for cached in (False, True):
+                for label, call in cases:
+                    if cached and label == "sequential":
+                        continue
+                    latencies = []
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        if not cached:
+                            await clear_responses()
+                        db = AsyncCursor(conn)
+                        call_started = time.perf_counter()
+                        await call(db)
+                        latencies.append(time.perf_counter() - call_started)
+                    label = f"{label}*" if cached else label
+                    summarize(label, latencies, time.perf_counter() - started)
+                    print(f"{'':<12} {db.query_count} round trips per request")
+
+
+def bench_stats(args):
+    sizes = [size for size in STATS_SIZES if size <= args.rows]
+    users = []
+    try:
+        for size in sizes:
+            users.append((size, seed_user(size, items_per_expense=0)))
+        print(
+            f"{args.requests} sequential requests per endpoint; round trips "
+            f"include the ETag lookup"
+        )
+        asyncio.run(run_stats(users, args.requests))
+    finally:
+        for _, user_id in users:
+            drop_user(user_id)
+
+
+async def run_analytics(users, requests):
+    pool = await get_async_pool()
+    start_date = date.today() - timedelta(days=3 * 365)
+    async with pool.acquire() as conn:
+        for rows, user_id in users:
+            current_user = {"id": user_id}
+            cases = (
+                (
+                    "totals",
+                    lambda db: get_period_totals(
+                        start_date=start_date, db=db, current_user=current_user
+                    ),
+                ),
+                (
+                    "shares",
+                    lambda db: get_category_shares(
+                        start_date=start_date, db=db, current_user=current_user
+                    ),
+                ),
+                (
+                    "rolling",
+                    lambda db: get_rolling_totals(
+                        start_date=start_date, db=db, current_user=current_user
+                    ),
+                ),
+                (
+                    "compare",
+                    lambda db: get_period_comparison(
+                        start_date=start_date, db=db, current_user=current_user
+                    ),
+                ),
+            )
+            print(f"{rows} expenses, {max(rows // 50, 1)} income rows")
+            # The first request loads the arrays, later ones only check the
+            # change log; "write" updates one row before every request
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(max(requests // 10, 1)):
+                ledger_cache.clear()
+                call_started = time.perf_counter()
+                await cases[0][1](AsyncCursor(conn))
+                latencies.append(time.perf_counter() - call_started)
+            summarize("load", latencies, time.perf_counter() - started)
+            for label, call in cases:
+                latencies = []
+                started = time.perf_counter()
+                for _ in range(requests):
+                    db = AsyncCursor(conn)
+                    call_started = time.perf_counter()
+                    await call(db)
+                    latencies.append(time.perf_counter() - call_started)
+                summarize(label, latencies, time.perf_counter() - started)
+                print(f"{'':<12} {db.query_count} round trips per request")
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(requests):
+                await conn.execute(
+                    """
+                    UPDATE expenses SET amount = amount + 1
+                    WHERE id = (SELECT MIN(id) FROM expenses WHERE user_id = $1)
+                """,
+                    user_id,
+                )
+                call_started = time.perf_counter()
+                await cases[0][1](AsyncCursor(conn))
+                latencies.append(time.perf_counter() - call_started)
+            summarize("write", latencies, time.perf_counter() - started)
+
+
+def bench_analytics(args):
+    sizes = [size for size in STATS_SIZES if size <= args.rows]
+    users = []
+    try:
+        for size in sizes:
+            users.append((size, seed_user(size, items_per_expense=0)))
+        print(f"{args.requests} sequential requests per endpoint, 3 years of data")
+        asyncio.run(run_analytics(users, args.requests))
+    finally:
+        for _, user_id in users:
+            drop_user(user_id)
+
+
+SCENARIOS = {
+    "db-modes": bench_db_modes,
+    "list-children": bench_list_children,
+    "mutations": bench_mutations,
+    "json-render": bench_json_render,
+    "response-encoding": bench_response_encoding,
+    "stats": bench_stats,
+    "analytics": bench_analytics,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    SCENARIOS[args.scenario](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Bulk import a bank statement (CSV or OFX) for a user from the command line.
+
+Example:
+
+    python import_ledger.py user@example.com statement.csv --kind auto
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db_cursor  # noqa: E402
+from ledger_import import import_transactions, iter_transactions  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("email", help="email of the user to import for")
+    parser.add_argument("path", help="CSV, OFX or QFX file")
+    parser.add_argument("--kind", choices=["auto", "expense", "income"], default="auto")
+    parser.add_argument("--date-format", help="strptime format, ISO dates if omitted")
+    args = parser.parse_args()
+
+    file_format = args.path.rsplit(".", 1)[-1].lower()
+
+    with db_cursor() as db:
+        db.execute("SELECT id FROM users WHERE email = %s", (args.email,))
+        user = db.fetchone()
+        if not user:
+            print(f"❌ No user with email {args.email}")
+            sys.exit(1)
+
+        with open(args.path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            transactions = iter_transactions(f, file_format, args.date_format)
+            summary = import_transactions(db, user["id"], transactions, args.kind)
+
+    print(
+        f"✅ Imported {summary['expenses']} expenses and {summary['income']} income "
+        f"from {summary['rows']} rows in {summary['elapsed_s']}s "
+        f"({summary['rows_per_s']} rows/s)"
+    )
+    if summary["error_count"]:
+        print(f"\n{summary['error_count']} rows were skipped:")
+        for error in summary["errors"]:
+            print(f"- line {error['line']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    main()
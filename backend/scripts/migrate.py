@@ -0,0 +1,482 @@
+"""Versioned schema migrations for the backend database.
+
+Migrations are the numbered `.sql` files in `backend/migrations`, applied in
+order and recorded in `schema_migrations`. A file whose first line is
+`-- migrate:no-transaction` runs statement by statement in autocommit mode,
+which `CREATE INDEX CONCURRENTLY` requires; every other file runs in a single
+transaction together with its version row.
+
+Each version is recorded with the SHA-256 of its file. Applied migrations are
+never re-run, so editing one would leave existing databases on the old schema
+while fresh installs get the new one; `up`, `status` and `check` refuse to
+pass while a file no longer matches what was applied. Change the schema with
+a new migration instead.
+
+Example:
+
+    python migrate.py up          # apply pending migrations
+    python migrate.py status      # list applied and pending versions
+    python migrate.py check       # report pending or edited migrations, missing indexes
+    python migrate.py explain 1   # EXPLAIN the list filters and stats periods for user 1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queries import ledger_filters, period_bounds, period_condition  # noqa: E402
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Database connection parameters
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations"
+)
+
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+# Arbitrary key so two deploys never apply migrations at the same time
+MIGRATION_LOCK_ID = 727_001
+
+# Steps to run once a migration is applied, outside its transaction
+FOLLOW_UPS = {
+    11: "run scripts/rebuild_rollups.py to backfill the daily rollups",
+}
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE schema_migrations ADD COLUMN IF NOT EXISTS checksum CHAR(64);
+"""
+
+_MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+_CREATE_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE,
+)
+
+# Filter combinations the list endpoints must answer from an index
+FILTER_CASES = {
+    "unfiltered": {},
+    "date range": {"start_date": date.today() - timedelta(days=90)},
+    "category": {"categories": ["Groceries", "Dining"]},
+    "counterparty": {"counterparty": "Vendor 1"},
+    "amount range": {"min_amount": 10, "max_amount": 50},
+    "date + category": {
+        "start_date": date.today() - timedelta(days=90),
+        "categories": ["Groceries"],
+    },
+    "date + counterparty": {
+        "start_date": date.today() - timedelta(days=90),
+        "counterparty": "Vendor 1",
+    },
+    "date + amount": {
+        "start_date": date.today() - timedelta(days=90),
+        "min_amount": 10,
+    },
+}
+
+# Periods the stats endpoints aggregate over; each must be an index range scan
+STATS_PERIODS = {
+    "year": period_bounds(date.today().year),
+    "month": period_bounds(date.today().year, date.today().month),
+    "week": period_bounds(
+        date.today().isocalendar()[0], week=date.today().isocalendar()[1]
+    ),
+    "last 90 days": (date.today() - timedelta(days=90), None),
+}
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, "rb") as f:
+            content = f.read()
+        self.sql = content.decode("utf-8")
+        self.checksum = hashlib.sha256(content).hexdigest()
+        self.transactional = not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self):
+        """Split a no-transaction migration into single statements.
+
+        These files only hold plain DDL such as index builds, so splitting on
+        `;` is safe; anything with function bodies belongs in a transactional
+        migration.
+        """
+        lines = [
+            line for line in self.sql.splitlines() if not line.strip().startswith("--")
+        ]
+        return [s.strip() for s in "\n".join(lines).split(";") if s.strip()]
+
+    def index_names(self):
+        return _CREATE_INDEX.findall(self.sql)
+
+
+def load_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(
+                Migration(
+                    int(match.group(1)),
+                    match.group(2),
+                    os.path.join(MIGRATIONS_DIR, filename),
+                )
+            )
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version in migrations/")
+    return migrations
+
+
+def connect():
+    return psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+    )
+
+
+def applied_versions(cursor):
+    """`(applied_at, checksum)` of every applied version; the checksum is None
+    for versions applied before checksums were recorded"""
+    cursor.execute(
+        "SELECT to_regclass('schema_migrations') IS NOT NULL",
+    )
+    if not cursor.fetchone()[0]:
+        return {}
+    # Read through to_jsonb so a table from before the checksum column works
+    cursor.execute("""
+        SELECT version, applied_at, to_jsonb(m) ->> 'checksum'
+        FROM schema_migrations m
+    """)
+    return {
+        version: (applied_at, checksum)
+        for version, applied_at, checksum in cursor.fetchall()
+    }
+
+
+def modified_migrations(migrations, applied):
+    """Applied migrations whose file changed since they were applied"""
+    return [
+        m
+        for m in migrations
+        if m.version in applied
+        and applied[m.version][1] is not None
+        and applied[m.version][1] != m.checksum
+    ]
+
+
+def report_modified(modified):
+    for migration in modified:
+        print(
+            f"❌ migration {migration.version:04d}_{migration.name} was edited after "
+            "it was applied; restore it and add a new migration instead"
+        )
+
+
+def invalid_indexes(cursor, names):
+    """Indexes left behind INVALID by an interrupted concurrent build"""
+    cursor.execute(
+        """
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND NOT i.indisvalid
+          AND c.relname = ANY(%s)
+    """,
+        (list(names),),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def apply_migration(connection, migration):
+    cursor = connection.cursor()
+    if migration.transactional:
+        connection.autocommit = False
+        try:
+            cursor.execute(migration.sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) "
+                "VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.autocommit = True
+        return
+
+    # A failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS
+    # would silently keep, so drop those before retrying
+    for name in invalid_indexes(cursor, migration.index_names()):
+        print(f"  Dropping invalid index {name} from an earlier failed build")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    for statement in migration.statements():
+        cursor.execute(statement)
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+        (migration.version, migration.name, migration.checksum),
+    )
+
+
+def migrate_up():
+    connection = None
+    try:
+        connection = connect()
+        connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+
+        migrations = load_migrations()
+        applied = applied_versions(cursor)
+        modified = modified_migrations(migrations, applied)
+        if modified:
+            report_modified(modified)
+            return False
+
+        # Versions applied before checksums were recorded adopt their current file
+        for migration in migrations:
+            if migration.version in applied and applied[migration.version][1] is None:
+                cursor.execute(
+                    "UPDATE schema_migrations SET checksum = %s WHERE version = %s",
+                    (migration.checksum, migration.version),
+                )
+
+        pending = [m for m in migrations if m.version not in applied]
+        if not pending:
+            print("✅ Database schema is up to date")
+            return True
+
+        for migration in pending:
+            print(f"Applying {migration.version:04d}_{migration.name}...")
+            apply_migration(connection, migration)
+
+        print(f"✅ Applied {len(pending)} migration(s)")
+        for migration in pending:
+            if migration.version in FOLLOW_UPS:
+                print(f"   Next, {FOLLOW_UPS[migration.version]}")
+        return True
+
+    except Exception as e:
+        print(f"❌ An error occurred: {e}")
+        return False
+    finally:
+        # Closing the session also releases the advisory lock
+        if connection:
+            connection.close()
+
+
+def show_status():
+    """List every migration; returns the number edited since applied"""
+    migrations = load_migrations()
+    connection = connect()
+    try:
+        applied = applied_versions(connection.cursor())
+    finally:
+        connection.close()
+    modified = {m.version for m in modified_migrations(migrations, applied)}
+    for migration in migrations:
+        if migration.version not in applied:
+            state = "pending"
+        else:
+            state = f"applied {applied[migration.version][0]:%Y-%m-%d %H:%M}"
+            if migration.version in modified:
+                state += ", edited since"
+        print(f"{migration.version:04d}_{migration.name:<32} {state}")
+    return len(modified)
+
+
+def check_schema():
+    """Report pending or edited migrations and recommended indexes that are
+    missing or invalid; returns the number of problems found"""
+    migrations = load_migrations()
+    recommended = [name for m in migrations for name in m.index_names()]
+    connection = connect()
+    try:
+        cursor = connection.cursor()
+        applied = applied_versions(cursor)
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        invalid = set(invalid_indexes(cursor, recommended))
+    finally:
+        connection.close()
+
+    modified = modified_migrations(migrations, applied)
+    report_modified(modified)
+    problems = len(modified)
+    for migration in migrations:
+        if migration.version not in applied:
+            problems += 1
+            print(f"❌ migration {migration.version:04d}_{migration.name} is pending")
+    for name in recommended:
+        if name not in existing:
+            problems += 1
+            print(f"❌ index {name} is missing")
+        elif name in invalid:
+            problems += 1
+            print(f"❌ index {name} is invalid, rerun `migrate.py up` to rebuild it")
+    if not problems:
+        print(f"✅ All migrations applied and {len(recommended)} indexes present")
+    return problems
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _explain(cursor, table, query, params):
+    """Plan nodes of `query` that read `table`"""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return [
+        node
+        for node in _plan_nodes(plan[0]["Plan"])
+        if node.get("Relation Name") == table
+    ]
+
+
+def explain_filters(user_id):
+    """EXPLAIN every list filter combination and check it uses an index.
+
+    Sequential scans are disabled for the check so small tables still show
+    which index the planner would pick once the table is large.
+    """
+    connection = connect()
+    failures = 0
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET enable_seqscan = off")
+        for table, date_column, counterparty_column in (
+            ("expenses", "expense_date", "vendor"),
+            ("income", "income_date", "source"),
+        ):
+            for label, case in FILTER_CASES.items():
+                conditions, params = ledger_filters(
+                    date_column, counterparty_column, **case
+                )
+                where = " AND ".join(["user_id = %s"] + conditions)
+                nodes = _explain(
+                    cursor,
+                    table,
+                    f"""
+                    SELECT id FROM {table}
+                    WHERE {where}
+                    ORDER BY {date_column} DESC, created_at DESC, id DESC
+                    LIMIT 100
+                """,
+                    [user_id] + params,
+                )
+                indexes = sorted({n["Index Name"] for n in nodes if "Index Name" in n})
+                seq_scan = any(n["Node Type"] == "Seq Scan" for n in nodes)
+                if indexes and not seq_scan:
+                    print(f"✅ {table} {label}: {', '.join(indexes)}")
+                else:
+                    failures += 1
+                    print(f"❌ {table} {label}: sequential scan")
+    finally:
+        connection.close()
+    return failures
+
+
+def explain_stats(user_id):
+    """EXPLAIN the stats aggregates for every period and check the date range
+    is an index condition rather than a filter over all of the user's rows"""
+    connection = connect()
+    failures = 0
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET enable_seqscan = off")
+        # The stats endpoints aggregate the daily rollups, not the ledgers
+        for table, date_column in (("daily_rollups", "day"),):
+            for label, (start, end) in STATS_PERIODS.items():
+                condition, params = period_condition(date_column, start, end)
+                nodes = _explain(
+                    cursor,
+                    table,
+                    f"""
+                    SELECT COALESCE(SUM(amount), 0), SUM(count) FROM {table}
+                    WHERE user_id = %s AND {condition}
+                """,
+                    [user_id] + params,
+                )
+                range_scans = sorted(
+                    {
+                        n["Index Name"]
+                        for n in nodes
+                        if date_column in n.get("Index Cond", "")
+                    }
+                )
+                if range_scans:
+                    print(f"✅ {table} stats {label}: {', '.join(range_scans)}")
+                else:
+                    failures += 1
+                    print(f"❌ {table} stats {label}: no index range scan")
+    finally:
+        connection.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("up", help="apply pending migrations")
+    subparsers.add_parser("status", help="list applied and pending migrations")
+    subparsers.add_parser(
+        "check", help="report pending or edited migrations and missing indexes"
+    )
+    explain = subparsers.add_parser(
+        "explain", help="check list filters and stats periods use indexes"
+    )
+    explain.add_argument("user_id", type=int, nargs="?", default=1)
+    args = parser.parse_args()
+
+    if args.command == "up":
+        sys.exit(0 if migrate_up() else 1)
+    elif args.command == "status":
+        sys.exit(1 if show_status() else 0)
+    elif args.command == "check":
+        sys.exit(1 if check_schema() else 0)
+    elif args.command == "explain":
+        failures = explain_filters(args.user_id) + explain_stats(args.user_id)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
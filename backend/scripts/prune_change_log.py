@@ -0,0 +1,92 @@
+"""Prune old /sync/changes history and /sync/batch idempotency keys.
+
+Clients whose sync token predates the pruned history get a full snapshot on
+their next sync instead of a delta; keys older than the retention window can
+no longer be replayed.
+
+Example:
+
+    python prune_change_log.py --days 90
+"""
+
+import argparse
+import os
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Database connection parameters
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+
+# Delete expired entries and move the horizon past the newest one removed,
+# in one statement so the two can never disagree
+PRUNE_CHANGE_LOG = """
+WITH pruned AS (
+    DELETE FROM change_log
+    WHERE changed_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+    RETURNING txid
+)
+UPDATE change_log_horizon
+SET pruned_txid = GREATEST(pruned_txid, (SELECT max(txid) + 1 FROM pruned))
+WHERE EXISTS (SELECT 1 FROM pruned)
+RETURNING (SELECT count(*) FROM pruned) AS pruned_count, pruned_txid;
+"""
+
+PRUNE_IDEMPOTENCY_KEYS = """
+DELETE FROM idempotency_keys
+WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s);
+"""
+
+
+def prune_change_log(days):
+    connection = None
+    try:
+        # Connect to the PostgreSQL database
+        connection = psycopg2.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+        )
+        cursor = connection.cursor()
+
+        print(f"Pruning change log entries older than {days} days...")
+        cursor.execute(PRUNE_CHANGE_LOG, (days,))
+        result = cursor.fetchone()
+
+        # Commit changes
+        connection.commit()
+        if result:
+            print(f"✅ Pruned {result[0]} entries, horizon is now txid {result[1]}")
+        else:
+            print("✅ Nothing to prune")
+
+        print(f"Pruning idempotency keys older than {days} days...")
+        cursor.execute(PRUNE_IDEMPOTENCY_KEYS, (days,))
+        connection.commit()
+        print(f"✅ Pruned {cursor.rowcount} idempotency keys")
+
+    except Exception as e:
+        print(f"❌ An error occurred: {e}")
+        if connection:
+            connection.rollback()
+    finally:
+        # Close the database connection
+        if connection:
+            cursor.close()
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=90, help="history to keep")
+    args = parser.parse_args()
+    prune_change_log(args.days)
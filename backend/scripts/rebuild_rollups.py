@@ -0,0 +1,79 @@
+"""Rebuild the daily expense and income rollups behind the stats endpoints.
+
+The rollups are kept current by triggers; rebuilding is needed once after
+applying migrations/0011_daily_rollups.sql to backfill existing ledgers, and
+otherwise only after restoring data with triggers disabled, or to repair them.
+Each user is rebuilt and committed in its own transaction, so writes to
+expenses and income only wait for the user being rebuilt at the time.
+
+Example:
+
+    python rebuild_rollups.py              # every user
+    python rebuild_rollups.py --user 42    # a single user
+"""
+
+import argparse
+import os
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Database connection parameters
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+
+# Defined by migrations/0011_daily_rollups.sql
+REBUILD_DAILY_ROLLUPS = "SELECT rebuild_daily_rollups(%s);"
+
+
+def rebuild_rollups(user_id=None):
+    connection = None
+    try:
+        # Connect to the PostgreSQL database
+        connection = psycopg2.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+        )
+        cursor = connection.cursor()
+
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            cursor.execute("SELECT id FROM users ORDER BY id")
+            user_ids = [row[0] for row in cursor.fetchall()]
+            connection.commit()
+
+        print(f"Rebuilding daily rollups for {len(user_ids)} user(s)...")
+        rebuilt = 0
+        for target in user_ids:
+            cursor.execute(REBUILD_DAILY_ROLLUPS, (target,))
+            rebuilt += cursor.fetchone()[0]
+            # Commit per user to release the lock on the ledgers
+            connection.commit()
+        print(f"✅ Rebuilt {rebuilt} daily rollups")
+
+    except Exception as e:
+        print(f"❌ An error occurred: {e}")
+        if connection:
+            connection.rollback()
+    finally:
+        # Close the database connection
+        if connection:
+            cursor.close()
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", type=int, help="only rebuild this user")
+    args = parser.parse_args()
+    rebuild_rollups(args.user)
@@ -10,6 +10,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Embed user id/username in tokens so requests can skip the user lookup
+TOKEN_USER_CLAIMS = os.getenv("TOKEN_USER_CLAIMS", "false").lower() == "true"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 